@@ -0,0 +1,66 @@
+"""
+Benchmark of protocol compression.
+
+Measures CPU time spent compressing requests and decompressing responses
+against the bytes saved on the wire, for SenderDataRequest batches and
+active check responses of growing size.
+
+Usage:
+    python -m benchmarks.bench_compression
+"""
+
+from typing import List
+import json
+import timeit
+from zappix.dstream import _Dstream, _HEADER
+from zappix.protocol import encode_request
+from benchmarks.bench_encoder import make_request
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def make_active_checks(size: int) -> bytes:
+    data = [{'key': f'app.metric[{i}]', 'delay': 60, 'lastlogsize': 0, 'mtime': 0} for i in range(size)]
+    return json.dumps({'response': 'success', 'data': data}).encode('utf-8')
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    plain = _Dstream('localhost')
+    compressing = _Dstream('localhost', compression=True, compression_threshold=0)
+    payloads = [('sender data', make_request), ('active checks', make_active_checks)]
+
+    results = []
+    for size in sizes:
+        for name, make in payloads:
+            payload = make(size)
+            if not isinstance(payload, bytes):
+                payload = encode_request(payload)
+            number = max(1, 20000 // size)
+            header, body = compressing._prepare_payload(payload)
+            response = header + body
+            compress = min(timeit.repeat(lambda: compressing._prepare_payload(payload), number=number, repeat=3))
+            frame = min(timeit.repeat(lambda: plain._prepare_payload(payload), number=number, repeat=3))
+            decompress = min(timeit.repeat(lambda: compressing._parse_response(response), number=number, repeat=3))
+            results.append({
+                'payload': name,
+                'size': size,
+                'bytes': len(payload) + _HEADER.size,
+                'compressed_bytes': len(response),
+                'ratio': (len(payload) + _HEADER.size) / len(response),
+                'compress_us': (compress - frame) / number * 1e6,
+                'decompress_us': decompress / number * 1e6,
+                'us_per_kib_saved': (compress - frame) / number * 1e6 / max((len(payload) - len(body)) / 1024, 1e-9),
+            })
+    return results
+
+
+def main() -> None:
+    print(f"{'payload':>14} {'items':>6} {'bytes':>10} {'compressed':>11} {'ratio':>6} "
+          f"{'compress us':>12} {'decompress us':>14} {'us/KiB saved':>13}")
+    for r in run():
+        print(f"{r['payload']:>14} {r['size']:>6} {r['bytes']:>10} {r['compressed_bytes']:>11} {r['ratio']:>6.1f} "
+              f"{r['compress_us']:>12.1f} {r['decompress_us']:>14.1f} {r['us_per_kib_saved']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
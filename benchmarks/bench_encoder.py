@@ -0,0 +1,59 @@
+"""
+Benchmark of request encoding.
+
+Compares json.dumps with ModelEncoder against encode_request, with and
+without orjson, for SenderDataRequest batches of growing size.
+
+Usage:
+    python -m benchmarks.bench_encoder
+"""
+
+from typing import List
+from unittest.mock import patch
+import json
+import timeit
+from zappix import protocol
+from zappix.protocol import SenderData, SenderDataRequest, ModelEncoder, encode_request
+
+SIZES = [100, 1000, 10000, 100000]
+
+
+def make_request(size: int) -> SenderDataRequest:
+    return SenderDataRequest([
+        SenderData(f'host{i % 100}', f'app.metric[{i % 50}]', i * 1.5 if i % 2 else f'value {i}', 1554133179 + i)
+        for i in range(size)
+    ])
+
+
+def model_encoder(request: SenderDataRequest) -> bytes:
+    return json.dumps(request, cls=ModelEncoder).encode('utf-8')
+
+
+def stdlib_encode_request(request: SenderDataRequest) -> bytes:
+    with patch.object(protocol, '_orjson', None):
+        return encode_request(request)
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    candidates = [('ModelEncoder', model_encoder), ('encode_request', stdlib_encode_request)]
+    if protocol._orjson is not None:
+        candidates.append(('encode_request+orjson', encode_request))
+
+    results = []
+    for size in sizes:
+        request = make_request(size)
+        number = max(1, 100000 // size)
+        for name, encode in candidates:
+            seconds = min(timeit.repeat(lambda: encode(request), number=number, repeat=3)) / number
+            results.append({'encoder': name, 'size': size, 'items_per_second': size / seconds})
+    return results
+
+
+def main() -> None:
+    print(f"{'encoder':>22} {'items':>8} {'items/s':>14}")
+    for r in run():
+        print(f"{r['encoder']:>22} {r['size']:>8} {r['items_per_second']:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
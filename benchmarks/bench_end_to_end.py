@@ -0,0 +1,71 @@
+"""
+End-to-end benchmark of clients against the loopback trapper stand-in.
+
+Measures items per second delivered by Sender.send_bulk and
+AgentActive.send_collected_data by batch size, with a new connection per
+request and with pooled connections, and requests per second of Get.
+
+Usage:
+    python -m benchmarks.bench_end_to_end
+"""
+
+from typing import List
+import time
+from zappix.agent_active import AgentActive
+from zappix.get import Get
+from zappix.pool import ConnectionPool
+from zappix.protocol import AgentData, AgentDataRequest
+from zappix.sender import Sender
+from zappix.trapper import TrapperServer
+from benchmarks.bench_encoder import make_request
+
+SIZES = [1, 100, 1000, 10000]
+# Items sent per measurement
+TOTAL_ITEMS = 50000
+
+
+def make_agent_request(size: int) -> AgentDataRequest:
+    now = int(time.time())
+    return AgentDataRequest([AgentData(f'host{i % 100}', f'app.metric[{i % 50}]', i, now, i + 1)
+                             for i in range(size)])
+
+
+def measure(send, size: int) -> float:
+    repeat = max(TOTAL_ITEMS // size, 20)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        send()
+    return size * repeat / (time.perf_counter() - start)
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    results = []
+    with TrapperServer(keep_alive=True, agent_values={'agent.ping': '1'}) as trapper:
+        pool = ConnectionPool()
+        clients = [('connection per request', {}), ('pooled', {'pool': pool})]
+        for size in sizes:
+            request = make_request(size)
+            agent_request = make_agent_request(size)
+            for mode, options in clients:
+                sender = Sender('127.0.0.1', trapper.port, **options)
+                agent = AgentActive('host', '127.0.0.1', trapper.port, **options)
+                results.append({'client': 'Sender.send_bulk', 'mode': mode, 'size': size,
+                                'items_per_second': measure(lambda: sender.send_bulk(request), size)})
+                results.append({'client': 'AgentActive.send_collected_data', 'mode': mode, 'size': size,
+                                'items_per_second': measure(lambda: agent.send_collected_data(agent_request), size)})
+        for mode, options in clients:
+            getter = Get('127.0.0.1', trapper.port, **options)
+            results.append({'client': 'Get.get_value', 'mode': mode, 'size': 1,
+                            'items_per_second': measure(lambda: getter.get_value('agent.ping'), 1)})
+        pool.close()
+    return results
+
+
+def main() -> None:
+    print(f"{'client':>32} {'mode':>24} {'batch':>6} {'items/s':>12}")
+    for r in run():
+        print(f"{r['client']:>32} {r['mode']:>24} {r['size']:>6} {r['items_per_second']:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
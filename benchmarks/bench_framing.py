@@ -0,0 +1,95 @@
+"""
+Benchmark of ZBXD payload framing.
+
+Compares the former single-buffer framing (struct.pack with a per-message
+format string) with the header-only framing sent as separate buffers.
+Reports time per message, peak allocation and socket throughput for a
+range of payload sizes.
+
+Usage:
+    python -m benchmarks.bench_framing
+"""
+
+from typing import List
+import socket
+import struct
+import threading
+import time
+import timeit
+import tracemalloc
+from zappix.dstream import _Dstream
+
+SIZES = [1 << 10, 64 << 10, 1 << 20, 16 << 20]
+
+
+def legacy_prepare_payload(payload: bytes) -> bytes:
+    payload_len = len(payload)
+    return struct.pack('<5sQ{}s'.format(payload_len), b'ZBXD\x01', payload_len, payload)
+
+
+def peak_allocation(func, payload: bytes) -> int:
+    tracemalloc.start()
+    func(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def throughput(send, payload: bytes, repeat: int) -> float:
+    left, right = socket.socketpair()
+    total = (len(payload) + 13) * repeat
+
+    def drain():
+        buffer = bytearray(1 << 20)
+        received = 0
+        while received < total:
+            received += right.recv_into(buffer)
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        send(left, payload)
+    reader.join()
+    elapsed = time.perf_counter() - start
+    left.close()
+    right.close()
+    return total / elapsed / 1e6
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    dstream = _Dstream('localhost')
+
+    def legacy_send(sock, payload):
+        sock.sendall(legacy_prepare_payload(payload))
+
+    def current_send(sock, payload):
+        dstream._send_buffers(sock, dstream._prepare_payload(payload))
+
+    results = []
+    for size in sizes:
+        payload = b'x' * size
+        number = max(1, (16 << 20) // size)
+        repeat = max(1, (64 << 20) // size)
+        results.append({
+            'size': size,
+            'legacy_us': timeit.timeit(lambda: legacy_prepare_payload(payload), number=number) / number * 1e6,
+            'current_us': timeit.timeit(lambda: dstream._prepare_payload(payload), number=number) / number * 1e6,
+            'legacy_peak_bytes': peak_allocation(legacy_prepare_payload, payload),
+            'current_peak_bytes': peak_allocation(dstream._prepare_payload, payload),
+            'legacy_mb_s': throughput(legacy_send, payload, repeat),
+            'current_mb_s': throughput(current_send, payload, repeat),
+        })
+    return results
+
+
+def main() -> None:
+    print(f"{'size':>10} {'legacy us':>12} {'current us':>12} {'legacy peak':>12} "
+          f"{'current peak':>12} {'legacy MB/s':>12} {'current MB/s':>12}")
+    for r in run():
+        print(f"{r['size']:>10} {r['legacy_us']:>12.2f} {r['current_us']:>12.2f} {r['legacy_peak_bytes']:>12} "
+              f"{r['current_peak_bytes']:>12} {r['legacy_mb_s']:>12.1f} {r['current_mb_s']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of memory used by queued items.
+
+Measures bytes allocated per item held by BufferedSender before it is
+sent, and by SenderDataRequest and ColumnarSenderDataRequest batches.
+
+Usage:
+    python -m benchmarks.bench_memory
+"""
+
+from typing import Any, Callable, List, Tuple
+import gc
+import tracemalloc
+from zappix.buffered_sender import BufferedSender
+from zappix.protocol import SenderData, SenderDataRequest, ColumnarSenderDataRequest
+from zappix.sender import Sender
+from zappix.trapper import TrapperServer
+
+SIZES = [1000, 10000, 100000]
+
+
+def allocated(fill: Callable[[], Any]) -> Tuple[int, Any]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    filled = fill()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, filled
+
+
+def fill_buffered(sender: Sender, size: int) -> Callable[[], BufferedSender]:
+    def fill() -> BufferedSender:
+        # Batches are never due during the measurement, items stay queued
+        buffered = BufferedSender(sender, max_items=size + 1, max_bytes=2**40, max_age=3600, queue_size=size + 1)
+        for i in range(size):
+            buffered.add_value(f'host{i % 100}', f'app.metric[{i % 50}]', i * 1.5)
+        return buffered
+    return fill
+
+
+def fill_request(size: int) -> SenderDataRequest:
+    request = SenderDataRequest()
+    for i in range(size):
+        request.add_item(SenderData(f'host{i % 100}', f'app.metric[{i % 50}]', i * 1.5, 1554133179 + i))
+    return request
+
+
+def fill_columnar(size: int) -> ColumnarSenderDataRequest:
+    request = ColumnarSenderDataRequest()
+    for i in range(size):
+        request.add(f'host{i % 100}', f'app.metric[{i % 50}]', i * 1.5, 1554133179 + i)
+    return request
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    results = []
+    with TrapperServer() as trapper:
+        sender = Sender('127.0.0.1', trapper.port)
+        for size in sizes:
+            fills = [
+                ('BufferedSender', fill_buffered(sender, size)),
+                ('SenderDataRequest', lambda: fill_request(size)),
+                ('ColumnarSenderDataRequest', lambda: fill_columnar(size)),
+            ]
+            for name, fill in fills:
+                size_bytes, filled = allocated(fill)
+                results.append({'container': name, 'size': size, 'bytes_per_item': size_bytes / size})
+                if isinstance(filled, BufferedSender):
+                    filled.close()
+    return results
+
+
+def main() -> None:
+    print(f"{'container':>26} {'items':>7} {'bytes/item':>11}")
+    for r in run():
+        print(f"{r['container']:>26} {r['size']:>7} {r['bytes_per_item']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of protocol decoding.
+
+Measures receiving and parsing of responses by size: reading a framed
+message with _recv_info, parsing active check configuration and the info
+string of data responses with ServerResponse and parse_info.
+
+Usage:
+    python -m benchmarks.bench_protocol
+"""
+
+from typing import List
+import timeit
+from zappix.dstream import _Dstream
+from zappix.protocol import ServerResponse, parse_info
+from benchmarks.bench_compression import make_active_checks
+
+SIZES = [10, 100, 1000, 10000]
+
+INFO = '{"response":"success","info":"processed: 250; failed: 0; total: 250; seconds spent: 0.001224"}'
+
+
+class MemorySocket:
+    """
+    Socket stand-in serving a fixed message from memory.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self._data = memoryview(data)
+        self._position = 0
+
+    def rewind(self) -> 'MemorySocket':
+        self._position = 0
+        return self
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        size = min(nbytes or len(buffer), len(buffer), len(self._data) - self._position)
+        buffer[:size] = self._data[self._position:self._position + size]
+        self._position += size
+        return size
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    dstream = _Dstream('localhost')
+    results = []
+    for size in sizes:
+        checks = make_active_checks(size)
+        header, body = dstream._prepare_payload(checks)
+        checks = checks.decode('utf-8')
+        sock = MemorySocket(header + body)
+        number = max(1, 20000 // size)
+        recv = min(timeit.repeat(lambda: dstream._parse_response(dstream._recv_info(sock.rewind())),
+                                 number=number, repeat=3)) / number
+        parse = min(timeit.repeat(lambda: ServerResponse(checks).data, number=number, repeat=3)) / number
+        results.append({
+            'benchmark': 'active checks',
+            'size': size,
+            'bytes': len(header) + len(body),
+            'recv_mb_per_second': (len(header) + len(body)) / recv / 1e6,
+            'items_per_second': size / parse,
+        })
+
+    number = 20000
+    info = min(timeit.repeat(lambda: ServerResponse(INFO).info, number=number, repeat=3)) / number
+    results.append({'benchmark': 'info', 'size': 1, 'responses_per_second': 1 / info})
+    raw = min(timeit.repeat(lambda: parse_info(INFO), number=number, repeat=3)) / number
+    results.append({'benchmark': 'raw info', 'size': 1, 'responses_per_second': 1 / raw})
+    return results
+
+
+def main() -> None:
+    for r in run():
+        print(', '.join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in r.items()))
+
+
+if __name__ == '__main__':
+    main()
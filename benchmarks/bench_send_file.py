@@ -0,0 +1,58 @@
+"""
+Benchmark of Sender.send_file.
+
+Measures lines per second parsed by Sender._parse_file, and sent by
+send_file to the loopback trapper stand-in, whole and in streaming mode.
+
+Usage:
+    python -m benchmarks.bench_send_file
+"""
+
+from typing import List
+import os
+import tempfile
+import time
+from zappix.sender import Sender
+from zappix.trapper import TrapperServer
+
+SIZES = [1000, 10000, 100000]
+
+
+def write_file(path: str, size: int) -> None:
+    with open(path, 'w') as f:
+        for i in range(size):
+            f.write(f'host{i % 100} app.metric[{i % 50}] {1554133179 + i} "value {i}"\n')
+
+
+def measure(call, size: int) -> float:
+    start = time.perf_counter()
+    call()
+    return size / (time.perf_counter() - start)
+
+
+def run(sizes: List[int] = SIZES) -> List[dict]:
+    results = []
+    with TrapperServer(keep_alive=True) as trapper, tempfile.TemporaryDirectory() as tmp:
+        sender = Sender('127.0.0.1', trapper.port)
+        for size in sizes:
+            path = os.path.join(tmp, f'{size}.txt')
+            write_file(path, size)
+            calls = [
+                ('_parse_file', lambda: sender._parse_file(path, True)),
+                ('send_file', lambda: sender.send_file(path, True)),
+                ('send_file stream', lambda: sender.send_file(path, True, chunk_size=1000, stream=True)),
+            ]
+            for name, call in calls:
+                results.append({'call': name, 'size': size,
+                                'lines_per_second': max(measure(call, size) for _ in range(3))})
+    return results
+
+
+def main() -> None:
+    print(f"{'call':>18} {'lines':>7} {'lines/s':>10}")
+    for r in run():
+        print(f"{r['call']:>18} {r['size']:>7} {r['lines_per_second']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
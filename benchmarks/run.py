@@ -0,0 +1,109 @@
+"""
+Run benchmarks and store results as JSON, so releases can be compared.
+
+Results of every benchmark module are stored with the zappix version,
+Python version and platform they were measured on. Comparing two result
+files prints the ratio of every throughput figure, new to old, for rows
+measured with the same parameters.
+
+Usage:
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run bench_encoder bench_protocol -o results.json
+    python -m benchmarks.run --compare old.json new.json
+"""
+
+from typing import Any, Dict, List
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from zappix import protocol
+
+MODULES = [
+    'bench_encoder',
+    'bench_framing',
+    'bench_compression',
+    'bench_protocol',
+    'bench_end_to_end',
+    'bench_memory',
+    'bench_send_file',
+]
+
+
+def run(modules: List[str] = MODULES) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        'zappix': _version(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'orjson': protocol._orjson is not None,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'benchmarks': {},
+    }
+    for name in modules:
+        print(f"Running {name}", file=sys.stderr)
+        module = importlib.import_module(f'benchmarks.{name}')
+        results['benchmarks'][name] = module.run()
+    return results
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    lines = [f"zappix {old['zappix']} (Python {old['python']}) -> {new['zappix']} (Python {new['python']})"]
+    for name, rows in new['benchmarks'].items():
+        old_rows = {_params(row): row for row in old['benchmarks'].get(name, [])}
+        for row in rows:
+            old_row = old_rows.get(_params(row))
+            if old_row is None:
+                continue
+            for metric, value in row.items():
+                if not isinstance(value, float) or not old_row.get(metric):
+                    continue
+                params = ', '.join(f'{k}={v}' for k, v in _params(row))
+                lines.append(f"{name} [{params}] {metric}: {value / old_row[metric]:.2f}x")
+    return lines
+
+
+def _version() -> str:
+    # Version from setup.py, with the commit when run from a git checkout
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'setup.py')) as f:
+        version = re.search(r"version='([^']+)'", f.read()).group(1)
+    try:
+        commit = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=root, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return f'{version}+{commit}' if commit else version
+
+
+def _params(row: Dict[str, Any]) -> tuple:
+    # Measurements are floats, everything else identifies the row
+    return tuple((k, v) for k, v in row.items() if not isinstance(v, float))
+
+
+if __name__ == '__main__':
+    params = argparse.ArgumentParser()
+    params.add_argument('modules', nargs='*', default=MODULES, help=f"Modules to run: {', '.join(MODULES)}")
+    params.add_argument('-o', '--output', nargs='?', help='File to store results in')
+    params.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files')
+    args = params.parse_args()
+    unknown = set(args.modules) - set(MODULES)
+    if unknown:
+        params.error(f"Unknown modules: {', '.join(sorted(unknown))}")
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            print('\n'.join(compare(json.load(old), json.load(new))))
+    else:
+        results = run(args.modules)
+        dumped = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(dumped)
+        else:
+            print(dumped)
@@ -35,6 +35,9 @@ setup(
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
     test_suite="tests",
     extras_require={
+        'fast': [
+            'orjson'
+        ],
         'dev': [
             'tox',
             'pyzabbix'
@@ -0,0 +1,173 @@
+import unittest
+import threading
+from unittest.mock import MagicMock
+from zappix.agent_active import AgentActive, ActiveChecksDiff
+from zappix.protocol import ActiveItem, ServerResponse
+from zappix.scheduler import ActiveScheduler, _parse_delay
+
+SUCCESS = '{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000100"}'
+
+
+class TestActiveScheduler(unittest.TestCase):
+    def setUp(self):
+        self.agent = MagicMock(spec=AgentActive)
+        self.agent.host = 'testhost'
+        self.sent = []
+
+        def send(session):
+            self.sent.append([(d.key, d.value, d.state, d.id) for d in session.data])
+            return ServerResponse(SUCCESS), False
+        self.agent.spool_collected_data.side_effect = send
+        self.scheduler = ActiveScheduler(self.agent, buffer_send=5, buffer_size=100)
+        self.scheduler.register('agent.ping', lambda key: 1)
+
+    def test_runs_items_on_their_delay(self):
+        self.scheduler.schedule([ActiveItem('agent.ping', 10), ActiveItem('agent.version', 30)], now=0)
+
+        self.assertEqual(self.scheduler.run_pending(0), 2)
+        self.assertEqual(self.scheduler.run_pending(5), 0)
+        self.assertEqual(self.scheduler.run_pending(10), 1)
+        self.assertEqual(self.scheduler.run_pending(29), 1)
+        self.assertEqual(self.scheduler.run_pending(30), 2)
+
+    def test_fixed_cadence(self):
+        self.scheduler.schedule([ActiveItem('agent.ping', 10)], now=0)
+        self.scheduler.run_pending(0)
+        self.scheduler.run_pending(12)
+
+        self.assertEqual(self.scheduler.run_pending(19), 0)
+        self.assertEqual(self.scheduler.run_pending(20), 1)
+
+    def test_key_name_and_decorator(self):
+        @self.scheduler.register('app.users')
+        def users(key):
+            return key
+
+        self.scheduler.schedule([ActiveItem('app.users[active]', 10)], now=0)
+        self.scheduler.run_pending(0)
+        self.scheduler.flush()
+
+        self.assertListEqual(self.sent, [[('app.users[active]', 'app.users[active]', None, 1)]])
+
+    def test_unsupported(self):
+        self.scheduler.register('broken', lambda key: 1 / 0)
+        self.scheduler.schedule([ActiveItem('broken', 10), ActiveItem('missing', 10)], now=0)
+        self.scheduler.run_pending(0)
+        self.scheduler.flush()
+
+        self.assertListEqual([state for _, _, state, _ in self.sent[0]], [1, 1])
+
+    def test_buffer_send(self):
+        self.scheduler.schedule([ActiveItem('agent.ping', 1)], now=0)
+        for now in range(5):
+            self.scheduler.run_pending(now)
+        self.assertListEqual(self.sent, [])
+
+        self.scheduler.run_pending(5)
+        self.assertEqual(len(self.sent), 1)
+        self.assertListEqual([i for _, _, _, i in self.sent[0]], [1, 2, 3, 4, 5, 6])
+
+    def test_buffer_size(self):
+        scheduler = ActiveScheduler(self.agent, buffer_send=60, buffer_size=3)
+        scheduler.register('agent.ping', lambda key: 1)
+        scheduler.schedule([ActiveItem(f'agent.ping[{i}]', 10) for i in range(3)], now=0)
+        scheduler.run_pending(0)
+
+        self.assertEqual(len(self.sent), 1)
+
+    def test_failed_send_is_retried(self):
+        self.agent.spool_collected_data.side_effect = None
+        self.agent.spool_collected_data.return_value = ServerResponse(''), False
+        self.scheduler.schedule([ActiveItem('agent.ping', 1)], now=0)
+        for now in range(6):
+            self.scheduler.run_pending(now)
+        self.assertEqual(self.agent.spool_collected_data.call_count, 1)
+
+        self.scheduler.run_pending(10)
+        self.assertEqual(self.agent.spool_collected_data.call_count, 2)
+
+    def test_buffered_values_are_not_resent(self):
+        self.agent.spool_collected_data.side_effect = None
+        self.agent.spool_collected_data.return_value = ServerResponse(''), True
+        self.scheduler.schedule([ActiveItem('agent.ping', 10)], now=0)
+        self.scheduler.run_pending(0)
+
+        self.assertFalse(self.scheduler.flush(now=0))
+        self.assertTrue(self.scheduler.flush(now=1))
+        self.assertEqual(self.agent.spool_collected_data.call_count, 1)
+
+    def test_refresh(self):
+        self.agent.refresh_active_checks.return_value = ActiveChecksDiff([ActiveItem('agent.ping', 10)], [], [])
+        self.scheduler.refresh(now=0)
+
+        self.assertEqual(self.scheduler.run_pending(0), 1)
+
+        self.agent.refresh_active_checks.return_value = None
+        self.scheduler.refresh(now=5)
+        self.assertEqual(self.scheduler.run_pending(5), 0)
+        self.assertEqual(self.scheduler.run_pending(10), 1)
+
+    def test_update_in_place(self):
+        self.scheduler.schedule([ActiveItem('agent.ping', 10), ActiveItem('agent.version', 10),
+                                 ActiveItem('agent.hostname', 10)], now=0)
+        self.scheduler.run_pending(0)
+
+        self.scheduler.update(ActiveChecksDiff(
+            [ActiveItem('system.uptime', 10)], ['agent.version'], [ActiveItem('agent.hostname', 30)]
+        ), now=5)
+
+        self.assertEqual(self.scheduler.run_pending(5), 1)
+        self.assertEqual(self.scheduler.run_pending(10), 1)
+        self.assertEqual(self.scheduler.run_pending(34), 2)
+        self.assertEqual(self.scheduler.run_pending(35), 1)
+
+    def test_start_stop(self):
+        collected = threading.Event()
+
+        def ping(key):
+            collected.set()
+            return 1
+        self.scheduler.register('agent.ping', ping)
+        self.agent.refresh_active_checks.return_value = ActiveChecksDiff([ActiveItem('agent.ping', 60)], [], [])
+        self.scheduler.start()
+        self.assertTrue(collected.wait(5))
+        self.scheduler.stop(timeout=5)
+
+        self.agent.refresh_active_checks.assert_called_once_with()
+        self.assertListEqual(self.sent, [[('agent.ping', 1, None, 1)]])
+
+    def test_slow_send_does_not_block_collection(self):
+        sending, release = threading.Event(), threading.Event()
+        collected = threading.Semaphore(0)
+
+        def send(session):
+            sending.set()
+            release.wait(5)
+            return ServerResponse(SUCCESS), False
+
+        def ping(key):
+            collected.release()
+            return 1
+        self.agent.spool_collected_data.side_effect = send
+        self.agent.refresh_active_checks.return_value = ActiveChecksDiff([ActiveItem('agent.ping', 1)], [], [])
+        scheduler = ActiveScheduler(self.agent, buffer_send=60, buffer_size=1)
+        scheduler.register('agent.ping', ping)
+        scheduler.start()
+        self.addCleanup(scheduler.stop, 5)
+
+        self.assertTrue(sending.wait(5))
+        # The next value is collected while the first one is still being sent
+        self.assertTrue(collected.acquire(timeout=5))
+        self.assertTrue(collected.acquire(timeout=5))
+        release.set()
+
+    def test_parse_delay(self):
+        self.assertEqual(_parse_delay(30), 30)
+        self.assertEqual(_parse_delay('30'), 30)
+        self.assertEqual(_parse_delay('5m'), 300)
+        self.assertEqual(_parse_delay('1h;50s/1-5,09:00-18:00'), 3600)
+        self.assertEqual(_parse_delay('{$MACRO}'), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+from zappix.agent_active import AgentActive
+from zappix.protocol import AgentData, AgentDataRequest
+
+
+def checks(*items):
+    data = ','.join('{"key":"%s","delay":%d,"lastlogsize":0,"mtime":0}' % item for item in items)
+    return '{"response":"success","data":[%s]}' % data
+
+
+class TestAgentActive(unittest.TestCase):
+    def test_init(self):
+        agent = AgentActive('testhost', 'server')
+        self.assertEqual(agent._port, 10051)
+        self.assertEqual(agent.host, 'testhost')
+
+    @patch.object(AgentActive, '_send')
+    def test_get_active_checks(self, mock_send):
+        mock_send.return_value = checks(('agent.ping', 30))
+
+        items = AgentActive('testhost', 'server').get_active_checks()
+
+        self.assertListEqual([i.key for i in items], ['agent.ping'])
+
+    @patch.object(AgentActive, '_send')
+    def test_refresh_active_checks(self, mock_send):
+        agent = AgentActive('testhost', 'server')
+
+        mock_send.return_value = checks(('agent.ping', 30), ('agent.version', 600))
+        diff = agent.refresh_active_checks()
+        self.assertListEqual(sorted(i.key for i in diff.added), ['agent.ping', 'agent.version'])
+        self.assertListEqual(diff.removed, [])
+        self.assertListEqual(diff.changed, [])
+
+        with patch('zappix.agent_active.ServerResponse') as mock_response:
+            self.assertIsNone(agent.refresh_active_checks())
+            mock_response.assert_not_called()
+
+        mock_send.return_value = checks(('agent.ping', 60), ('system.uptime', 30))
+        diff = agent.refresh_active_checks()
+        self.assertListEqual([i.key for i in diff.added], ['system.uptime'])
+        self.assertListEqual(diff.removed, ['agent.version'])
+        self.assertListEqual([(i.key, i.delay) for i in diff.changed], [('agent.ping', 60)])
+
+    @patch.object(AgentActive, '_send')
+    def test_refresh_unreachable_server(self, mock_send):
+        agent = AgentActive('testhost', 'server')
+        mock_send.return_value = checks(('agent.ping', 30))
+        agent.refresh_active_checks()
+
+        mock_send.return_value = ''
+        self.assertIsNone(agent.refresh_active_checks())
+        self.assertListEqual(list(agent._active_checks.checks), ['agent.ping'])
+
+
+    @patch.object(AgentActive, '_send_spooled')
+    def test_spool_collected_data(self, mock_send):
+        mock_send.return_value = '', True
+        request = AgentDataRequest()
+        request.add_item(AgentData('testhost', 'agent.ping', 1, 1600000000, 0))
+
+        response, buffered = AgentActive('testhost', 'server').spool_collected_data(request)
+
+        self.assertIsNone(response.response)
+        self.assertTrue(buffered)
+        with self.assertRaises(ValueError):
+            AgentActive('testhost', 'server').spool_collected_data([])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import random
+import threading
+import unittest
+from unittest.mock import MagicMock
+from zappix.aggregator import Aggregator, _Quantile
+from zappix.sender import Sender
+
+
+class TestAggregator(unittest.TestCase):
+    def setUp(self):
+        self.sender = MagicMock(spec=Sender)
+        self.sender.send_bulk.side_effect = lambda request, _: {
+            "processed": len(request.data), "failed": 0, "total": len(request.data), "seconds spent": 0.001
+        }
+
+    def sent(self):
+        return [(item.host, item.key, item.value, item.clock)
+                for call in self.sender.send_bulk.call_args_list for item in call[0][0].data]
+
+    def test_reducers(self):
+        reducers = {'last': 'last', 'min': 'min', 'max': 'max', 'sum': 'sum', 'count': 'count', 'p50': 'p50'}
+        with Aggregator(self.sender, window=60, reducers=reducers) as aggregator:
+            for key in list(reducers) + ['avg']:
+                for clock, value in zip([1200, 1230, 1210, 1259], [4, 1, 3, 2]):
+                    aggregator.add_value('host', key, value, clock)
+
+        self.assertListEqual(sorted(self.sent()), [
+            ('host', 'avg', 2.5, 1260),
+            ('host', 'count', 4, 1260),
+            ('host', 'last', 2, 1260),
+            ('host', 'max', 4, 1260),
+            ('host', 'min', 1, 1260),
+            ('host', 'p50', 3, 1260),
+            ('host', 'sum', 10, 1260),
+        ])
+
+    def test_windows_and_series(self):
+        aggregator = Aggregator(self.sender, window=10, reducer='sum')
+        for clock in range(1000, 1030):
+            aggregator.add_value('host1', 'key', 1, clock)
+            aggregator.add_value('host2', 'key', 2, clock)
+
+        aggregator.flush(1020)
+        self.assertListEqual(sorted(self.sent()), [
+            ('host1', 'key', 10, 1010), ('host1', 'key', 10, 1020),
+            ('host2', 'key', 20, 1010), ('host2', 'key', 20, 1020),
+        ])
+        self.sender.send_bulk.assert_called_with(self.sender.send_bulk.call_args[0][0], True)
+
+        # Window already sent
+        self.assertFalse(aggregator.add_value('host1', 'key', 1, 1015))
+        self.assertEqual(aggregator.late, 1)
+
+        aggregator.close()
+        self.assertEqual(len(self.sent()), 6)
+        self.assertEqual(aggregator.info['processed'], 6)
+
+    def test_string_values(self):
+        with Aggregator(self.sender, reducer='max', reducers={'state': 'last', 'rate': 'avg'}) as aggregator:
+            aggregator.add_value('host', 'load', '1.5', 60)
+            aggregator.add_value('host', 'load', '0.5', 61)
+            aggregator.add_value('host', 'state', 'up', 60)
+            aggregator.add_value('host', 'rate', '2', 60)
+            aggregator.add_value('host', 'rate', '4', 61)
+            with self.assertRaises(ValueError):
+                aggregator.add_value('host', 'load', 'high', 62)
+            with self.assertRaises(ValueError):
+                aggregator.add_value('host', 'rate', 'fast', 62)
+
+        self.assertListEqual(sorted(self.sent()), [
+            ('host', 'load', 1.5, 120), ('host', 'rate', 3.0, 120), ('host', 'state', 'up', 120)])
+
+    def test_background_flush(self):
+        sent = threading.Event()
+        aggregator = Aggregator(self.sender, window=0.05, delay=0, callback=lambda info: sent.set())
+        aggregator.add_value('host', 'key', 1)
+
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(len(self.sent()), 1)
+        aggregator.close()
+
+    def test_failing_callback(self):
+        sent = threading.Semaphore(0)
+
+        def callback(info):
+            sent.release()
+            raise RuntimeError("callback failed")
+
+        with Aggregator(self.sender, window=0.05, delay=0, callback=callback) as aggregator:
+            aggregator.add_value('host', 'key', 1)
+            self.assertTrue(sent.acquire(timeout=5))
+            # The background thread keeps flushing after the callback failed
+            aggregator.add_value('host', 'key', 2)
+            self.assertTrue(sent.acquire(timeout=5))
+
+        self.assertEqual(len(self.sent()), 2)
+
+    def test_unknown_reducer(self):
+        for reducer in ['median', 'p', 'p101']:
+            with self.subTest(reducer=reducer), self.assertRaises(ValueError):
+                Aggregator(self.sender, reducer=reducer)
+
+
+class TestQuantile(unittest.TestCase):
+    def test_estimate(self):
+        rng = random.Random(1)
+        quantiles = {p: _Quantile(p) for p in (0.5, 0.9, 0.99)}
+        for _ in range(10000):
+            value = rng.uniform(0, 100)
+            for quantile in quantiles.values():
+                quantile.add(value)
+
+        for p, quantile in quantiles.items():
+            self.assertAlmostEqual(quantile.value(), p * 100, delta=2)
+
+    def test_few_samples(self):
+        quantile = _Quantile(0.5)
+        for value in [3, 1, 2]:
+            quantile.add(value)
+        self.assertEqual(quantile.value(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
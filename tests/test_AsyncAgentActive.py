@@ -0,0 +1,40 @@
+import unittest
+import json
+from zappix.agent_active import AsyncAgentActive
+from zappix.protocol import AgentDataRequest, AgentData
+from tests.utils import AsyncServerTestCase
+
+
+class TestAsyncAgentActive(AsyncServerTestCase):
+    def client(self, port):
+        return AsyncAgentActive('testhost', '127.0.0.1', port)
+
+    def test_get_active_checks(self):
+        checks = self._run(
+            [b'{"response":"success","data":[{"key":"test","delay":30,"lastlogsize":0,"mtime":0}]}'],
+            lambda a: a.get_active_checks()
+        )
+
+        self.assertEqual(len(checks), 1)
+        self.assertEqual(checks[0].key, 'test')
+        self.assertDictEqual(json.loads(self.received[0]), {"request": "active checks", "host": "testhost"})
+
+    def test_send_collected_data(self):
+        data = AgentDataRequest([AgentData('testhost', 'test', 20, 1554133179, 1)])
+        response = self._run(
+            [b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000061"}'],
+            lambda a: a.send_collected_data(data)
+        )
+
+        self.assertEqual(response.response, 'success')
+        self.assertEqual(response.info['processed'], 1)
+
+    def test_send_invalid_data(self):
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(
+                AsyncAgentActive('testhost', '127.0.0.1').send_collected_data([])
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
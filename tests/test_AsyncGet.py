@@ -0,0 +1,72 @@
+import socket
+import unittest
+from zappix.exceptions import ZappixTimeout
+from zappix.get import AsyncGet, async_get_reports
+from tests.utils import AsyncServerTestCase, start_fake_server
+
+
+class TestAsyncGet(AsyncServerTestCase):
+    def client(self, port):
+        return AsyncGet('127.0.0.1', port)
+
+    def test_init(self):
+        get = AsyncGet('host')
+        self.assertEqual(get._port, 10050)
+        self.assertIsNone(get._source_address)
+
+    def test_get_value(self):
+        result = self._run([b'1'], lambda g: g.get_value('agent.ping'))
+
+        self.assertEqual(result, '1')
+        self.assertEqual(self.received, [b'agent.ping\n'])
+
+    def test_get_report(self):
+        result = self._run([b'1', b'1'], lambda g: g.get_report(['agent.ping', 'system.uptime']))
+
+        self.assertDictEqual(result, {'agent.ping': '1', 'system.uptime': '1'})
+
+    def test_get_report_limited(self):
+        result = self._run([b'1', b'2', b'3'], lambda g: g.get_report(['a', 'b', 'c'], concurrency=1))
+
+        self.assertDictEqual(result, {'a': '1', 'b': '2', 'c': '3'})
+
+    def test_get_reports(self):
+        async def run():
+            first = await start_fake_server([b'1', b'1'], self.received)
+            second = await start_fake_server([b'2'], self.received)
+            targets = [
+                ('127.0.0.1', first.sockets[0].getsockname()[1], ['agent.ping', 'agent.version']),
+                ('127.0.0.1', second.sockets[0].getsockname()[1], ['agent.ping']),
+            ]
+            try:
+                return targets, await async_get_reports(targets, concurrency=2)
+            finally:
+                for server in (first, second):
+                    server.close()
+                    await server.wait_closed()
+
+        targets, result = self.loop.run_until_complete(run())
+
+        self.assertDictEqual(result, {
+            targets[0][:2]: {'agent.ping': '1', 'agent.version': '1'},
+            targets[1][:2]: {'agent.ping': '2'},
+        })
+
+
+    def test_timeout(self):
+        silent = socket.socket()
+        silent.bind(('127.0.0.1', 0))
+        silent.listen(8)
+        self.addCleanup(silent.close)
+        port = silent.getsockname()[1]
+
+        getter = AsyncGet('127.0.0.1', port, timeout=0.2)
+        result = self.loop.run_until_complete(getter.get_report(['agent.ping'], return_exceptions=True))
+        self.assertIsInstance(result['agent.ping'], ZappixTimeout)
+
+        getter = AsyncGet('127.0.0.1', port, deadline=0.2)
+        self.assertEqual(self.loop.run_until_complete(getter.get_value('agent.ping')), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import json
+from zappix.sender import AsyncSender
+from zappix.protocol import SenderDataRequest, SenderData
+from tests.utils import AsyncServerTestCase
+
+
+class TestAsyncSender(AsyncServerTestCase):
+    def client(self, port):
+        return AsyncSender('127.0.0.1', port)
+
+    def test_init(self):
+        sender = AsyncSender('host')
+        self.assertEqual(sender._port, 10051)
+        self.assertIsNone(sender._source_address)
+
+    def test_send_value(self):
+        result = self._run(
+            [b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.060753"}'],
+            lambda s: s.send_value('testhost', 'test', 1)
+        )
+
+        self.assertIsNotNone(result.pop("seconds spent"))
+        self.assertDictEqual(result, {"processed": 1, "failed": 0, "total": 1})
+        self.assertDictEqual(
+            json.loads(self.received[0]),
+            {"request": "sender data", "data": [{"host": "testhost", "key": "test", "value": 1}]}
+        )
+
+    def test_send_bulk(self):
+        rq = SenderDataRequest(
+            [
+                SenderData('localhost', 'test.key', 1),
+                SenderData('Zabbix server', 'test.key2', "test_value"),
+            ]
+        )
+        result = self._run(
+            [b'{"response":"success", "info":"processed: 2; failed: 0; total: 2; seconds spent: 0.060753"}'],
+            lambda s: s.send_bulk(rq, with_timestamps=True)
+        )
+
+        self.assertDictEqual(result, {"processed": 2, "failed": 0, "total": 2, "seconds spent": 0.060753})
+        self.assertIn('clock', json.loads(self.received[0]))
+
+    def test_send_bulk_chunked(self):
+        rq = SenderDataRequest([SenderData('localhost', 'test.key', i) for i in range(3)])
+        result = self._run(
+            [b'{"response":"success", "info":"processed: 2; failed: 0; total: 2; seconds spent: 0.000100"}',
+             b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000100"}'],
+            lambda s: s.send_bulk(rq, chunk_size=2)
+        )
+
+        self.assertEqual(len(self.received), 2)
+        self.assertEqual(result['processed'], 3)
+        self.assertEqual(result['total'], 3)
+
+    def test_send_bad_port(self):
+        async def run():
+            return await AsyncSender('127.0.0.1', 1).send_value('testhost', 'test', 1)
+        self.assertIsNone(self.loop.run_until_complete(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
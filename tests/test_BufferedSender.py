@@ -0,0 +1,114 @@
+import unittest
+import threading
+from unittest.mock import MagicMock
+from zappix.buffered_sender import BufferedSender
+from zappix.protocol import SenderData
+from zappix.sender import Sender
+
+
+class TestBufferedSender(unittest.TestCase):
+    def setUp(self):
+        self.sender = MagicMock(spec=Sender)
+        self.sender.send_bulk.side_effect = lambda request, _: {
+            "processed": len(request.data), "failed": 0, "total": len(request.data), "seconds spent": 0.001
+        }
+
+    def sent_batches(self):
+        return [len(call[0][0].data) for call in self.sender.send_bulk.call_args_list]
+
+    def test_flush_on_item_count(self):
+        with BufferedSender(self.sender, max_items=3, max_age=60) as buffered:
+            for i in range(7):
+                buffered.add_value('testhost', 'test', i)
+            buffered.flush()
+            self.assertListEqual(self.sent_batches(), [3, 3, 1])
+
+    def test_flush_on_size(self):
+        with BufferedSender(self.sender, max_bytes=200, max_age=60) as buffered:
+            buffered.add_value('testhost', 'test', 'x' * 150)
+            buffered.add_value('testhost', 'test', 'x')
+            buffered.flush()
+            self.assertListEqual(self.sent_batches(), [1, 1])
+
+    def test_flush_on_age(self):
+        sent = threading.Event()
+        buffered = BufferedSender(self.sender, max_age=0.05, callback=lambda info: sent.set())
+        buffered.add_value('testhost', 'test', 1)
+
+        self.assertTrue(sent.wait(5))
+        self.assertListEqual(self.sent_batches(), [1])
+        buffered.close()
+
+    def test_close_flushes(self):
+        buffered = BufferedSender(self.sender, max_age=60)
+        buffered.add_item(SenderData('testhost', 'test', 1, 1554133179))
+        buffered.add_value('testhost', 'test', 2)
+        buffered.close()
+
+        request = self.sender.send_bulk.call_args[0][0]
+        self.assertEqual(request.data[0].clock, 1554133179)
+        self.assertIsNotNone(request.data[1].clock)
+        with self.assertRaises(RuntimeError):
+            buffered.add_value('testhost', 'test', 3)
+
+    def test_item_not_modified(self):
+        item = SenderData('testhost', 'test', 1)
+        with BufferedSender(self.sender, max_age=60) as buffered:
+            buffered.add_item(item)
+
+        self.assertIsNone(item.clock)
+        self.assertIsNotNone(self.sender.send_bulk.call_args[0][0].data[0].clock)
+
+    def test_callback_and_merged_info(self):
+        infos = []
+        with BufferedSender(self.sender, max_items=2, max_age=60, callback=infos.append) as buffered:
+            for i in range(3):
+                buffered.add_value('testhost', 'test', i)
+
+        self.assertListEqual([info['processed'] for info in infos], [2, 1])
+        self.assertEqual(buffered.info['processed'], 3)
+        self.assertEqual(buffered.info['total'], 3)
+
+    def test_failed_batch(self):
+        self.sender.send_bulk.side_effect = None
+        self.sender.send_bulk.return_value = None
+        infos = []
+        with BufferedSender(self.sender, callback=infos.append) as buffered:
+            buffered.add_value('testhost', 'test', 1)
+
+        self.assertListEqual(infos, [None])
+        self.assertIsNone(buffered.info)
+
+    def test_drop_policy(self):
+        release = threading.Event()
+        self.sender.send_bulk.side_effect = lambda request, _: release.wait(5) and None
+        buffered = BufferedSender(self.sender, max_items=1, queue_size=1, policy='drop')
+        buffered.add_value('testhost', 'test', 0)
+        accepted = [buffered.add_value('testhost', 'test', i) for i in range(1, 4)]
+        release.set()
+        buffered.close()
+
+        self.assertIn(False, accepted)
+        self.assertEqual(buffered.dropped, accepted.count(False))
+
+    def test_close_timeout_with_full_queue(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.sender.send_bulk.side_effect = lambda request, _: release.wait(5) and None
+        buffered = BufferedSender(self.sender, max_items=1, queue_size=1, policy='drop')
+        buffered.add_value('testhost', 'test', 0)
+        while not buffered.add_value('testhost', 'test', 1):
+            pass
+
+        self.assertFalse(buffered.flush(0.05))
+        finished = threading.Event()
+        threading.Thread(target=lambda: (buffered.close(0.1), finished.set()), daemon=True).start()
+        self.assertTrue(finished.wait(2))
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            BufferedSender(self.sender, policy='ignore')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import json
+from unittest.mock import patch
+from zappix.protocol import ColumnarSenderDataRequest, SenderData, SenderDataRequest, encode_request
+from zappix.sender import Sender
+
+
+class TestColumnarSenderDataRequest(unittest.TestCase):
+    def setUp(self):
+        self.items = [
+            SenderData('testhost', 'testkey', 1, 1554133179),
+            SenderData('testhost', 'testkey2', 1.5),
+            SenderData('Zabbix server', 'testkey', 'zażółć', 1554133180),
+            SenderData('testhost', 'testkey', 2 ** 70),
+            SenderData('testhost', 'testkey', [1, 2]),
+        ]
+
+    def test_basic_init(self):
+        request = ColumnarSenderDataRequest()
+        self.assertEqual(len(request), 0)
+        self.assertDictEqual(json.loads(encode_request(request)), {"request": "sender data"})
+
+    def test_encode_matches_sender_data_request(self):
+        request = ColumnarSenderDataRequest(self.items)
+        request.clock = 1554133179
+        reference = SenderDataRequest(self.items)
+        reference.clock = 1554133179
+
+        with patch('zappix.protocol._orjson', None):
+            self.assertEqual(encode_request(request), encode_request(reference))
+
+    def test_dictionary_encoding(self):
+        request = ColumnarSenderDataRequest(self.items)
+
+        self.assertListEqual(request._hosts, ['testhost', 'Zabbix server'])
+        self.assertListEqual(request._keys, ['testkey', 'testkey2'])
+        self.assertEqual(len(request._ints), 1)
+        self.assertEqual(len(request._floats), 1)
+
+    def test_iter(self):
+        request = ColumnarSenderDataRequest(self.items)
+
+        self.assertListEqual([repr(i) for i in request], [repr(i) for i in self.items])
+
+    def test_item_ns(self):
+        request = ColumnarSenderDataRequest()
+        request.add('testhost', 'testkey', 0, 1554133179, 455816800)
+
+        self.assertDictEqual(
+            json.loads(request.encode())['data'][0],
+            {"host": "testhost", "key": "testkey", "value": 0, "clock": 1554133179, "ns": 455816800}
+        )
+
+    def test_split(self):
+        request = ColumnarSenderDataRequest(self.items)
+        request.clock = 1554133179
+        chunks = list(request.split(max_items=2))
+
+        self.assertListEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertTrue(all(c.clock == 1554133179 for c in chunks))
+        self.assertListEqual([repr(i) for c in chunks for i in c], [repr(i) for i in self.items])
+
+    def test_add_invalid_item(self):
+        with self.assertRaises(TypeError):
+            ColumnarSenderDataRequest().add_item(('testhost', 'testkey', 1))
+
+    @patch.object(Sender, '_send')
+    def test_send_bulk(self, mock_send):
+        mock_send.return_value = ('{"response":"success", "info":"processed: 5; failed: 0; '
+                                  'total: 5; seconds spent: 0.000100"}')
+        request = ColumnarSenderDataRequest(self.items)
+
+        result = Sender('localhost').send_bulk(request, True)
+
+        self.assertEqual(result['processed'], 5)
+        self.assertEqual(len(json.loads(mock_send.call_args[0][0])['data']), 5)
+        self.assertIsNotNone(request.clock)
+
+
+if __name__ == '__main__':
+    unittest.main()
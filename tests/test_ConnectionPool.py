@@ -0,0 +1,68 @@
+import unittest
+import socket
+from unittest.mock import patch
+from zappix.pool import ConnectionPool
+from zappix.sender import Sender
+from zappix.get import Get
+from tests.utils import FakeServer
+
+RESPONSE = b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000050"}'
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(max_size=2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def test_reuses_persistent_connection(self):
+        self.server = FakeServer(RESPONSE, keep_alive=True)
+        sender = Sender('127.0.0.1', self.server.port, pool=self.pool)
+
+        for _ in range(5):
+            result = sender.send_value('testhost', 'test', 1)
+            self.assertEqual(result['processed'], 1)
+
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.requests), 5)
+
+    def test_reconnects_after_server_close(self):
+        self.server = FakeServer(b'1')
+        get = Get('127.0.0.1', self.server.port, pool=self.pool)
+
+        self.assertEqual(get.get_report(['a', 'b', 'c']), {'a': '1', 'b': '1', 'c': '1'})
+        self.assertEqual(self.server.connections, 3)
+
+    def test_reconnects_when_closed_after_health_check(self):
+        self.server = FakeServer(b'1')
+        get = Get('127.0.0.1', self.server.port, pool=self.pool)
+        get.get_value('agent.ping')
+
+        with patch.object(ConnectionPool, '_is_healthy', return_value=True):
+            self.assertEqual(get.get_value('agent.ping'), '1')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_dns_cache(self):
+        self.server = FakeServer(b'1', keep_alive=False)
+        get = Get('localhost', self.server.port, pool=self.pool)
+
+        with patch('zappix.pool.socket.getaddrinfo', wraps=socket.getaddrinfo) as getaddrinfo:
+            get.get_value('agent.ping')
+            get.get_value('agent.ping')
+
+        self.assertEqual(getaddrinfo.call_count, 1)
+
+    def test_max_size(self):
+        self.server = FakeServer(b'1', keep_alive=True)
+        connections = [self.pool.acquire('127.0.0.1', self.server.port)[0] for _ in range(3)]
+        for connection in connections:
+            self.pool.release(connection, '127.0.0.1', self.server.port)
+
+        self.assertEqual(len(self.pool._idle[('127.0.0.1', self.server.port, None)]), 2)
+        self.assertEqual(connections[2].fileno(), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
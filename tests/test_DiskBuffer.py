@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from zappix.disk_buffer import DiskBuffer
+from zappix.exceptions import ZappixConnectionError, ZappixProtocolError, ZappixTimeout
+from zappix.protocol import AgentData, AgentDataRequest, SenderData, SenderDataRequest, encode_request
+from zappix.sender import Sender
+
+SUCCESS = '{"response":"success","info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000100"}'
+
+
+class TestDiskBuffer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = self.tmp.name
+
+    def agent_payload(self, session, start, count):
+        request = AgentDataRequest()
+        request.session = session
+        request._item_id = start
+        for i in range(count):
+            request.add_item(AgentData('host', 'key', i, 1600000000 + i, i + 1))
+        return encode_request(request)
+
+    def test_replay_merges_batches(self):
+        buffer = DiskBuffer(self.path)
+        buffer.append(self.agent_payload('a', 1, 2))
+        buffer.append(self.agent_payload('a', 3, 2))
+        buffer.append(self.agent_payload('b', 1, 1))
+        self.assertEqual(len(buffer), 3)
+
+        send = MagicMock(return_value=SUCCESS)
+        self.assertTrue(buffer.replay(send))
+
+        requests = [json.loads(call[0][0]) for call in send.call_args_list]
+        self.assertListEqual([r['session'] for r in requests], ['a', 'b'])
+        self.assertListEqual([d['id'] for d in requests[0]['data']], [1, 2, 3, 4])
+        self.assertListEqual([d['clock'] for d in requests[0]['data']], [1600000000, 1600000001] * 2)
+        self.assertListEqual([d['ns'] for d in requests[0]['data']], [1, 2, 1, 2])
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(buffer.replayed, 5)
+
+    def test_batch_items(self):
+        buffer = DiskBuffer(self.path, batch_items=2)
+        for _ in range(3):
+            buffer.append(encode_request(SenderDataRequest([SenderData('host', 'key', 1)])))
+
+        send = MagicMock(return_value=SUCCESS)
+        buffer.replay(send)
+
+        self.assertListEqual([len(json.loads(call[0][0])['data']) for call in send.call_args_list], [2, 1])
+        self.assertIn('clock', json.loads(send.call_args[0][0])['data'][0])
+
+    def test_replay_stops_on_failure(self):
+        buffer = DiskBuffer(self.path, segment_bytes=1)
+        buffer.append(self.agent_payload('a', 1, 1))
+        buffer.append(self.agent_payload('b', 1, 1))
+
+        send = MagicMock(side_effect=[SUCCESS, ''])
+        self.assertFalse(buffer.replay(send))
+        self.assertEqual(len(buffer), 1)
+
+        buffer.close()
+        reopened = DiskBuffer(self.path)
+        self.assertEqual(len(reopened), 1)
+        send = MagicMock(return_value=SUCCESS)
+        reopened.replay(send)
+        self.assertEqual(json.loads(send.call_args[0][0])['session'], 'b')
+
+    def test_replay_keeps_undelivered_request(self):
+        buffer = DiskBuffer(self.path, segment_bytes=1)
+        self.addCleanup(buffer.close)
+        buffer.append(self.agent_payload('a', 1, 1))
+
+        send = MagicMock(side_effect=ZappixConnectionError("refused", ('server', 10051)))
+        with self.assertRaises(ZappixConnectionError):
+            buffer.replay(send)
+        self.assertEqual(len(buffer), 1)
+
+    def test_replay_drops_rejected_request(self):
+        buffer = DiskBuffer(self.path, segment_bytes=1)
+        self.addCleanup(buffer.close)
+        for session in 'abc':
+            buffer.append(self.agent_payload(session, 1, 1))
+
+        send = MagicMock(side_effect=[ZappixProtocolError("corrupted", ('server', 10051)), SUCCESS, SUCCESS])
+        self.assertTrue(buffer.replay(send))
+
+        self.assertListEqual([json.loads(call[0][0])['session'] for call in send.call_args_list], ['a', 'b', 'c'])
+        self.assertEqual(len(buffer), 0)
+
+    def test_replay_drops_unanswered_request(self):
+        buffer = DiskBuffer(self.path, segment_bytes=1)
+        self.addCleanup(buffer.close)
+        for session in 'ab':
+            buffer.append(self.agent_payload(session, 1, 1))
+
+        send = MagicMock(side_effect=ZappixTimeout("timed out", ('server', 10051), sent=True))
+        self.assertFalse(buffer.replay(send))
+        send.assert_called_once()
+        self.assertEqual(len(buffer), 1)
+
+        send = MagicMock(return_value=SUCCESS)
+        self.assertTrue(buffer.replay(send))
+        self.assertEqual(json.loads(send.call_args[0][0])['session'], 'b')
+
+    def test_eviction(self):
+        payload = self.agent_payload('a', 1, 1)
+        buffer = DiskBuffer(self.path, max_bytes=(len(payload) + 16) * 3, segment_bytes=1)
+        self.addCleanup(buffer.close)
+        for _ in range(5):
+            buffer.append(payload)
+
+        self.assertEqual(buffer.evicted, 2)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(len([n for n in os.listdir(self.path) if n.endswith('.log')]), 3)
+
+    def test_damaged_tail(self):
+        buffer = DiskBuffer(self.path)
+        buffer.append(self.agent_payload('a', 1, 1))
+        buffer.close()
+        with open(os.path.join(self.path, os.listdir(self.path)[0]), 'ab') as f:
+            f.write(b'\x10\x00')
+
+        self.assertEqual(len(DiskBuffer(self.path)), 1)
+
+    @patch.object(Sender, '_send_or_raise')
+    def test_sender_buffers_during_outage(self, mock_send):
+        buffer = DiskBuffer(self.path)
+        self.addCleanup(buffer.close)
+        sender = Sender('server', disk_buffer=buffer)
+
+        mock_send.side_effect = ZappixConnectionError("refused", ('server', 10051))
+        self.assertIsNone(sender.send_value('host', 'key', 1))
+        self.assertIsNone(sender.send_value('host', 'key', 2))
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(mock_send.call_count, 2)
+
+        mock_send.side_effect = None
+        mock_send.return_value = SUCCESS
+        sender.send_value('host', 'key', 3)
+
+        values = [d['value'] for call in mock_send.call_args_list[2:] for d in json.loads(call[0][0])['data']]
+        self.assertListEqual(values, [1, 2, 3])
+        self.assertEqual(len(buffer), 0)
+
+    @patch.object(Sender, '_send_or_raise')
+    def test_sender_skips_rejected_buffered_request(self, mock_send):
+        buffer = DiskBuffer(self.path)
+        self.addCleanup(buffer.close)
+        sender = Sender('server', disk_buffer=buffer)
+
+        mock_send.side_effect = ZappixConnectionError("refused", ('server', 10051))
+        sender.send_value('host', 'key', 1)
+        self.assertEqual(len(buffer), 1)
+
+        mock_send.side_effect = [ZappixProtocolError("corrupted", ('server', 10051)), SUCCESS, SUCCESS, SUCCESS]
+        for value in range(2, 5):
+            self.assertIsNotNone(sender.send_value('host', 'key', value))
+
+        values = [d['value'] for call in mock_send.call_args_list[2:] for d in json.loads(call[0][0])['data']]
+        self.assertListEqual(values, [2, 3, 4])
+        self.assertEqual(len(buffer), 0)
+
+    @patch.object(Sender, '_send_or_raise')
+    def test_sender_does_not_buffer_protocol_errors(self, mock_send):
+        buffer = DiskBuffer(self.path)
+        self.addCleanup(buffer.close)
+        sender = Sender('server', disk_buffer=buffer)
+
+        mock_send.side_effect = ZappixProtocolError("corrupted", ('server', 10051))
+        self.assertIsNone(sender.send_value('host', 'key', 1))
+        self.assertEqual(len(buffer), 0)
+
+        with self.assertRaises(ZappixProtocolError):
+            Sender('server', disk_buffer=buffer, raise_errors=True).send_value('host', 'key', 1)
+        self.assertEqual(len(buffer), 0)
+
+
+    @patch.object(Sender, '_send_or_raise')
+    def test_sender_does_not_buffer_unanswered_requests(self, mock_send):
+        buffer = DiskBuffer(self.path)
+        self.addCleanup(buffer.close)
+        sender = Sender('server', disk_buffer=buffer)
+
+        mock_send.side_effect = ZappixTimeout("timed out", ('server', 10051), sent=True)
+        self.assertIsNone(sender.send_value('host', 'key', 1))
+        self.assertEqual(len(buffer), 0)
+
+        mock_send.side_effect = ZappixTimeout("timed out", ('server', 10051))
+        self.assertIsNone(sender.send_value('host', 'key', 2))
+        self.assertEqual(len(buffer), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
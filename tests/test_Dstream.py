@@ -0,0 +1,331 @@
+import asyncio
+import os
+import unittest
+import struct
+import zlib
+from unittest.mock import MagicMock, patch
+from zappix.dstream import _Dstream, _AsyncDstream, _read_request
+from zappix.exceptions import ZappixProtocolError
+from tests.utils import socket_stream, pack_response
+
+
+class TestDstreamReceive(unittest.TestCase):
+    def setUp(self):
+        self.msock = MagicMock()
+        self.dstream = _Dstream('localhost', buffer_size=4)
+
+    def test_recv_stops_on_declared_length(self):
+        self.msock.recv_into.side_effect = socket_stream(pack_response(b'abcdefghij'), b'trailing')
+
+        data = self.dstream._recv_info(self.msock)
+
+        self.assertEqual(bytes(data), pack_response(b'abcdefghij'))
+        self.assertEqual(self.dstream._parse_response(data), 'abcdefghij')
+
+    def test_recv_respects_buffer_size(self):
+        self.msock.recv_into.side_effect = socket_stream(pack_response(b'abcdefghij'))
+
+        self.dstream._recv_info(self.msock)
+
+        for call in self.msock.recv_into.call_args_list:
+            self.assertLessEqual(len(call[0][0]), 4)
+
+    def test_recv_truncated(self):
+        self.msock.recv_into.side_effect = socket_stream(pack_response(b'abcdefghij')[:-2])
+
+        with self.assertRaises(struct.error):
+            self.dstream._recv_info(self.msock)
+
+    def test_recv_oversized(self):
+        dstream = _Dstream('localhost', max_response_size=9)
+        self.msock.recv_into.side_effect = socket_stream(pack_response(b'abcdefghij'))
+
+        with self.assertRaises(struct.error):
+            dstream._recv_info(self.msock)
+
+    def test_recv_oversized_compressed(self):
+        body = zlib.compress(b'payload')
+        self.msock.recv_into.side_effect = socket_stream(b'ZBXD\x03' + struct.pack('<II', len(body), 2 ** 32 - 1) + body)
+
+        with self.assertRaises(struct.error):
+            self.dstream._recv_info(self.msock)
+
+    def test_large_packet_limit(self):
+        # Large packets may exceed the limit of standard ones
+        self.dstream._check_size(0x05, 2 ** 31, 0)
+        self.dstream._check_size(0x07, 2 ** 20, 2 ** 33)
+        with self.assertRaises(struct.error):
+            self.dstream._check_size(0x01, 2 ** 31, 0)
+        with self.assertRaises(struct.error):
+            self.dstream._check_size(0x05, 2 ** 35, 0)
+        with self.assertRaises(struct.error):
+            _Dstream('localhost', max_large_response_size=2 ** 30)._check_size(0x05, 2 ** 31, 0)
+
+    def test_async_recv_oversized(self):
+        async def receive():
+            reader = asyncio.StreamReader()
+            reader.feed_data(pack_response(b'abcdefghij'))
+            reader.feed_eof()
+            return await _AsyncDstream('localhost', max_response_size=9)._recv_info(reader)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with self.assertRaises(struct.error):
+            loop.run_until_complete(receive())
+
+    def test_parse_invalid_header(self):
+        with self.assertRaises(struct.error):
+            self.dstream._parse_response(b'HTTP/1.1 400 Bad Request')
+
+
+class TestDstreamSend(unittest.TestCase):
+    def setUp(self):
+        self.msock = MagicMock()
+        self.dstream = _Dstream('localhost')
+
+    def test_prepare_payload(self):
+        header, body = self.dstream._prepare_payload(b'payload')
+
+        self.assertEqual(header, b'ZBXD\x01\x07\x00\x00\x00\x00\x00\x00\x00')
+        self.assertEqual(body, b'payload')
+
+    def test_send_buffers_partial(self):
+        sent = []
+        payload = b'p' * 20000
+
+        def sendmsg(buffers):
+            chunk = b''.join(bytes(b) for b in buffers)[:4999]
+            sent.append(chunk)
+            return len(chunk)
+        self.msock.sendmsg.side_effect = sendmsg
+
+        self.dstream._send_buffers(self.msock, [b'ZBXD\x01header', payload])
+
+        self.assertEqual(b''.join(sent), b'ZBXD\x01header' + payload)
+        self.msock.sendall.assert_not_called()
+
+    def test_send_small_buffers(self):
+        self.dstream._send_buffers(self.msock, [b'head', b'body'])
+
+        self.msock.sendall.assert_called_once_with(b'headbody')
+        self.msock.sendmsg.assert_not_called()
+
+    def test_send_buffers_without_sendmsg(self):
+        msock = MagicMock(spec=['sendall'])
+
+        self.dstream._send_buffers(msock, [b'head', b'body'])
+
+        msock.sendall.assert_called_once_with(b'headbody')
+
+
+
+class TestDstreamCompression(unittest.TestCase):
+    def setUp(self):
+        self.dstream = _Dstream('localhost', compression=True, compression_threshold=100)
+
+    def test_small_payload_not_compressed(self):
+        header, body = self.dstream._prepare_payload(b'p' * 99)
+
+        self.assertEqual(header, b'ZBXD\x01' + struct.pack('<II', 99, 0))
+        self.assertEqual(body, b'p' * 99)
+
+    def test_compressed_payload(self):
+        payload = b'{"request":"sender data","data":[]}' * 100
+        header, body = self.dstream._prepare_payload(payload)
+
+        self.assertEqual(header, b'ZBXD\x03' + struct.pack('<II', len(body), len(payload)))
+        self.assertLess(len(body), len(payload))
+        self.assertEqual(zlib.decompress(body), payload)
+
+    def test_incompressible_payload(self):
+        payload = os.urandom(1000)
+        header, body = self.dstream._prepare_payload(payload)
+
+        self.assertEqual(header[4], 0x01)
+        self.assertEqual(body, payload)
+
+    def test_compression_disabled(self):
+        header, _ = _Dstream('localhost')._prepare_payload(b'p' * 100000)
+
+        self.assertEqual(header[4], 0x01)
+
+    def test_parse_compressed_response(self):
+        payload = b'{"response":"success","data":[]}' * 50
+        body = zlib.compress(payload)
+        response = b'ZBXD\x03' + struct.pack('<II', len(body), len(payload)) + body
+
+        self.assertEqual(_Dstream('localhost')._parse_response(response), payload.decode('utf-8'))
+
+    def test_recv_compressed_response(self):
+        payload = b'{"response":"success"}' * 50
+        body = zlib.compress(payload)
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x03' + struct.pack('<II', len(body), len(payload)) + body)
+
+        data = self.dstream._recv_info(msock)
+
+        self.assertEqual(bytes(data[:13]), b'ZBXD\x01' + struct.pack('<II', len(payload), 0))
+        self.assertEqual(self.dstream._parse_response(data), payload.decode('utf-8'))
+
+    def test_recv_compressed_in_chunks(self):
+        payload = bytes(range(256)) * 40
+        body = zlib.compress(payload)
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x03' + struct.pack('<II', len(body), len(payload)) + body)
+
+        data = _Dstream('localhost', buffer_size=7)._recv_info(msock)
+
+        self.assertEqual(bytes(data[13:]), payload)
+        for call in msock.recv_into.call_args_list:
+            self.assertLessEqual(len(call[0][0]), 7)
+
+    def test_recv_compressed_exceeding_declared_length(self):
+        body = zlib.compress(b'a' * 100)
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x03' + struct.pack('<II', len(body), 50) + body)
+
+        with self.assertRaises(struct.error):
+            self.dstream._recv_info(msock)
+
+    def test_parse_corrupted_compressed_response(self):
+        response = b'ZBXD\x03' + struct.pack('<II', 4, 100) + b'junk'
+
+        with self.assertRaises(struct.error):
+            self.dstream._parse_response(response)
+
+    def test_parse_wrong_uncompressed_length(self):
+        body = zlib.compress(b'abc')
+        response = b'ZBXD\x03' + struct.pack('<II', len(body), 4) + body
+
+        with self.assertRaises(struct.error):
+            self.dstream._parse_response(response)
+
+
+class TestDstreamLargePackets(unittest.TestCase):
+    def setUp(self):
+        self.dstream = _Dstream('localhost')
+
+    def test_large_header_above_threshold(self):
+        with patch('zappix.dstream._LARGE_THRESHOLD', 10):
+            header, body = self.dstream._prepare_payload(b'p' * 11)
+            small_header, _ = self.dstream._prepare_payload(b'p' * 10)
+
+        self.assertEqual(header, b'ZBXD\x05' + struct.pack('<QQ', 11, 0))
+        self.assertEqual(small_header, b'ZBXD\x01' + struct.pack('<II', 10, 0))
+
+    def test_large_compressed_header(self):
+        dstream = _Dstream('localhost', compression=True, compression_threshold=0)
+        with patch('zappix.dstream._LARGE_THRESHOLD', 10):
+            header, body = dstream._prepare_payload(b'p' * 100)
+
+        self.assertEqual(header, b'ZBXD\x07' + struct.pack('<QQ', len(body), 100))
+
+    def test_parse_large_response(self):
+        response = b'ZBXD\x05' + struct.pack('<QQ', 7, 0) + b'payload'
+
+        self.assertEqual(self.dstream._parse_response(response), 'payload')
+
+    def test_recv_large_response(self):
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x05' + struct.pack('<QQ', 7, 0) + b'payload')
+
+        data = self.dstream._recv_info(msock)
+
+        self.assertEqual(self.dstream._parse_response(data), 'payload')
+
+    def test_recv_large_compressed_response(self):
+        payload = b'{"response":"success"}' * 50
+        body = zlib.compress(payload)
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x07' + struct.pack('<QQ', len(body), len(payload)) + body)
+
+        data = self.dstream._recv_info(msock)
+
+        self.assertEqual(bytes(data[:21]), b'ZBXD\x05' + struct.pack('<QQ', len(payload), 0))
+        self.assertEqual(self.dstream._parse_response(data), payload.decode('utf-8'))
+
+    def test_async_recv_large_compressed_response(self):
+        payload = b'{"response":"success"}' * 50
+        body = zlib.compress(payload)
+
+        async def receive():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'ZBXD\x07' + struct.pack('<QQ', len(body), len(payload)) + body)
+            reader.feed_eof()
+            dstream = _AsyncDstream('localhost', buffer_size=16)
+            return dstream._parse_response(await dstream._recv_info(reader))
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertEqual(loop.run_until_complete(receive()), payload.decode('utf-8'))
+
+    def test_recv_truncated_large_header(self):
+        msock = MagicMock()
+        msock.recv_into.side_effect = socket_stream(b'ZBXD\x05' + struct.pack('<QQ', 7, 0)[:10])
+
+        with self.assertRaises(struct.error):
+            self.dstream._recv_info(msock)
+
+
+class TestDstreamErrors(unittest.TestCase):
+    @patch('zappix.dstream.socket.create_connection')
+    def test_corrupted_response(self, mock_connect):
+        mock_connect.return_value.recv_into.side_effect = socket_stream(b'HTTP/1.1 400 Bad Request\r\n')
+
+        self.assertEqual(_Dstream('localhost')._send(b'payload'), '')
+        mock_connect.return_value.recv_into.side_effect = socket_stream(b'HTTP/1.1 400 Bad Request\r\n')
+        with self.assertRaises(ZappixProtocolError):
+            _Dstream('localhost', raise_errors=True)._send(b'payload')
+
+
+
+class TestReadRequest(unittest.TestCase):
+    def read(self, data, **kwargs):
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return await _read_request(reader, **kwargs)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        return loop.run_until_complete(read())
+
+    def test_compressed_request(self):
+        body = zlib.compress(b'payload')
+
+        result = self.read(b'ZBXD\x03' + struct.pack('<II', len(body), 7) + body)
+
+        self.assertEqual(result, (b'payload', True, 13 + len(body)))
+
+    def test_oversized_request(self):
+        with self.assertRaises(struct.error):
+            self.read(b'ZBXD\x01' + struct.pack('<II', 11, 0) + b'x' * 11, max_size=10)
+
+    def test_oversized_uncompressed_length(self):
+        body = zlib.compress(b'payload')
+
+        with self.assertRaises(struct.error):
+            self.read(b'ZBXD\x03' + struct.pack('<II', len(body), 2 ** 32 - 1) + body)
+
+    def test_large_request_limit(self):
+        result = self.read(b'ZBXD\x05' + struct.pack('<QQ', 11, 0) + b'x' * 11, max_size=10)
+        self.assertEqual(result, (b'x' * 11, False, 21 + 11))
+
+        # Declared above 1 GiB, rejected only by the large-packet limit
+        with self.assertRaises(asyncio.IncompleteReadError):
+            self.read(b'ZBXD\x05' + struct.pack('<QQ', 2 ** 31, 0))
+        with self.assertRaises(struct.error):
+            self.read(b'ZBXD\x05' + struct.pack('<QQ', 2 ** 31, 0), max_large_size=2 ** 30)
+
+    def test_wrong_uncompressed_length(self):
+        body = zlib.compress(b'payload')
+
+        with self.assertRaises(struct.error):
+            self.read(b'ZBXD\x03' + struct.pack('<II', len(body), 3) + body)
+        with self.assertRaises(struct.error):
+            self.read(b'ZBXD\x03' + struct.pack('<II', len(body), 8) + body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,10 @@
+import socket
+import time
 import unittest
 from unittest.mock import patch, MagicMock
-from zappix.get import Get
+from tests.utils import socket_stream, FakeServer
+from zappix.exceptions import ZappixTimeout
+from zappix.get import Get, get_reports
 
 
 class TestGet(unittest.TestCase):
@@ -18,9 +22,9 @@ class TestGet(unittest.TestCase):
     @patch('zappix.dstream.socket')
     def test_get_value(self, mock_socket):
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x01\x00\x00\x00\x00\x00\x00\x00', b'1', b''
-            ]
+            )
 
         g = Get('localhost')
         result = g.get_value('agent.ping')
@@ -30,10 +34,10 @@ class TestGet(unittest.TestCase):
     @patch('zappix.dstream.socket')
     def test_get_report(self, mock_socket):
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x01\x00\x00\x00\x00\x00\x00\x00', b'1', b'',
             b'ZBXD\x01', b'\x09\x00\x00\x00\x00\x00\x00\x00', b'localhost', b''
-            ]
+            )
 
         g = Get('localhost')
         result = g.get_report(('agent.ping', 'system.hostname'))
@@ -43,6 +47,73 @@ class TestGet(unittest.TestCase):
             {'agent.ping': '1', 'system.hostname': 'localhost'}
         )
 
+    @patch.object(Get, '_send')
+    def test_get_report_concurrent(self, mock_send):
+        mock_send.side_effect = lambda payload: payload.decode('utf-8').strip().upper()
+
+        g = Get('localhost')
+        result = g.get_report(['agent.ping', 'system.hostname', 'agent.version'], concurrency=3)
+
+        self.assertDictEqual(
+            result,
+            {'agent.ping': 'AGENT.PING', 'system.hostname': 'SYSTEM.HOSTNAME', 'agent.version': 'AGENT.VERSION'}
+        )
+        self.assertEqual(mock_send.call_count, 3)
+
+    @patch.object(Get, '_send', autospec=True)
+    def test_get_reports(self, mock_send):
+        mock_send.side_effect = lambda self, payload: f"{self._ip}:{payload.decode('utf-8').strip()}"
+
+        result = get_reports([
+            ('agent1', 10050, ['agent.ping', 'agent.version']),
+            ('agent2', 10051, ['agent.ping']),
+        ], concurrency=2)
+
+        self.assertDictEqual(
+            result,
+            {
+                ('agent1', 10050): {'agent.ping': 'agent1:agent.ping', 'agent.version': 'agent1:agent.version'},
+                ('agent2', 10051): {'agent.ping': 'agent2:agent.ping'},
+            }
+        )
+
+
+
+class TestGetTimeouts(unittest.TestCase):
+    def setUp(self):
+        # Accepts connections into the backlog but never answers
+        self.silent = socket.socket()
+        self.silent.bind(('127.0.0.1', 0))
+        self.silent.listen(8)
+        self.addCleanup(self.silent.close)
+        self.silent_port = self.silent.getsockname()[1]
+
+    def test_read_timeout(self):
+        start = time.monotonic()
+        self.assertEqual(Get('127.0.0.1', self.silent_port, timeout=0.2).get_value('agent.ping'), '')
+        self.assertLess(time.monotonic() - start, 2)
+
+        with self.assertRaises(ZappixTimeout):
+            Get('127.0.0.1', self.silent_port, timeout=0.2, raise_errors=True).get_value('agent.ping')
+
+    def test_deadline(self):
+        start = time.monotonic()
+        with self.assertRaises(ZappixTimeout):
+            Get('127.0.0.1', self.silent_port, deadline=0.2, raise_errors=True).get_value('agent.ping')
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_sweep_reports_slow_targets(self):
+        server = FakeServer(b'1')
+        self.addCleanup(server.close)
+
+        result = get_reports([
+            ('127.0.0.1', self.silent_port, ['agent.ping']),
+            ('127.0.0.1', server.port, ['agent.ping']),
+        ], timeout=0.2, return_exceptions=True)
+
+        self.assertIsInstance(result[('127.0.0.1', self.silent_port)]['agent.ping'], ZappixTimeout)
+        self.assertEqual(result[('127.0.0.1', server.port)]['agent.ping'], '1')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,109 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+from zappix.agent_active import MultiHostAgentActive
+from zappix.pool import ConnectionPool
+from tests.utils import FakeServer
+
+
+def checks(*keys):
+    data = ','.join('{"key":"%s","delay":30,"lastlogsize":0,"mtime":0}' % key for key in keys)
+    return '{"response":"success","data":[%s]}' % data
+
+
+SUCCESS = '{"response":"success","info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000100"}'
+
+
+class TestMultiHostAgentActive(unittest.TestCase):
+    @patch.object(MultiHostAgentActive, '_send')
+    def test_get_active_checks(self, mock_send):
+        mock_send.side_effect = lambda payload: checks(json.loads(payload)['host'] + '.ping')
+        agent = MultiHostAgentActive(['host1', 'host2', 'host3'], 'server', workers=2)
+
+        result = agent.get_active_checks()
+
+        self.assertListEqual(sorted(result), ['host1', 'host2', 'host3'])
+        self.assertListEqual([i.key for i in result['host2']], ['host2.ping'])
+
+    @patch.object(MultiHostAgentActive, '_send')
+    def test_refresh_active_checks(self, mock_send):
+        responses = {'host1': checks('agent.ping'), 'host2': checks('agent.ping')}
+        mock_send.side_effect = lambda payload: responses[json.loads(payload)['host']]
+        agent = MultiHostAgentActive(['host1', 'host2'], 'server')
+
+        self.assertListEqual(sorted(agent.refresh_active_checks()), ['host1', 'host2'])
+
+        responses['host2'] = checks('agent.ping', 'agent.version')
+        diffs = agent.refresh_active_checks()
+        self.assertListEqual(list(diffs), ['host2'])
+        self.assertListEqual([i.key for i in diffs['host2'].added], ['agent.version'])
+
+    @patch.object(MultiHostAgentActive, '_send')
+    def test_sessions_per_host(self, mock_send):
+        mock_send.return_value = SUCCESS
+        agent = MultiHostAgentActive(['host1', 'host2'], 'server')
+        agent.add_value('host1', 'key', 1)
+        agent.add_value('host1', 'key', 2)
+        agent.add_value('host2', 'key', 3)
+
+        info = agent.send_collected_data()
+
+        self.assertEqual(info['processed'], 2)
+        requests = sorted((json.loads(call[0][0]) for call in mock_send.call_args_list), key=lambda r: r['data'][0]['host'])
+        self.assertListEqual([d['id'] for d in requests[0]['data']], [1, 2])
+        self.assertListEqual([d['id'] for d in requests[1]['data']], [1])
+        self.assertNotEqual(requests[0]['session'], requests[1]['session'])
+
+        agent.add_value('host1', 'key', 4)
+        agent.send_collected_data()
+        last = json.loads(mock_send.call_args[0][0])
+        self.assertEqual(last['session'], requests[0]['session'])
+        self.assertListEqual([d['id'] for d in last['data']], [3])
+
+    @patch.object(MultiHostAgentActive, '_send')
+    def test_failed_send_keeps_data(self, mock_send):
+        mock_send.return_value = ''
+        agent = MultiHostAgentActive(['host1'], 'server')
+        agent.add_value('host1', 'key', 1)
+
+        self.assertIsNone(agent.send_collected_data())
+
+        mock_send.return_value = SUCCESS
+        agent.send_collected_data()
+        self.assertEqual(len(json.loads(mock_send.call_args[0][0])['data']), 1)
+        mock_send.reset_mock()
+        agent.send_collected_data()
+        mock_send.assert_not_called()
+
+    def test_unknown_host(self):
+        agent = MultiHostAgentActive(['host1'], 'server')
+        with self.assertRaises(KeyError):
+            agent.add_value('host2', 'key', 1)
+
+    def test_shared_connections(self):
+        server = FakeServer(SUCCESS.encode(), keep_alive=True)
+        self.addCleanup(server.close)
+        hosts = [f'host{i}' for i in range(20)]
+        with MultiHostAgentActive(hosts, '127.0.0.1', server.port, workers=4) as agent:
+            for host in hosts:
+                agent.add_value(host, 'key', 1)
+
+            info = agent.send_collected_data()
+
+        self.assertEqual(info['processed'], 20)
+        self.assertEqual(len(server.requests), 20)
+        self.assertLessEqual(server.connections, 4)
+
+
+    def test_close_keeps_given_pool(self):
+        pool = MagicMock(spec=ConnectionPool)
+        MultiHostAgentActive(['host1'], 'server', pool=pool).close()
+        pool.close.assert_not_called()
+
+        with patch.object(ConnectionPool, 'close') as close:
+            with MultiHostAgentActive(['host1'], 'server'):
+                pass
+        close.assert_called_once_with()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import asyncio
+import socket
+import time
+import unittest
+from unittest.mock import patch
+from zappix.agent_passive import ItemRegistry, PassiveAgent, parse_key
+from zappix.exceptions import ZappixConnectionError
+from zappix.get import AsyncGet, Get
+
+
+class TestParseKey(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(parse_key('agent.ping'), ('agent.ping', []))
+
+    def test_params(self):
+        self.assertEqual(parse_key('vfs.fs.size[/,free]'), ('vfs.fs.size', ['/', 'free']))
+        self.assertEqual(parse_key('key[]'), ('key', ['']))
+        self.assertEqual(parse_key('key[a,,c]'), ('key', ['a', '', 'c']))
+
+    def test_quoted(self):
+        self.assertEqual(parse_key('key[ "a,b]" , "say \\"hi\\""]'), ('key', ['a,b]', 'say "hi"']))
+
+    def test_array(self):
+        self.assertEqual(parse_key('key[a,[b,"c,d"],e]'), ('key', ['a', ['b', 'c,d'], 'e']))
+
+    def test_invalid(self):
+        for key in ['', 'key[a', 'key[a]b', 'key["a]', 'ke y', 'key["a"b]', 'key[[a,[b]]]']:
+            with self.subTest(key=key), self.assertRaises(ValueError):
+                parse_key(key)
+
+
+class TestItemRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = ItemRegistry()
+
+    def test_handler_params(self):
+        self.registry.register('app.sum', lambda *args: sum(int(a) for a in args))
+
+        self.assertEqual(self.registry.get('app.sum[1,2,3]'), '6')
+        self.assertEqual(self.registry.get('app.sum'), '0')
+
+    def test_decorator(self):
+        @self.registry.register('app.flag')
+        def flag():
+            return True
+
+        self.assertTrue(flag())
+        self.assertIn('app.flag', self.registry)
+        self.assertEqual(self.registry.get('app.flag'), '1')
+
+    def test_not_supported(self):
+        self.registry.register('app.fail', lambda: 1 / 0)
+
+        self.assertEqual(self.registry.get('unknown'), 'ZBX_NOTSUPPORTED\0Unsupported item key.')
+        self.assertEqual(self.registry.get('app.fail[a'), 'ZBX_NOTSUPPORTED\0Invalid item key format.')
+        self.assertEqual(self.registry.get('app.fail'), 'ZBX_NOTSUPPORTED\0division by zero')
+
+    def test_ttl(self):
+        calls = []
+        self.registry.register('app.calls', lambda arg: calls.append(arg) or len(calls), ttl=10)
+
+        self.assertEqual(self.registry.get('app.calls[a]'), '1')
+        self.assertEqual(self.registry.get('app.calls[a]'), '1')
+        self.assertEqual(self.registry.get('app.calls[b]'), '2')
+        self.assertEqual((self.registry.hits, self.registry.misses), (1, 2))
+
+        with patch('zappix.agent_passive.time.monotonic', return_value=time.monotonic() + 11):
+            self.assertEqual(self.registry.get('app.calls[a]'), '3')
+
+    def test_cache_bounded(self):
+        registry = ItemRegistry(max_cache_size=2)
+        registry.register('app.echo', lambda arg: arg, ttl=10)
+        for arg in 'abc':
+            registry.get(f'app.echo[{arg}]')
+
+        self.assertListEqual(list(registry._cache), ['app.echo[b]', 'app.echo[c]'])
+
+    def test_expired_values_removed(self):
+        values = [1, None]
+        self.registry.register('app.once', lambda: values.pop(0), ttl=10)
+        self.registry.get('app.once')
+
+        with patch('zappix.agent_passive.time.monotonic', return_value=time.monotonic() + 11):
+            self.registry.get('app.once')
+        self.assertNotIn('app.once', self.registry._cache)
+
+    def test_register_invalidates_cache(self):
+        self.registry.register('app.value', lambda: 1, ttl=10)
+        self.assertEqual(self.registry.get('app.value'), '1')
+
+        self.registry.register('app.value', lambda: 2, ttl=10)
+        self.assertEqual(self.registry.get('app.value'), '2')
+
+        self.registry.unregister('app.value')
+        self.assertEqual(self.registry.get('app.value'), 'ZBX_NOTSUPPORTED\0Unsupported item key.')
+
+    def test_coroutine_handler(self):
+        async def handler(arg):
+            await asyncio.sleep(0)
+            return arg.upper()
+        self.registry.register('app.upper', handler)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertEqual(loop.run_until_complete(self.registry.get_async('app.upper[abc]')), 'ABC')
+        self.assertTrue(self.registry.get('app.upper[abc]').startswith('ZBX_NOTSUPPORTED'))
+
+
+class TestPassiveAgent(unittest.TestCase):
+    def start(self, **kwargs):
+        registry = ItemRegistry()
+        registry.register('app.echo', lambda *args: ','.join(args))
+        agent = PassiveAgent(registry, '127.0.0.1', 0, **kwargs).start()
+        self.addCleanup(agent.stop)
+        return agent
+
+    def test_get(self):
+        agent = self.start()
+        getter = Get('127.0.0.1', agent.port)
+
+        self.assertEqual(getter.get_value('agent.ping'), '1')
+        self.assertEqual(getter.get_value('app.echo[a,"b c"]'), 'a,b c')
+        self.assertEqual(getter.get_value('missing'), 'ZBX_NOTSUPPORTED\0Unsupported item key.')
+        self.assertEqual(agent.requests, 3)
+
+    def test_framed_compressed_request(self):
+        agent = self.start()
+        getter = Get('127.0.0.1', agent.port, compression=True, compression_threshold=0)
+
+        self.assertEqual(getter.get_value('app.echo[x]'), 'x')
+
+    def test_plain_socket(self):
+        agent = self.start()
+
+        with socket.create_connection(('127.0.0.1', agent.port)) as s:
+            s.sendall(b'agent.ping\n')
+            response = s.recv(1024)
+
+        self.assertEqual(response, b'ZBXD\x01\x01\x00\x00\x00\x00\x00\x00\x001')
+
+    def test_allowed_hosts(self):
+        agent = self.start(allowed_hosts=['192.0.2.1'])
+
+        with self.assertRaises(ZappixConnectionError):
+            Get('127.0.0.1', agent.port, raise_errors=True).get_value('agent.ping')
+        self.assertEqual(agent.rejected, 1)
+
+    def test_port_in_use(self):
+        agent = self.start()
+
+        with self.assertRaises(OSError):
+            PassiveAgent(host='127.0.0.1', port=agent.port).start()
+
+    def test_start_server(self):
+        agent = PassiveAgent(host='127.0.0.1', port=0)
+
+        async def poll():
+            server = await agent.start_server()
+            try:
+                return await AsyncGet('127.0.0.1', agent.port).get_report(['agent.ping'] * 3)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.assertDictEqual(loop.run_until_complete(poll()), {'agent.ping': '1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
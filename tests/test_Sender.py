@@ -1,8 +1,14 @@
 import unittest
 import tempfile
 import os
+import io
+import json
+import gzip
 import random
 from unittest.mock import patch, MagicMock
+from tests.utils import socket_stream
+from zappix.disk_buffer import DiskBuffer
+from zappix.exceptions import ZappixConnectionError, ZappixProtocolError
 from zappix.sender import Sender
 from zappix.protocol import SenderDataRequest, SenderData
 
@@ -22,10 +28,10 @@ class TestSender(unittest.TestCase):
     @patch('zappix.dstream.socket')
     def test_get_value(self, mock_socket):
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x5b\x00\x00\x00\x00\x00\x00\x00',
             b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.060753"}', b''
-            ]
+            )
 
         s = Sender('localhost')
         result = s.send_value('testhost', 'test', 1)
@@ -41,10 +47,10 @@ class TestSender(unittest.TestCase):
                     "testhost test   3\n")
         file_.close()
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x5b\x00\x00\x00\x00\x00\x00\x00',
             b'{"response":"success", "info":"processed: 3; failed: 0; total: 3; seconds spent: 0.060753"}', b''
-            ]
+            )
 
         sender = Sender('localhost')
         resp, _ = sender.send_file(file_.name)
@@ -55,10 +61,10 @@ class TestSender(unittest.TestCase):
     @patch('zappix.dstream.socket')
     def test_send_decorator(self, mock_socket):
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x5b\x00\x00\x00\x00\x00\x00\x00',
             b'{"response":"success", "info":"processed: 1; failed: 0; total: 1; seconds spent: 0.060753"}', b''
-            ]
+            )
 
         sender = Sender('host')
 
@@ -70,13 +76,14 @@ class TestSender(unittest.TestCase):
         res = echo(number)
         self.assertEqual(res, number)
 
+    @patch('zappix.protocol._orjson', None)
     @patch('zappix.dstream.socket')
     def test_send_bulk(self, mock_socket):
         mock_socket.create_connection.return_value = self.msock
-        self.msock.recv.side_effect = [
+        self.msock.recv_into.side_effect = socket_stream(
             b'ZBXD\x01', b'\x5b\x00\x00\x00\x00\x00\x00\x00',
             b'{"response":"success", "info":"processed: 2; failed: 0; total: 2; seconds spent: 0.060753"}', b''
-            ]
+            )
 
         rq = SenderDataRequest(
             [
@@ -89,3 +96,79 @@ class TestSender(unittest.TestCase):
         res = sender.send_bulk(rq)
         self.msock.sendall.assert_called_with(b'ZBXD\x01\xa0\x00\x00\x00\x00\x00\x00\x00{"request": "sender data", "data": [{"host": "localhost", "key": "test.key", "value": 1}, {"host": "Zabbix server", "key": "test.key2", "value": "test_value"}]}')
         self.assertDictEqual(res, {"processed": 2, "failed": 0, "total": 2, "seconds spent": 0.060753})
+
+    @patch.object(Sender, '_send')
+    def test_send_bulk_chunked(self, mock_send):
+        def respond(payload):
+            count = payload.count(b'"host"')
+            if count == 1:
+                return ''
+            return (f'{{"response":"success", "info":"processed: {count}; failed: 0; '
+                    f'total: {count}; seconds spent: 0.000100"}}')
+        mock_send.side_effect = respond
+
+        rq = SenderDataRequest([SenderData('localhost', 'test.key', i) for i in range(5)])
+
+        sender = Sender('host')
+        res = sender.send_bulk(rq, chunk_size=2, workers=2)
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertEqual(res['processed'], 4)
+        self.assertEqual(res['failed'], 1)
+        self.assertEqual(res['total'], 5)
+
+    @patch.object(Sender, '_send_or_raise')
+    def test_send_payload(self, mock_send):
+        mock_send.side_effect = ZappixConnectionError("refused", ('host', 10051))
+        sender = Sender('host', raise_errors=True)
+
+        with self.assertRaises(ZappixConnectionError):
+            sender.send_payload(b'{"request":"sender data","data":[]}')
+        with self.assertRaises(ZappixConnectionError):
+            Sender('host').send_payload(b'{"request":"sender data","data":[]}')
+
+        mock_send.side_effect = ZappixProtocolError("corrupted", ('host', 10051))
+        self.assertEqual(Sender('host').send_payload(b'{"request":"sender data","data":[]}'), (None, False))
+        mock_send.side_effect = ZappixConnectionError("refused", ('host', 10051))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            buffer = DiskBuffer(os.path.join(tmp, 'buffer'))
+            self.addCleanup(buffer.close)
+            sender = Sender('host', raise_errors=True, disk_buffer=buffer)
+            self.assertEqual(sender.send_payload(b'{"request":"sender data","data":[]}'), (None, True))
+
+            mock_send.side_effect = None
+            mock_send.return_value = ('{"response":"success", "info":"processed: 1; failed: 0; '
+                                      'total: 1; seconds spent: 0.000100"}')
+            info, buffered = sender.send_payload(b'{"request":"sender data","data":[]}')
+        self.assertEqual(info['processed'], 1)
+        self.assertFalse(buffered)
+
+    @patch.object(Sender, '_send')
+    def test_send_file_stream(self, mock_send):
+        mock_send.side_effect = lambda payload: (
+            '{"response":"success", "info":"processed: %d; failed: 0; total: %d; seconds spent: 0.000100"}'
+            % ((payload.count(b'"host"'),) * 2))
+        file_ = tempfile.NamedTemporaryFile('wb', suffix='.gz', delete=False)
+        with gzip.GzipFile(fileobj=file_, mode='wb') as compressed:
+            compressed.write(b"".join(b"testhost test %d\n" % i for i in range(7)) + b"testhost test\n")
+        file_.close()
+
+        sender = Sender('localhost')
+        resp, corrupted_lines = sender.send_file(file_.name, stream=True, chunk_size=3)
+        os.unlink(file_.name)
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertListEqual(corrupted_lines, [8])
+        self.assertEqual(resp['processed'], 7)
+
+    @patch.object(Sender, '_send')
+    def test_send_file_stdin(self, mock_send):
+        mock_send.return_value = ('{"response":"success", "info":"processed: 2; failed: 0; '
+                                  'total: 2; seconds spent: 0.000100"}')
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(b"testhost test 1554133179 1\ntesthost test 1554133179 2\n")))
+
+        with patch('zappix.sender.sys.stdin', stdin):
+            resp, _ = Sender('localhost').send_file('-', with_timestamps=True, stream=True, workers=2)
+
+        self.assertEqual(json.loads(mock_send.call_args[0][0])['data'][0]['clock'], 1554133179)
+        self.assertEqual(resp['processed'], 2)
+        self.assertFalse(stdin.closed)
@@ -46,3 +46,24 @@ class TestSenderDataRequest(unittest.TestCase):
         with self.assertRaises(TypeError):
             sender_request = SenderDataRequest()
             sender_request.add_item(('testhost', 'testkey', 1))
+
+    def test_split_by_items(self):
+        sender_request = SenderDataRequest([SenderData('testhost', 'testkey', i) for i in range(5)])
+        sender_request.clock = 1554133179
+        chunks = list(sender_request.split(max_items=2))
+
+        self.assertListEqual([len(c.data) for c in chunks], [2, 2, 1])
+        self.assertListEqual([d.value for c in chunks for d in c.data], list(range(5)))
+        self.assertTrue(all(c.clock == 1554133179 for c in chunks))
+
+    def test_split_by_bytes(self):
+        sender_request = SenderDataRequest([SenderData('testhost', 'testkey', i) for i in range(5)])
+        item_size = len('{"host": "testhost", "key": "testkey", "value": 1}, ')
+        chunks = list(sender_request.split(max_bytes=item_size * 2))
+
+        self.assertListEqual([len(c.data) for c in chunks], [2, 2, 1])
+
+    def test_split_oversized_item(self):
+        sender_request = SenderDataRequest([SenderData('testhost', 'testkey', 'x' * 100)])
+
+        self.assertListEqual([len(c.data) for c in sender_request.split(max_bytes=10)], [1])
@@ -0,0 +1,156 @@
+import asyncio
+import socket
+import unittest
+from unittest.mock import MagicMock, patch
+from zappix.exceptions import NoServerAvailable, ZappixConnectionError, ZappixProtocolError, ZappixTimeout
+from zappix.sender import Sender, AsyncSender
+from zappix.servers import ServerList
+from zappix.trapper import TrapperServer
+from tests.utils import FakeServer
+
+SUCCESS = b'{"response":"success","info":"processed: 1; failed: 0; total: 1; seconds spent: 0.000100"}'
+
+
+def failing(*down):
+    calls = []
+
+    def request(server):
+        calls.append(server)
+        if server in down:
+            raise ZappixConnectionError("refused", server)
+        return server
+    return request, calls
+
+
+class TestServerList(unittest.TestCase):
+    def test_parse_servers(self):
+        servers = ServerList(['zabbix1', 'zabbix2:10052', ('zabbix3', 10053), '[::1]:10054', '::1'])
+
+        self.assertListEqual(servers.servers, [('zabbix1', 10051), ('zabbix2', 10052), ('zabbix3', 10053),
+                                               ('::1', 10054), ('::1', 10051)])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ServerList(['a'], policy='random')
+        with self.assertRaises(ValueError):
+            ServerList([])
+
+    def test_failover_sticks_to_working_server(self):
+        servers = ServerList(['a', 'b', 'c'], backoff=60)
+        request, calls = failing(('a', 10051))
+
+        self.assertEqual(servers.run(request), ('b', 10051))
+        self.assertEqual(servers.run(request), ('b', 10051))
+        self.assertListEqual(calls, [('a', 10051), ('b', 10051), ('b', 10051)])
+
+    def test_round_robin(self):
+        servers = ServerList(['a', 'b'], policy='round_robin')
+        request, _ = failing()
+
+        self.assertListEqual([servers.run(request)[0] for _ in range(4)], ['a', 'b', 'a', 'b'])
+
+    def test_least_latency(self):
+        servers = ServerList(['a', 'b'], policy='least_latency')
+        servers._succeeded(('a', 10051), 0.5)
+        servers._succeeded(('b', 10051), 0.1)
+
+        self.assertListEqual(servers.candidates(), [('b', 10051), ('a', 10051)])
+
+    def test_failed_server_backs_off(self):
+        servers = ServerList(['a', 'b'], policy='round_robin', backoff=60)
+        request, calls = failing(('a', 10051))
+        servers.run(request)
+
+        self.assertListEqual(servers.candidates(), [('b', 10051), ('a', 10051)])
+        self.assertListEqual(servers.candidates(), [('b', 10051), ('a', 10051)])
+
+    @patch('zappix.servers.time.sleep')
+    def test_retries_with_backoff(self, mock_sleep):
+        servers = ServerList(['a', 'b'], retries=2, backoff=1, max_backoff=1.5)
+        request, calls = failing(('a', 10051), ('b', 10051))
+
+        with self.assertRaises(NoServerAvailable) as cm:
+            servers.run(request)
+
+        self.assertEqual(len(calls), 6)
+        self.assertEqual(len(cm.exception.errors), 6)
+        self.assertEqual(mock_sleep.call_count, 2)
+        for call in mock_sleep.call_args_list:
+            self.assertLessEqual(call[0][0], 1.5)
+
+    def test_protocol_error_is_not_retried(self):
+        servers = ServerList(['a', 'b'])
+        request = MagicMock(side_effect=ZappixProtocolError("corrupted"))
+
+        with self.assertRaises(ZappixProtocolError):
+            servers.run(request)
+        request.assert_called_once_with(('a', 10051))
+
+    def test_timeout_after_send_is_not_retried(self):
+        servers = ServerList(['a', 'b'])
+        request = MagicMock(side_effect=ZappixTimeout("timed out", ('a', 10051), sent=True))
+
+        with self.assertRaises(ZappixTimeout):
+            servers.run(request)
+        request.assert_called_once_with(('a', 10051))
+        self.assertListEqual(servers.candidates(), [('b', 10051), ('a', 10051)])
+
+
+class TestClientFailover(unittest.TestCase):
+    def setUp(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        self.closed_port = listener.getsockname()[1]
+        listener.close()
+        self.server = FakeServer(SUCCESS)
+        self.addCleanup(self.server.close)
+
+    def test_sender_failover(self):
+        servers = ServerList([('127.0.0.1', self.closed_port), ('127.0.0.1', self.server.port)])
+        sender = Sender(servers)
+
+        info = sender.send_value('host', 'key', 1)
+
+        self.assertEqual(info['processed'], 1)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_async_sender_failover(self):
+        servers = ServerList([('127.0.0.1', self.closed_port), ('127.0.0.1', self.server.port)])
+        sender = AsyncSender(servers)
+
+        loop = asyncio.new_event_loop()
+        info = loop.run_until_complete(sender.send_value('host', 'key', 1))
+        loop.close()
+
+        self.assertEqual(info['processed'], 1)
+
+    def test_no_failover_after_send(self):
+        trapper = TrapperServer(latency=0.3).start()
+        self.addCleanup(trapper.stop)
+        addresses = [('127.0.0.1', trapper.port), ('127.0.0.1', self.server.port)]
+
+        with self.assertRaises(ZappixTimeout) as cm:
+            Sender(ServerList(addresses), timeout=0.05, raise_errors=True).send_value('host', 'key', 1)
+        self.assertTrue(cm.exception.sent)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        with self.assertRaises(ZappixTimeout) as cm:
+            loop.run_until_complete(
+                AsyncSender(ServerList(addresses), timeout=0.05, raise_errors=True).send_value('host', 'key', 1))
+        self.assertTrue(cm.exception.sent)
+        self.assertEqual(len(self.server.requests), 0)
+
+    def test_raise_errors(self):
+        sender = Sender('127.0.0.1', self.closed_port, raise_errors=True)
+
+        with self.assertRaises(ZappixConnectionError) as cm:
+            sender.send_value('host', 'key', 1)
+        self.assertEqual(cm.exception.address, ('127.0.0.1', self.closed_port))
+
+    def test_errors_are_logged_by_default(self):
+        self.assertIsNone(Sender('127.0.0.1', self.closed_port).send_value('host', 'key', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
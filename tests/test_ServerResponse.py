@@ -1,5 +1,5 @@
 import unittest
-from zappix.protocol import ServerResponse
+from zappix.protocol import ActiveItem, ServerResponse, parse_info
 
 
 class TestServerResponse(unittest.TestCase):
@@ -35,9 +35,39 @@ class TestServerResponse(unittest.TestCase):
         self.assertEqual(response.response, 'success')
         self.assertEqual(len(response.data), 2)
 
-        # Note: order of items is reversed due to while/pop
-        self.assertEqual(response.data[1].key,
+        # Items keep the order sent by the server
+        self.assertEqual(response.data[0].key,
                          "log[/home/zabbix/logs/zabbix_agentd.log]")
-        self.assertEqual(response.data[1].delay, 30)
-        self.assertEqual(response.data[1].lastlogsize, 0)
-        self.assertEqual(response.data[1].mtime, 0)
+        self.assertEqual(response.data[0].delay, 30)
+        self.assertEqual(response.data[0].lastlogsize, 0)
+        self.assertEqual(response.data[0].mtime, 0)
+        self.assertEqual(response.data[1].key, "agent.version")
+
+    def test_lazy_items(self):
+        response = ServerResponse(self.response_active_items)
+
+        self.assertListEqual(response.items.keys(), ["log[/home/zabbix/logs/zabbix_agentd.log]", "agent.version"])
+        self.assertListEqual(response.items._items, [None, None])
+
+        item = response.items[-1]
+        self.assertIsInstance(item, ActiveItem)
+        self.assertEqual(item.delay, 600)
+        self.assertIs(response.items[1], item)
+        self.assertIsNone(response.items._items[0])
+        self.assertListEqual([i.key for i in response.items[:1]], ["log[/home/zabbix/logs/zabbix_agentd.log]"])
+        self.assertIs(response.data[1], item)
+
+    def test_failed_response_with_text_info(self):
+        response = ServerResponse('{"response":"failed","info":"host [testhost] not found"}')
+        self.assertEqual(response.response, 'failed')
+        self.assertIsNone(response.info)
+
+    def test_parse_info(self):
+        self.assertDictEqual(parse_info(self.response_items_send), ServerResponse(self.response_items_send).info)
+        self.assertIsNone(parse_info(self.response_active_items))
+        self.assertIsNone(parse_info('{"response":"failed","info":"host [testhost] not found"}'))
+        self.assertIsNone(parse_info(''))
+
+    def test_parse_info_escaped(self):
+        response = '{"response":"success","info":"processed: 1; failed: 0; total: 1; \\"x\\": 1"}'
+        self.assertDictEqual(parse_info(response), {'processed': 1, 'failed': 0, 'total': 1, '"x"': 1})
@@ -0,0 +1,118 @@
+import time
+import unittest
+from zappix.pool import ConnectionPool
+from zappix.protocol import SenderData, SenderDataRequest
+from zappix.relay import TrapperRelay
+from zappix.sender import Sender
+from zappix.trapper import TrapperServer
+
+
+class TestTrapperRelay(unittest.TestCase):
+    def setUp(self):
+        self.trapper = TrapperServer(keep_alive=True, keep_data=True).start()
+        self.addCleanup(self.trapper.stop)
+        self.pool = ConnectionPool()
+        self.addCleanup(self.pool.close)
+
+    def start(self, **kwargs):
+        upstream = Sender('127.0.0.1', self.trapper.port, pool=self.pool)
+        relay = TrapperRelay(upstream, port=0, **kwargs).start()
+        self.addCleanup(relay.stop)
+        return relay
+
+    def test_merges_clients(self):
+        relay = self.start(batch_items=10, max_delay=60)
+
+        for i in range(10):
+            info = Sender('127.0.0.1', relay.port).send_value('host', 'key', i + 1)
+            self.assertEqual(info['processed'], 1)
+            self.assertIn('seconds spent', info)
+
+        self.wait_for(lambda: relay.stats()['forwarded'] == 10)
+        self.assertEqual(self.trapper.requests, 1)
+        self.assertEqual(self.trapper.connections, 1)
+        self.assertListEqual([item['value'] for item in self.trapper.data], list(range(1, 11)))
+        self.assertEqual(relay.stats()['batches'], 1)
+
+    def test_max_delay(self):
+        relay = self.start(max_delay=0.05)
+
+        Sender('127.0.0.1', relay.port).send_value('host', 'key', 1)
+
+        self.wait_for(lambda: len(self.trapper.data) == 1)
+        self.assertIsInstance(self.trapper.data[0]['clock'], int)
+
+    def test_splits_batches(self):
+        relay = self.start(batch_items=4, max_delay=60)
+
+        info = Sender('127.0.0.1', relay.port).send_bulk(
+            SenderDataRequest([SenderData('host', 'key', i, 1554133179) for i in range(1, 11)]))
+        self.assertEqual(info['processed'], 10)
+        relay.stop()
+
+        self.assertEqual(self.trapper.requests, 3)
+        self.assertEqual(len(self.trapper.data), 10)
+
+    def test_clock_correction(self):
+        relay = self.start(batch_items=1)
+
+        Sender('127.0.0.1', relay.port)._send(
+            b'{"request": "sender data", "clock": 1100, "data": [{"host": "host", "key": "key", "value": 1, "clock": 1000}]}')
+
+        self.wait_for(lambda: len(self.trapper.data) == 1)
+        self.assertAlmostEqual(self.trapper.data[0]['clock'], int(time.time()) - 100, delta=2)
+
+    def test_failed_items_and_requests(self):
+        relay = self.start()
+        sender = Sender('127.0.0.1', relay.port)
+
+        response = sender._send(b'{"request": "sender data", "data": [{"host": "host", "key": "key"}, {"host": "host"}]}')
+        self.assertIn('processed: 1; failed: 1; total: 2', response)
+        self.assertIn('failed', sender._send(b'{"request": "active checks", "host": "host"}'))
+
+    def test_queue_full(self):
+        relay = self.start(queue_size=1, max_delay=60)
+
+        self.assertIsNone(Sender('127.0.0.1', relay.port).send_bulk(
+            SenderDataRequest([SenderData('host', 'key', i) for i in range(1, 3)])))
+        self.assertEqual(relay.rejected, 2)
+
+    def test_retries_upstream(self):
+        self.trapper.error_rate = 1.0
+        self.trapper.error_mode = 'close'
+        relay = self.start(max_delay=0.05)
+
+        Sender('127.0.0.1', relay.port).send_value('host', 'key', 1)
+        self.wait_for(lambda: self.trapper.errors >= 1)
+        self.trapper.error_rate = 0.0
+        self.wait_for(lambda: len(self.trapper.data) == 1)
+
+    def test_drops_rejected_batches(self):
+        self.trapper.error_rate = 1.0
+        self.trapper.error_mode = 'garbage'
+        relay = self.start(max_delay=0.05)
+
+        Sender('127.0.0.1', relay.port).send_value('host', 'key', 1)
+        self.wait_for(lambda: relay.failed == 1)
+        self.trapper.error_rate = 0.0
+        Sender('127.0.0.1', relay.port).send_value('host', 'key', 2)
+        self.wait_for(lambda: relay.forwarded == 1)
+
+        self.assertEqual(self.trapper.errors, 1)
+        self.assertEqual([item['value'] for item in self.trapper.data], [2])
+
+    def test_port_in_use(self):
+        relay = self.start()
+
+        with self.assertRaises(OSError):
+            TrapperRelay(Sender('127.0.0.1', self.trapper.port), port=relay.port).start()
+
+    def wait_for(self, condition, timeout=5):
+        expires = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), expires, "Condition not met in time")
+            time.sleep(0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
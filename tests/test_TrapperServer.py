@@ -0,0 +1,114 @@
+import unittest
+from zappix.agent_active import AgentActive
+from zappix.exceptions import ZappixConnectionError, ZappixProtocolError
+from zappix.get import Get
+from zappix.pool import ConnectionPool
+from zappix.protocol import AgentData, AgentDataRequest, SenderData, SenderDataRequest
+from zappix.sender import Sender
+from zappix.trapper import TrapperServer
+
+
+class TestTrapperServer(unittest.TestCase):
+    def start(self, **kwargs):
+        trapper = TrapperServer(**kwargs).start()
+        self.addCleanup(trapper.stop)
+        return trapper
+
+    def test_sender_data(self):
+        trapper = self.start(keep_data=True)
+
+        info = Sender('127.0.0.1', trapper.port).send_bulk(
+            SenderDataRequest([SenderData('host', 'key', i) for i in range(1, 4)]))
+
+        self.assertIsNotNone(info.pop('seconds spent'))
+        self.assertDictEqual(info, {'processed': 3, 'failed': 0, 'total': 3})
+        self.assertListEqual([item['value'] for item in trapper.data], [1, 2, 3])
+        stats = trapper.stats()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['items'], 3)
+        self.assertGreater(stats['bytes_received'], 0)
+
+    def test_compressed_request(self):
+        trapper = self.start()
+        sender = Sender('127.0.0.1', trapper.port, compression=True, compression_threshold=0)
+
+        self.assertEqual(sender.send_value('host', 'key', 1)['processed'], 1)
+
+    def test_active_checks_and_agent_data(self):
+        trapper = self.start(active_checks={'host': [{'key': 'agent.ping', 'delay': 30}]})
+        agent = AgentActive('host', '127.0.0.1', trapper.port)
+
+        self.assertListEqual([i.key for i in agent.get_active_checks()], ['agent.ping'])
+        self.assertListEqual(AgentActive('other', '127.0.0.1', trapper.port).get_active_checks(), [])
+
+        request = AgentDataRequest([AgentData('host', 'agent.ping', 1, 1, 1)])
+        self.assertEqual(agent.send_collected_data(request).info['processed'], 1)
+        # Resending the same session is deduplicated by item id
+        self.assertEqual(agent.send_collected_data(request).info['processed'], 0)
+        self.assertEqual(trapper.duplicates, 1)
+
+    def test_passive_checks(self):
+        trapper = self.start(agent_values={'agent.ping': '1'})
+        getter = Get('127.0.0.1', trapper.port)
+
+        self.assertDictEqual(getter.get_report(['agent.ping', 'unknown']),
+                             {'agent.ping': '1', 'unknown': 'ZBX_NOTSUPPORTED\0Unsupported item key.'})
+
+    def test_error_injection(self):
+        trapper = self.start(error_rate=1.0)
+        self.assertIsNone(Sender('127.0.0.1', trapper.port).send_value('host', 'key', 1))
+
+        trapper.error_mode = 'close'
+        with self.assertRaises(ZappixConnectionError):
+            Sender('127.0.0.1', trapper.port, raise_errors=True).send_value('host', 'key', 1)
+
+        trapper.error_mode = 'garbage'
+        with self.assertRaises(ZappixProtocolError):
+            Sender('127.0.0.1', trapper.port, raise_errors=True).send_value('host', 'key', 1)
+        self.assertEqual(trapper.errors, 3)
+
+    def test_item_failures(self):
+        trapper = self.start(item_failure_rate=0.5, seed=1)
+
+        info = Sender('127.0.0.1', trapper.port).send_bulk(
+            SenderDataRequest([SenderData('host', 'key', i) for i in range(100)]))
+
+        self.assertEqual(info['processed'] + info['failed'], 100)
+        self.assertGreater(info['failed'], 0)
+        self.assertEqual(trapper.failed_items, info['failed'])
+
+    def test_keep_alive(self):
+        trapper = self.start(keep_alive=True)
+        pool = ConnectionPool()
+        self.addCleanup(pool.close)
+        sender = Sender('127.0.0.1', trapper.port, pool=pool)
+
+        for i in range(5):
+            sender.send_value('host', 'key', i)
+
+        self.assertEqual(trapper.connections, 1)
+        self.assertEqual(trapper.requests, 5)
+
+    def test_latency(self):
+        trapper = self.start(latency=0.3)
+
+        with self.assertRaises(ZappixConnectionError) as cm:
+            Sender('127.0.0.1', trapper.port, timeout=0.05, raise_errors=True).send_value('host', 'key', 1)
+        self.assertTrue(cm.exception.sent)
+
+        pool = ConnectionPool()
+        self.addCleanup(pool.close)
+        with self.assertRaises(ZappixConnectionError) as cm:
+            Sender('127.0.0.1', trapper.port, timeout=0.05, raise_errors=True,
+                   pool=pool).send_value('host', 'key', 1)
+        self.assertTrue(cm.exception.sent)
+
+    def test_port_in_use(self):
+        trapper = self.start()
+
+        with self.assertRaises(OSError):
+            TrapperServer(port=trapper.port).start()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import json
+import threading
+import unittest
+from unittest.mock import MagicMock
+from zappix.buffered_sender import BufferedSender
+from zappix.protocol import SenderData, SenderDataRequest, ColumnarSenderDataRequest
+from zappix.sender import Sender
+from zappix.value_cache import ValueCache
+
+
+class TestValueCache(unittest.TestCase):
+    def test_unchanged(self):
+        cache = ValueCache(heartbeat=None)
+
+        self.assertTrue(cache.changed('host', 'key', 1, 100))
+        self.assertFalse(cache.changed('host', 'key', 1, 200))
+        self.assertTrue(cache.changed('host', 'key', 2, 300))
+        self.assertTrue(cache.changed('other', 'key', 2, 300))
+        self.assertEqual((cache.hits, cache.misses, cache.suppressed), (2, 2, 1))
+
+    def test_heartbeat(self):
+        cache = ValueCache(heartbeat=60)
+
+        self.assertTrue(cache.changed('host', 'key', 1, 100))
+        self.assertFalse(cache.changed('host', 'key', 1, 159))
+        self.assertTrue(cache.changed('host', 'key', 1, 160))
+        self.assertFalse(cache.changed('host', 'key', 1, 219))
+
+    def test_lru_eviction(self):
+        cache = ValueCache(heartbeat=None, max_size=2)
+        cache.changed('host', 'a', 1)
+        cache.changed('host', 'b', 1)
+        cache.changed('host', 'a', 1)
+        cache.changed('host', 'c', 1)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evicted, 1)
+        self.assertFalse(cache.changed('host', 'a', 1))
+        self.assertTrue(cache.changed('host', 'b', 1))
+
+    def test_forget(self):
+        cache = ValueCache()
+        cache.changed('host', 'key', 1)
+        cache.forget('host', 'key')
+
+        self.assertTrue(cache.changed('host', 'key', 1))
+
+    def test_filter(self):
+        for request_class in (SenderDataRequest, ColumnarSenderDataRequest):
+            with self.subTest(request_class=request_class):
+                cache = ValueCache()
+                items = [SenderData('host', 'key', value, 100 + i) for i, value in enumerate([1, 1, 2, 2, 1])]
+
+                filtered = cache.filter(request_class(items))
+
+                self.assertIsInstance(filtered, request_class)
+                items = filtered.data if request_class is SenderDataRequest else list(filtered)
+                self.assertListEqual([(item.value, item.clock) for item in items], [(1, 100), (2, 102), (1, 104)])
+
+    def test_filter_keeps_clock_and_ns(self):
+        request = SenderDataRequest([SenderData('host', 'key', 1, 100)])
+        request.clock, request.ns = 200, 5
+
+        filtered = ValueCache().filter(request)
+
+        self.assertEqual((filtered.clock, filtered.ns), (200, 5))
+
+        columnar = ColumnarSenderDataRequest()
+        columnar.clock, columnar.ns = 200, 5
+        columnar.add('host', 'key', 1, 100, 7)
+        columnar.add('host', 'key', 1, 101, 8)
+        columnar.add('host', 'key', 2, 102, 9)
+
+        filtered = ValueCache().filter(columnar)
+
+        self.assertDictEqual(json.loads(filtered.encode()), {
+            'request': 'sender data', 'clock': 200, 'ns': 5,
+            'data': [{'host': 'host', 'key': 'key', 'value': 1, 'clock': 100, 'ns': 7},
+                     {'host': 'host', 'key': 'key', 'value': 2, 'clock': 102, 'ns': 9}]})
+
+    def test_forget_request(self):
+        cache = ValueCache()
+        filtered = cache.filter(SenderDataRequest([SenderData('host', 'a', 1), SenderData('host', 'b', 1)]))
+        cache.forget_request(filtered)
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(len(cache.filter(ColumnarSenderDataRequest(filtered.data))), 2)
+
+    def test_buffered_sender(self):
+        sender = MagicMock(spec=Sender)
+        sender.send_bulk.side_effect = [None, {"processed": 2, "failed": 0, "total": 2, "seconds spent": 0.001}]
+        cache = ValueCache()
+
+        with BufferedSender(sender, max_age=60, value_cache=cache) as buffered:
+            self.assertTrue(buffered.add_value('host', 'key', 1))
+            self.assertTrue(buffered.add_value('host', 'key', 1))
+            buffered.flush()
+            # Value of the failed batch is sent again
+            buffered.add_value('host', 'key', 1)
+            buffered.add_value('host', 'key', 2)
+
+        self.assertListEqual([[item.value for item in call[0][0].data] for call in sender.send_bulk.call_args_list],
+                             [[1], [1, 2]])
+
+
+    def test_buffered_sender_drop_policy(self):
+        sending, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def send(request, _):
+            sending.set()
+            release.wait(5)
+        sender = MagicMock(spec=Sender)
+        sender.send_bulk.side_effect = send
+        cache = ValueCache()
+        buffered = BufferedSender(sender, max_items=1, queue_size=1, policy='drop', value_cache=cache)
+
+        buffered.add_value('host', 'a', 1)
+        self.assertTrue(sending.wait(5))
+        self.assertTrue(buffered.add_value('host', 'b', 1))
+        self.assertFalse(buffered.add_value('host', 'c', 1))
+
+        # The dropped value was not sent, so it is not suppressed next time
+        self.assertTrue(cache.changed('host', 'c', 1))
+        release.set()
+        buffered.close()
+
+if __name__ == '__main__':
+    unittest.main()
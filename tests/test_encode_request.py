@@ -0,0 +1,45 @@
+import unittest
+import json
+from unittest.mock import patch
+from zappix.protocol import (encode_request, ModelEncoder, SenderData, SenderDataRequest,
+                             AgentData, AgentDataRequest, ActiveChecksRequest)
+
+
+class TestEncodeRequest(unittest.TestCase):
+    def setUp(self):
+        values = [1, 0, 'zażółć "quoted"\n', 1.5, True, False, None, [1, 2], {'a': 1}, '']
+        self.sender_request = SenderDataRequest(
+            [SenderData('testhost', 'testkey', value, clock) for value in values for clock in (None, 1554133179)]
+        )
+        self.sender_request.clock = 1554133179
+        self.sender_request.ns = 455816800
+        self.requests = [
+            self.sender_request,
+            SenderDataRequest(),
+            AgentDataRequest([AgentData('testhost', 'testkey', 1, 1554133179, 455816800),
+                              AgentData('testhost', 'testkey2', 0, 1554133279, 0, 1)]),
+            ActiveChecksRequest('testhost'),
+        ]
+
+    @patch('zappix.protocol._orjson', None)
+    def test_same_bytes_as_model_encoder(self):
+        for request in self.requests:
+            self.assertEqual(
+                encode_request(request),
+                json.dumps(request, cls=ModelEncoder).encode('utf-8')
+            )
+
+    def test_same_document_as_model_encoder(self):
+        for request in self.requests:
+            self.assertEqual(
+                json.loads(encode_request(request)),
+                json.loads(json.dumps(request, cls=ModelEncoder))
+            )
+
+    def test_unsupported_by_backend(self):
+        request = SenderDataRequest([SenderData('testhost', 'testkey', 2 ** 70)])
+        self.assertEqual(json.loads(encode_request(request))['data'][0]['value'], 2 ** 70)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,8 @@
+import asyncio
+import socketserver
+import threading
+import unittest
+
 zabbix_server_address = 'zabbix-server'
 zabbix_default_user = 'Admin'
 zabbix_default_password = 'zabbix'
@@ -36,3 +41,120 @@ def create_item(zapi, hostid, item_type=2):
 
 def remove_host(zapi, hostid):
     zapi.host.delete(hostid)
+
+
+def socket_stream(*chunks):
+    """
+    Build a side effect for socket.recv_into that serves chunks as one stream.
+    """
+    stream = b''.join(chunks)
+    position = 0
+
+    def recv_into(buffer, nbytes=0):
+        nonlocal position
+        size = min(nbytes or len(buffer), len(buffer), len(stream) - position)
+        buffer[:size] = stream[position:position + size]
+        position += size
+        return size
+    return recv_into
+
+
+def pack_response(payload):
+    return b'ZBXD\x01' + len(payload).to_bytes(8, 'little') + payload
+
+
+async def start_fake_server(responses, received):
+    """
+    Start a loopback server answering each connection with the next
+    packed response and recording the raw requests in received.
+    """
+    responses = iter(responses)
+
+    async def handle(reader, writer):
+        header = await reader.readexactly(13)
+        if header.startswith(b'ZBXD'):
+            length = int.from_bytes(header[5:], 'little')
+            received.append(await reader.readexactly(length))
+        else:
+            received.append(header + await reader.readline())
+        writer.write(pack_response(next(responses)))
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+
+class AsyncServerTestCase(unittest.TestCase):
+    """
+    Runs coroutines on a fresh event loop against a fake server.
+    Subclasses create the client under test in client.
+    """
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.received = []
+
+    def tearDown(self):
+        self.loop.close()
+
+    def client(self, port):
+        raise NotImplementedError
+
+    def _run(self, responses, coro_factory):
+        async def run():
+            server = await start_fake_server(responses, self.received)
+            port = server.sockets[0].getsockname()[1]
+            try:
+                return await coro_factory(self.client(port))
+            finally:
+                server.close()
+                await server.wait_closed()
+        return self.loop.run_until_complete(run())
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeServer:
+    """
+    Threaded loopback server answering every ZBXD request with response.
+    Connections are closed after each answer unless keep_alive is set.
+    """
+
+    def __init__(self, response, keep_alive=False):
+        server = self
+        self.connections = 0
+        self.requests = []
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.connections += 1
+                while True:
+                    header = self._read(13)
+                    if len(header) < 13:
+                        return
+                    length = int.from_bytes(header[5:], 'little')
+                    server.requests.append(self._read(length))
+                    self.request.sendall(pack_response(response))
+                    if not keep_alive:
+                        return
+
+            def _read(self, size):
+                data = b''
+                while len(data) < size:
+                    chunk = self.request.recv(size - len(data))
+                    if not chunk:
+                        break
+                    data += chunk
+                return data
+
+        self._server = _TCPServer(('127.0.0.1', 0), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
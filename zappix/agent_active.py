@@ -1,13 +1,82 @@
-from typing import List, Optional
-from zappix.protocol import ActiveChecksRequest, AgentDataRequest, ModelEncoder, ActiveItem
-from zappix.protocol import ServerResponse
-from zappix.dstream import _Dstream
-import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from zappix.protocol import ActiveChecksRequest, AgentData, AgentDataRequest, ActiveItem, encode_request
+from zappix.protocol import ServerResponse, merge_info
+from zappix.dstream import _Dstream, _AsyncDstream
+from zappix.pool import ConnectionPool
+from zappix.servers import ServerList
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class ActiveChecksDiff:
+    """
+    Difference between two active check configurations, keyed on item key.
+
+    Attributes
+    ----------
+    :added:
+        ActiveItem objects that were not configured before.
+    :removed:
+        Keys of items that are no longer configured.
+    :changed:
+        ActiveItem objects whose delay changed.
+    """
+
+    __slots__ = ['added', 'removed', 'changed']
+
+    def __init__(self, added: List[ActiveItem], removed: List[str], changed: List[ActiveItem]) -> None:
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class _ActiveChecks:
+    __slots__ = ['checks', 'digest']
+
+    def __init__(self) -> None:
+        self.checks: Dict[str, ActiveItem] = {}
+        self.digest = b""
+
+    def update(self, host: str, result: str) -> Optional[ActiveChecksDiff]:
+        if not result:
+            return None
+        digest = hashlib.blake2b(result.encode('utf-8'), digest_size=16).digest()
+        if digest == self.digest:
+            logger.debug(f"Active checks for host: {host} did not change")
+            return None
+
+        response = ServerResponse(result)
+        if response.response != 'success':
+            logger.error(f"Could not get active checks for host: {host}")
+            return None
+        checks = {item.key: item for item in response.items}
+        diff = ActiveChecksDiff(
+            [item for key, item in checks.items() if key not in self.checks],
+            [key for key in self.checks if key not in checks],
+            [item for key, item in checks.items() if key in self.checks and self.checks[key].delay != item.delay]
+        )
+        self.checks = checks
+        self.digest = digest
+        return diff
+
+
+class _HostState:
+    __slots__ = ['session', 'active_checks', 'lock']
+
+    def __init__(self) -> None:
+        self.session = AgentDataRequest()
+        self.active_checks = _ActiveChecks()
+        self.lock = threading.Lock()
+
+
 class AgentActive(_Dstream):
     """
     Class for getting active check configuration for a host from Zabbix Server
@@ -18,16 +87,27 @@ class AgentActive(_Dstream):
     :host:
         Technical hostname as configured in Zabbix.
     :server:
-        IP address of target Zabbix Server.
+        IP address of target Zabbix Server or a ServerList of HA nodes and proxies.
     :server_port:
         Port on which the Zabbix Server listens.
     :source_address:
         Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
     """
 
-    def __init__(self, host: str, server: str, server_port: int = 10051, source_address: Optional[str] = None) -> None:
-        super().__init__(server, server_port, source_address)
+    def __init__(self, host: str, server: Union[str, ServerList], server_port: int = 10051, source_address: Optional[str] = None,
+                 **kwargs) -> None:
+        super().__init__(server, server_port, source_address, **kwargs)
         self._host = host
+        self._active_checks = _ActiveChecks()
+
+    @property
+    def host(self) -> str:
+        """
+        Technical hostname the agent acts for.
+        """
+        return self._host
 
     def get_active_checks(self) -> List[ActiveItem]:
         """
@@ -38,12 +118,27 @@ class AgentActive(_Dstream):
         list
             List of ActiveItem objects.
         """
+        return ServerResponse(self._request_active_checks()).data
+
+    def refresh_active_checks(self) -> Optional[ActiveChecksDiff]:
+        """
+        Gets active checks for host and compares them with the ones
+        from the previous refresh. The response is parsed only if it differs.
+
+        Returns
+        -------
+        ActiveChecksDiff
+            Changes since the previous refresh, None if nothing changed
+            or the server could not be reached.
+        """
+        return self._active_checks.update(self._host, self._request_active_checks())
+
+    def _request_active_checks(self) -> str:
         request = ActiveChecksRequest(self._host)
         logger.info(f"Getting active checks for host: {self._host} from: {self._ip}:{self._port}")
-        result = self._send(
-            json.dumps(request, cls=ModelEncoder).encode("utf-8")
+        return self._send(
+            encode_request(request)
             )
-        return ServerResponse(result).data
 
     def send_collected_data(self, data: AgentDataRequest) -> ServerResponse:
         """
@@ -59,10 +154,305 @@ class AgentActive(_Dstream):
         list
             List of ActiveItem objects.
         """
+        return self.spool_collected_data(data)[0]
+
+    def spool_collected_data(self, data: AgentDataRequest) -> Tuple[ServerResponse, bool]:
+        """
+        Sends collected data to Zabbix and tells whether it was stored
+        in the disk buffer instead, so callers do not send it again.
+
+        Parameters
+        ----------
+        :data:
+            Instance of AgentDataRequest.
+
+        Returns
+        -------
+        tuple
+            ServerResponse and whether the data was stored in the disk buffer.
+        """
+        if not isinstance(data, AgentDataRequest):
+            logger.error(f"Object {data} is not an instance AgentDataRequest")
+            raise ValueError
+        result, buffered = self._send_spooled(
+            encode_request(data)
+            )
+        return ServerResponse(result), buffered
+
+
+class MultiHostAgentActive(_Dstream):
+    """
+    Active agent acting on behalf of many hosts, like a Zabbix proxy does.
+    Every host keeps its own data session, so item ids increase per host,
+    while configuration polls and data sends for all hosts run concurrently
+    on a shared pool of connections.
+
+    Parameters
+    ----------
+    :hosts:
+        Technical hostnames as configured in Zabbix.
+    :server:
+        IP address of target Zabbix Server or a ServerList of HA nodes and proxies.
+    :server_port:
+        Port on which the Zabbix Server listens.
+    :source_address:
+        Source IP address.
+    :workers:
+        Maximum number of simultaneous requests.
+    :pool:
+        ConnectionPool shared by all hosts. A new one is created if not set,
+        and closed by close.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+    """
+
+    def __init__(self, hosts: Iterable[str], server: Union[str, ServerList], server_port: int = 10051,
+                 source_address: Optional[str] = None, workers: int = 16, pool: Optional[ConnectionPool] = None,
+                 **kwargs) -> None:
+        self._own_pool = pool is None
+        super().__init__(server, server_port, source_address, pool=pool or ConnectionPool(max_size=workers), **kwargs)
+        self._workers = max(workers, 1)
+        self._hosts: Dict[str, _HostState] = {host: _HostState() for host in hosts}
+
+    def close(self) -> None:
+        """
+        Close pooled connections, unless the pool was given by the caller.
+        """
+        if self._own_pool and self._pool is not None:
+            self._pool.close()
+
+    def __enter__(self) -> 'MultiHostAgentActive':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def hosts(self) -> List[str]:
+        """
+        Hostnames handled by the agent.
+        """
+        return list(self._hosts)
+
+    def add_host(self, host: str) -> None:
+        """
+        Start acting on behalf of a host.
+
+        Parameters
+        ----------
+        :host:
+            Technical hostname as configured in Zabbix.
+        """
+        self._hosts.setdefault(host, _HostState())
+
+    def remove_host(self, host: str) -> None:
+        """
+        Stop acting on behalf of a host. Unsent data of the host is discarded.
+
+        Parameters
+        ----------
+        :host:
+            Technical hostname as configured in Zabbix.
+        """
+        self._hosts.pop(host, None)
+
+    def get_active_checks(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, List[ActiveItem]]:
+        """
+        Gets lists of active checks for many hosts at once.
+
+        Parameters
+        ----------
+        :hosts:
+            Hostnames to get active checks for. Defaults to all hosts.
+
+        Returns
+        -------
+        dict
+            Dict mapping hostname to a list of ActiveItem objects.
+        """
+        results = self._map(self._request_active_checks, self._select(hosts))
+        return {host: ServerResponse(result).data for host, result in results}
+
+    def refresh_active_checks(self, hosts: Optional[Iterable[str]] = None) -> Dict[str, ActiveChecksDiff]:
+        """
+        Gets active checks for many hosts at once and compares them with
+        the ones from the previous refresh of each host.
+
+        Parameters
+        ----------
+        :hosts:
+            Hostnames to refresh. Defaults to all hosts.
+
+        Returns
+        -------
+        dict
+            Dict mapping hostname to ActiveChecksDiff. Hosts whose
+            configuration did not change or could not be fetched are omitted.
+        """
+        diffs = {}
+        for host, result in self._map(self._request_active_checks, self._select(hosts)):
+            state = self._hosts.get(host)
+            diff = state.active_checks.update(host, result) if state else None
+            if diff:
+                diffs[host] = diff
+        return diffs
+
+    def add_value(self, host: str, key: str, value: Any, clock: Optional[int] = None, ns: Optional[int] = None,
+                  state: Optional[int] = None) -> None:
+        """
+        Queue a collected value in the data session of its host.
+
+        Parameters
+        ----------
+        :host:
+            Technical hostname as configured in Zabbix.
+        :key:
+            Item key.
+        :value:
+            Collected value.
+        :clock:
+            Timestamp at which value was collected. Defaults to now.
+        :ns:
+            Nanoseconds of the timestamp.
+        :state:
+            1 if the item is not supported.
+        """
+        if clock is None:
+            now = time.time()
+            clock, ns = int(now), int(now % 1 * 1e9)
+        self.add_item(AgentData(host, key, value, clock, ns or 0, state))
+
+    def add_item(self, item: AgentData) -> None:
+        """
+        Queue an AgentData object in the data session of its host.
+
+        Parameters
+        ----------
+        :item:
+            Instance of AgentData.
+        """
+        host_state = self._hosts.get(item.host)
+        if host_state is None:
+            raise KeyError(item.host)
+        with host_state.lock:
+            host_state.session.add_item(item)
+
+    def send_collected_data(self, hosts: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Sends queued data of many hosts at once.
+        Data of hosts that could not be delivered stays queued for the next send.
+
+        Parameters
+        ----------
+        :hosts:
+            Hostnames whose data is sent. Defaults to all hosts.
+
+        Returns
+        -------
+        dict
+            Merged information from server, None if nothing was delivered.
+        """
+        return merge_info(info for _, info in self._map(self._send_session, self._select(hosts)))
+
+    def _select(self, hosts: Optional[Iterable[str]]) -> List[str]:
+        if hosts is None:
+            return list(self._hosts)
+        return [host for host in hosts if host in self._hosts]
+
+    def _map(self, func, hosts: List[str]) -> List[Tuple[str, Any]]:
+        if len(hosts) <= 1 or self._workers <= 1:
+            return [(host, func(host)) for host in hosts]
+        with ThreadPoolExecutor(max_workers=min(self._workers, len(hosts))) as executor:
+            return list(zip(hosts, executor.map(func, hosts)))
+
+    def _request_active_checks(self, host: str) -> str:
+        logger.info(f"Getting active checks for host: {host} from: {self._ip}:{self._port}")
+        return self._send(encode_request(ActiveChecksRequest(host)))
+
+    def _send_session(self, host: str) -> Optional[Dict[str, Any]]:
+        state = self._hosts.get(host)
+        if state is None:
+            return None
+        with state.lock:
+            count = len(state.session.data)
+            if not count:
+                return None
+            payload = encode_request(state.session)
+        result, buffered = self._send_spooled(payload)
+        response = ServerResponse(result)
+        if response.response != 'success' and not buffered:
+            logger.error(f"Could not send {count} values of host: {host}")
+            return None
+        with state.lock:
+            # Values added during the send keep their ids and go out next time
+            del state.session.data[:count]
+        return response.info
+
+
+class AsyncAgentActive(_AsyncDstream):
+    """
+    Asyncio counterpart of AgentActive.
+
+    Parameters
+    ----------
+    :host:
+        Technical hostname as configured in Zabbix.
+    :server:
+        IP address of target Zabbix Server or a ServerList of HA nodes and proxies.
+    :server_port:
+        Port on which the Zabbix Server listens.
+    :source_address:
+        Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+    """
+
+    def __init__(self, host: str, server: Union[str, ServerList], server_port: int = 10051, source_address: Optional[str] = None,
+                 **kwargs) -> None:
+        super().__init__(server, server_port, source_address, **kwargs)
+        self._host = host
+
+    @property
+    def host(self) -> str:
+        """
+        Technical hostname the agent acts for.
+        """
+        return self._host
+
+    async def get_active_checks(self) -> List[ActiveItem]:
+        """
+        Gets list of active checks for host.
+
+        Returns
+        -------
+        list
+            List of ActiveItem objects.
+        """
+        request = ActiveChecksRequest(self._host)
+        logger.info(f"Getting active checks for host: {self._host} from: {self._ip}:{self._port}")
+        result = await self._send(
+            encode_request(request)
+            )
+        return ServerResponse(result).data
+
+    async def send_collected_data(self, data: AgentDataRequest) -> ServerResponse:
+        """
+        Sends collected data to Zabbix.
+
+        Parameters
+        ----------
+        :data:
+            Instance of AgentDataRequest.
+
+        Returns
+        -------
+        ServerResponse
+            Response from server.
+        """
         if not isinstance(data, AgentDataRequest):
             logger.error(f"Object {data} is not an instance AgentDataRequest")
             raise ValueError
-        result = self._send(
-            json.dumps(data, cls=ModelEncoder).encode("utf-8")
+        result = await self._send(
+            encode_request(data)
             )
         return ServerResponse(result)
@@ -0,0 +1,414 @@
+"""
+Python implementation of Zabbix agent passive checks, the server side of Get.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union, cast
+from collections import OrderedDict
+from zappix.dstream import _read_request, _frame
+import asyncio
+import inspect
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+Param = Union[str, List[str]]
+
+_KEY_NAME = re.compile(r'[0-9A-Za-z_.\-]+')
+_NOT_SUPPORTED = "ZBX_NOTSUPPORTED\0"
+
+
+def parse_key(key: str) -> Tuple[str, List[Param]]:
+    """
+    Split an item key into its name and parameters, following the rules of Zabbix.
+    Quoted parameters are unquoted, array parameters become lists of strings.
+
+    Parameters
+    ----------
+    :key:
+        Item key, e.g. 'vfs.fs.size[/,free]'.
+
+    Returns
+    -------
+    tuple
+        Key name and list of parameters.
+    """
+    bracket = key.find('[')
+    params: List[Param] = []
+    if bracket == -1:
+        name = key
+    else:
+        name = key[:bracket]
+        params, end = _parse_params(key, bracket + 1, False)
+        if end != len(key):
+            raise ValueError(f"Unexpected characters after parameters of key {key}")
+    if not _KEY_NAME.fullmatch(name):
+        raise ValueError(f"Invalid key name: {name!r}")
+    return name, params
+
+
+def _parse_params(key: str, position: int, nested: bool) -> Tuple[List[Param], int]:
+    params: List[Param] = []
+    while True:
+        position = _skip_spaces(key, position)
+        if position >= len(key):
+            break
+        value: Param
+        if key[position] == '"':
+            value, position = _parse_quoted(key, position + 1)
+            position = _skip_spaces(key, position)
+        elif key[position] == '[' and not nested:
+            array, position = _parse_params(key, position + 1, True)
+            # Arrays cannot be nested, so their elements are strings
+            value = cast(List[str], array)
+            position = _skip_spaces(key, position)
+        else:
+            end = position
+            while end < len(key) and key[end] not in ',]':
+                end += 1
+            value, position = key[position:end], end
+        params.append(value)
+        if position >= len(key):
+            break
+        if key[position] == ']':
+            return params, position + 1
+        if key[position] != ',':
+            raise ValueError(f"Unexpected character {key[position]!r} at {position} in key {key}")
+        position += 1
+    raise ValueError(f"Unterminated parameters in key {key}")
+
+
+def _parse_quoted(key: str, position: int) -> Tuple[str, int]:
+    chars: List[str] = []
+    while position < len(key):
+        char = key[position]
+        if char == '"':
+            return ''.join(chars), position + 1
+        if char == '\\' and key.startswith('"', position + 1):
+            char = '"'
+            position += 1
+        chars.append(char)
+        position += 1
+    raise ValueError(f"Unterminated quoted parameter in key {key}")
+
+
+def _skip_spaces(key: str, position: int) -> int:
+    while position < len(key) and key[position] == ' ':
+        position += 1
+    return position
+
+
+class _Item:
+    __slots__ = ['handler', 'ttl']
+
+    def __init__(self, handler: Callable[..., Any], ttl: float) -> None:
+        self.handler = handler
+        self.ttl = ttl
+
+
+class ItemRegistry:
+    """
+    Registry of Python callables answering passive checks.
+    Handlers are registered by key name and called with the key parameters
+    as positional string arguments, arrays as lists of strings, e.g.
+    'app.queue[orders,"high prio"]' calls the handler of 'app.queue' with
+    ('orders', 'high prio'). Handlers may be coroutine functions when
+    served by PassiveAgent.
+
+    Values are cached per key for ttl seconds given at registration,
+    at most max_cache_size of them, the oldest are evicted first.
+    Exceptions raised by handlers are reported to Zabbix as not supported
+    items with the exception message.
+
+    Parameters
+    ----------
+    :max_cache_size:
+        Maximum number of cached values.
+
+    Usage
+    -----
+    registry = ItemRegistry()
+
+    @registry.register('app.queue', ttl=5)
+    def queue_length(name='default'):
+        return len(queues[name])
+    """
+
+    def __init__(self, max_cache_size: int = 10000) -> None:
+        self._items: Dict[str, _Item] = {}
+        # key -> (monotonic expiry, value), oldest first
+        self._cache: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._max_cache_size = max_cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
+
+    @property
+    def names(self) -> List[str]:
+        """
+        Names of registered keys.
+        """
+        return list(self._items)
+
+    def register(self, name: str, handler: Optional[Callable[..., Any]] = None, ttl: float = 0.0) -> Any:
+        """
+        Register a handler of a key name. Can be used as a decorator.
+
+        Parameters
+        ----------
+        :name:
+            Key name without parameters, e.g. 'app.queue'.
+        :handler:
+            Callable returning the value of the item.
+        :ttl:
+            Number of seconds a value is served from cache. Not cached by default.
+
+        Returns
+        -------
+        callable
+            The handler, or a decorator registering it if handler was not given.
+        """
+        if handler is None:
+            return lambda func: self.register(name, func, ttl)
+        if not _KEY_NAME.fullmatch(name):
+            raise ValueError(f"Invalid key name: {name!r}")
+        self._items[name] = _Item(handler, ttl)
+        self._invalidate(name)
+        return handler
+
+    def unregister(self, name: str) -> None:
+        """
+        Remove the handler of a key name.
+
+        Parameters
+        ----------
+        :name:
+            Key name without parameters.
+        """
+        del self._items[name]
+        self._invalidate(name)
+
+    def get(self, key: str) -> str:
+        """
+        Get value of an item, calling its handler unless it is cached.
+
+        Parameters
+        ----------
+        :key:
+            Item key with parameters.
+
+        Returns
+        -------
+        string
+            Value of item, ZBX_NOTSUPPORTED with a reason if it cannot be retrieved.
+        """
+        cached, item, params = self._lookup(key)
+        if item is None:
+            return cached
+        try:
+            value = item.handler(*params)
+            if inspect.iscoroutine(value):
+                value.close()
+                raise TypeError("Coroutine handlers are supported only by get_async")
+        except Exception as e:
+            return self._failed(key, e)
+        return self._store(key, item, value)
+
+    async def get_async(self, key: str) -> str:
+        """
+        Coroutine counterpart of get, awaiting coroutine handlers.
+
+        Parameters
+        ----------
+        :key:
+            Item key with parameters.
+
+        Returns
+        -------
+        string
+            Value of item, ZBX_NOTSUPPORTED with a reason if it cannot be retrieved.
+        """
+        cached, item, params = self._lookup(key)
+        if item is None:
+            return cached
+        try:
+            value = item.handler(*params)
+            if inspect.isawaitable(value):
+                value = await value
+        except Exception as e:
+            return self._failed(key, e)
+        return self._store(key, item, value)
+
+    def _lookup(self, key: str) -> Tuple[str, Optional[_Item], List[Param]]:
+        cached = self._cache.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.hits += 1
+                return cached[1], None, []
+            del self._cache[key]
+        self.misses += 1
+        try:
+            name, params = parse_key(key)
+        except ValueError:
+            return _NOT_SUPPORTED + "Invalid item key format.", None, []
+        item = self._items.get(name)
+        if item is None:
+            return _NOT_SUPPORTED + "Unsupported item key.", None, []
+        return '', item, params
+
+    def _store(self, key: str, item: _Item, value: Any) -> str:
+        if value is None:
+            return _NOT_SUPPORTED + "No value returned."
+        if isinstance(value, bool):
+            value = int(value)
+        elif isinstance(value, bytes):
+            value = value.decode('utf-8', 'replace')
+        value = str(value)
+        if item.ttl > 0:
+            self._cache.pop(key, None)
+            self._cache[key] = (time.monotonic() + item.ttl, value)
+            if len(self._cache) > self._max_cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def _failed(self, key: str, error: Exception) -> str:
+        logger.warning(f"Handler of {key} failed: {error!r}")
+        return _NOT_SUPPORTED + (str(error) or type(error).__name__)
+
+    def _invalidate(self, name: str) -> None:
+        for key in [key for key in self._cache if key == name or key.startswith(name + '[')]:
+            del self._cache[key]
+
+
+class PassiveAgent:
+    """
+    Listener answering passive checks of Zabbix server and proxies, like
+    Zabbix agent does on port 10050. Requests may be plain keys terminated
+    by newline or framed with ZBXD header, compressed ones included.
+    Values come from an ItemRegistry. agent.ping is answered unless
+    registered otherwise.
+
+    The agent runs either on the asyncio event loop of an application,
+    see start_server, or on its own loop in a background thread, see start.
+    Handlers run on the loop of the agent, slow handlers should be coroutine
+    functions or be cached with ttl.
+
+    Parameters
+    ----------
+    :registry:
+        Registry of item handlers.
+    :host:
+        Address to listen on.
+    :port:
+        Port to listen on, 0 picks a free one.
+    :allowed_hosts:
+        Addresses of servers and proxies allowed to connect, like Server
+        parameter of Zabbix agent. Everybody is allowed by default.
+    :timeout:
+        Number of seconds to wait for a request before closing the connection.
+    """
+
+    def __init__(self, registry: Optional[ItemRegistry] = None, host: str = '0.0.0.0', port: int = 10050,
+                 allowed_hosts: Optional[Iterable[str]] = None, timeout: float = 3.0) -> None:
+        self.registry = registry if registry is not None else ItemRegistry()
+        if 'agent.ping' not in self.registry:
+            self.registry.register('agent.ping', lambda: 1)
+        self.host = host
+        self.port = port
+        self.allowed_hosts = set(allowed_hosts) if allowed_hosts is not None else None
+        self.timeout = timeout
+        self.requests = 0
+        self.rejected = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def start_server(self) -> Any:
+        """
+        Start listening on the running event loop.
+
+        Returns
+        -------
+        asyncio.AbstractServer
+            Server to be closed by the caller.
+        """
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        logger.info(f"Passive agent listening on {self.host}:{self.port}")
+        return server
+
+    def start(self) -> 'PassiveAgent':
+        """
+        Start listening on a new event loop in a background thread.
+
+        Returns
+        -------
+        PassiveAgent
+            The agent itself, with port set to the listening port.
+        """
+        started = threading.Event()
+        errors: List[BaseException] = []
+        loop = self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            try:
+                server = loop.run_until_complete(self.start_server())
+            except BaseException as e:
+                errors.append(e)
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name='zappix-agent', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            # Binding failed, e.g. the port is in use
+            self._thread.join()
+            self._thread = self._loop = None
+            raise errors[0]
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop listening and wait for the background thread.
+        """
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'PassiveAgent':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            peer = writer.get_extra_info('peername')
+            if self.allowed_hosts is not None and (not peer or peer[0] not in self.allowed_hosts):
+                self.rejected += 1
+                logger.warning(f"Rejected connection from {peer[0] if peer else 'unknown peer'}")
+                return
+            try:
+                key, compressed, _ = await asyncio.wait_for(_read_request(reader), self.timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                return
+            self.requests += 1
+            value = await self.registry.get_async(key.decode('utf-8', 'replace').strip())
+            writer.write(_frame(value.encode('utf-8'), compressed))
+            await writer.drain()
+        except Exception:
+            logger.exception("Passive agent failed to handle request")
+        finally:
+            writer.close()
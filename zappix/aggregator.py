@@ -0,0 +1,284 @@
+"""
+Pre-aggregation of high-frequency values before they are sent.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from bisect import bisect_right, insort
+from zappix.protocol import SenderData, SenderDataRequest, merge_info
+from zappix.sender import Sender
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_REDUCERS = ('last', 'min', 'max', 'avg', 'sum', 'count')
+
+
+class _Quantile:
+    """
+    Streaming estimate of a quantile in constant memory,
+    the P-square algorithm of Jain and Chlamtac.
+    """
+    __slots__ = ['p', 'heights', 'positions', 'desired', 'increments']
+
+    def __init__(self, p: float) -> None:
+        self.p = p
+        self.heights: list = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float) -> None:
+        h, n = self.heights, self.positions
+        if len(h) < 5:
+            insort(h, x)
+            return
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        else:
+            if x > h[4]:
+                h[4] = x
+            k = min(bisect_right(h, x) - 1, 3)
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                q = h[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                if not h[i - 1] < q < h[i + 1]:
+                    q = h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+                h[i] = q
+                n[i] += step
+
+    def value(self) -> float:
+        h = self.heights
+        if len(h) < 5:
+            # Exact while there are too few samples for the estimate
+            return h[int(round(self.p * (len(h) - 1)))]
+        return h[2]
+
+
+class _Window:
+    __slots__ = ['count', 'total', 'minimum', 'maximum', 'last', 'last_clock', 'quantile']
+
+    def __init__(self, quantile: Optional[float]) -> None:
+        self.count = 0
+        self.total: Union[int, float] = 0
+        self.minimum: Any = None
+        self.maximum: Any = None
+        self.last: Any = None
+        self.last_clock = 0.0
+        self.quantile = _Quantile(quantile) if quantile is not None else None
+
+    def add(self, value: Any, clock: float, numeric: bool) -> None:
+        # Convert first, so a sample that is not a number leaves the window untouched
+        number = float(value) if numeric and not isinstance(value, (int, float)) else value
+        self.count += 1
+        if clock >= self.last_clock:
+            self.last, self.last_clock = value, clock
+        if not numeric:
+            return
+        self.total += number
+        if self.minimum is None or number < self.minimum:
+            self.minimum = number
+        if self.maximum is None or number > self.maximum:
+            self.maximum = number
+        if self.quantile is not None:
+            self.quantile.add(number)
+
+    def result(self, reducer: str) -> Any:
+        if reducer == 'last':
+            return self.last
+        if reducer == 'count':
+            return self.count
+        if reducer == 'min':
+            return self.minimum
+        if reducer == 'max':
+            return self.maximum
+        if reducer == 'sum':
+            return self.total
+        if reducer == 'avg':
+            return self.total / self.count
+        assert self.quantile is not None
+        return self.quantile.value()
+
+
+class Aggregator:
+    """
+    Stage in front of Sender reducing values of every (host, key) pair to one
+    value per time window, e.g. the average of all samples collected in a minute.
+    Windows are aligned to multiples of window seconds since the epoch.
+    A window is sent from a background thread delay seconds after it ends,
+    as a single value with the clock of the window end. Samples arriving
+    for a window that was already sent are counted in late and discarded.
+
+    Every window keeps a constant amount of state regardless of how many
+    samples it holds, percentiles are estimated with the P-square algorithm.
+
+    Reducers
+    --------
+    last, min, max, avg, sum, count:
+        Last sample by clock, minimum, maximum, mean, sum and number of samples.
+    p<percentile>:
+        Estimated percentile, e.g. p95 or p99.9.
+
+    Parameters
+    ----------
+    :sender:
+        Sender used to deliver values.
+    :window:
+        Length of a window in seconds.
+    :reducer:
+        Reducer of keys not listed in reducers.
+    :reducers:
+        Dict mapping item keys to reducers.
+    :delay:
+        Number of seconds to wait for late samples after a window ends.
+    :callback:
+        Callable receiving the info dict of every sent request,
+        None if the request could not be delivered.
+    """
+
+    def __init__(self, sender: Sender, window: float = 60.0, reducer: str = 'avg',
+                 reducers: Optional[Dict[str, str]] = None, delay: float = 1.0,
+                 callback: Optional[Callable[[Union[Dict[str, Any], None]], None]] = None) -> None:
+        if window <= 0:
+            raise ValueError("Window must be positive")
+        self._sender = sender
+        self._window = window
+        self._reducer = _parse_reducer(reducer)
+        self._reducers = {key: _parse_reducer(r) for key, r in (reducers or {}).items()}
+        self._delay = delay
+        self._callback = callback
+        self._windows: Dict[Tuple[float, str, str], _Window] = {}
+        self._sent_until = 0.0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.late = 0
+        self.info: Union[Dict[str, Any], None] = None
+        self._worker = threading.Thread(target=self._run, name='zappix-aggregator', daemon=True)
+        self._worker.start()
+
+    def add_value(self, host: str, key: str, value: Any, clock: Optional[float] = None) -> bool:
+        """
+        Add a sample to its window.
+
+        Parameters
+        ----------
+        :host:
+            Name of a host as visible in Zabbix frontend.
+        :key:
+            String representing an item key.
+        :value:
+            Sample, a number or a string convertible to float unless reduced with last or count.
+        :clock:
+            Timestamp at which the sample was collected. Defaults to now.
+
+        Returns
+        -------
+        bool
+            False if the window of the sample was already sent.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("Aggregator is closed")
+        clock = time.time() if clock is None else clock
+        start = clock - clock % self._window
+        reducer, quantile = self._reducers.get(key, self._reducer)
+        with self._lock:
+            if start < self._sent_until:
+                self.late += 1
+                logger.warning(f"Discarding late value of {key} for {host} from {clock}")
+                return False
+            window = self._windows.get((start, host, key))
+            if window is None:
+                window = self._windows[start, host, key] = _Window(quantile)
+            window.add(value, clock, reducer not in ('last', 'count'))
+        return True
+
+    def flush(self, until: Optional[float] = None) -> Union[Dict[str, Any], None]:
+        """
+        Send windows ending before the given time.
+
+        Parameters
+        ----------
+        :until:
+            Timestamp. All windows, including open ones, are sent by default.
+
+        Returns
+        -------
+        dict
+            Information from server, None if nothing was sent.
+        """
+        with self._lock:
+            if until is None:
+                due = list(self._windows)
+                if due:
+                    self._sent_until = max(start for start, _, _ in due) + self._window
+            else:
+                due = [window for window in self._windows if window[0] + self._window <= until]
+                self._sent_until = max(self._sent_until, until - until % self._window)
+            windows = [(start, host, key, self._windows.pop((start, host, key))) for start, host, key in due]
+        if not windows:
+            return None
+
+        request = SenderDataRequest()
+        for start, host, key, window in windows:
+            reducer = self._reducers.get(key, self._reducer)[0]
+            request.add_item(SenderData(host, key, window.result(reducer), int(start + self._window)))
+        try:
+            info = self._sender.send_bulk(request, True)
+        except Exception:
+            logger.exception(f"Could not send {len(request.data)} aggregated values")
+            info = None
+        self.info = merge_info([self.info, info])
+        if self._callback is not None:
+            try:
+                self._callback(info)
+            except Exception:
+                logger.exception("Aggregator callback failed")
+        return info
+
+    def close(self) -> None:
+        """
+        Stop the background thread and send all windows.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._worker.join()
+        self.flush()
+
+    def __enter__(self) -> 'Aggregator':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            now = time.time()
+            # Wake up delay seconds after the end of the current window
+            due = now - now % self._window + self._window + self._delay
+            if self._closed.wait(due - now):
+                return
+            self.flush(time.time() - self._delay)
+
+
+def _parse_reducer(reducer: str) -> Tuple[str, Optional[float]]:
+    if reducer in _REDUCERS:
+        return reducer, None
+    if reducer.startswith('p'):
+        try:
+            percentile = float(reducer[1:])
+        except ValueError:
+            percentile = -1
+        if 0 <= percentile <= 100:
+            return reducer, percentile / 100
+    raise ValueError(f"Unknown reducer: {reducer}")
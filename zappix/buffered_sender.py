@@ -0,0 +1,236 @@
+"""
+Buffered, batching front end of Zabbix sender.
+"""
+
+from typing import Any, Optional, Dict, Callable, Union, List
+from zappix.sender import Sender
+from zappix.protocol import SenderData, SenderDataRequest, merge_info
+from zappix.value_cache import ValueCache
+import copy
+import queue
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough JSON overhead of a single item: braces, quotes, field names and clock
+_ITEM_OVERHEAD = 64
+
+
+class _Flush:
+    __slots__ = ['done']
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class BufferedSender:
+    """
+    Sender that queues values and sends them in batches from a background thread.
+    A batch is sent when it reaches max_items items or max_bytes bytes,
+    or when its oldest item is max_age seconds old.
+    Values are timestamped when queued, items passed to add_item are
+    not modified.
+
+    Parameters
+    ----------
+    :sender:
+        Sender used to deliver batches.
+    :max_items:
+        Maximum number of items in one batch.
+    :max_bytes:
+        Approximate maximum size of one batch in bytes.
+    :max_age:
+        Maximum number of seconds an item waits in the buffer.
+    :queue_size:
+        Maximum number of items waiting to be batched.
+    :policy:
+        What to do with new items when the queue is full: 'block' waits
+        for free space, 'drop' discards the item.
+    :callback:
+        Callable receiving the info dict of every sent batch,
+        None if the batch could not be delivered.
+    :value_cache:
+        ValueCache skipping values equal to the last one sent.
+    """
+
+    _policies = ('block', 'drop')
+
+    def __init__(self, sender: Sender, max_items: int = 1000, max_bytes: int = 1048576, max_age: float = 1.0,
+                 queue_size: int = 100000, policy: str = 'block',
+                 callback: Optional[Callable[[Union[Dict[str, Any], None]], None]] = None,
+                 value_cache: Optional[ValueCache] = None) -> None:
+        if policy not in BufferedSender._policies:
+            raise ValueError(f"Unknown policy: {policy}")
+        self._sender = sender
+        self._max_items = max_items
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._policy = policy
+        self._callback = callback
+        self._value_cache = value_cache
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self.dropped = 0
+        self.info: Union[Dict[str, Any], None] = None
+        self._worker = threading.Thread(target=self._run, name='zappix-buffered-sender', daemon=True)
+        self._worker.start()
+
+    def add_value(self, host: str, key: str, value: Any, clock: Optional[int] = None) -> bool:
+        """
+        Queue a single value.
+
+        Parameters
+        ----------
+        :host:
+            Name of a host as visible in Zabbix frontend.
+        :key:
+            String representing an item key.
+        :value:
+            Value to be sent.
+        :clock:
+            Timestamp at which value was collected. Defaults to now.
+
+        Returns
+        -------
+        bool
+            False if the value was dropped.
+        """
+        return self.add_item(SenderData(host, key, value, clock))
+
+    def add_item(self, item: SenderData) -> bool:
+        """
+        Queue a SenderData object.
+
+        Parameters
+        ----------
+        :item:
+            Instance of SenderData.
+
+        Returns
+        -------
+        bool
+            False if the item was dropped. Items skipped by value_cache are not dropped.
+        """
+        if not isinstance(item, SenderData):
+            raise TypeError
+        if self._closed:
+            raise RuntimeError("BufferedSender is closed")
+        if item.clock is None:
+            # The caller may reuse the item, stamp a copy
+            item = copy.copy(item)
+            item.clock = int(time.time())
+        if self._value_cache is not None and not self._value_cache.changed(item.host, item.key, item.value, item.clock):
+            return True
+        if self._policy == 'block':
+            self._queue.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self._value_cache is not None:
+                # The value was never sent, its successors must not be suppressed
+                self._value_cache.forget(item.host, item.key)
+            self.dropped += 1
+            logger.warning(f"Buffer full, dropping value of {item.key} for {item.host}")
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Send all queued items and wait until they are delivered.
+
+        Parameters
+        ----------
+        :timeout:
+            Maximum number of seconds to wait.
+
+        Returns
+        -------
+        bool
+            True if all items were handed to the sender in time.
+        """
+        marker = _Flush()
+        expires = time.monotonic() + timeout if timeout is not None else None
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(_remaining(expires))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Flush queued items and stop the background thread.
+
+        Parameters
+        ----------
+        :timeout:
+            Maximum number of seconds to wait.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        expires = time.monotonic() + timeout if timeout is not None else None
+        self.flush(timeout)
+        try:
+            self._queue.put(None, timeout=_remaining(expires))
+        except queue.Full:
+            logger.warning(f"Could not stop background thread in {timeout}s, {self._queue.qsize()} entries left")
+            return
+        self._worker.join(_remaining(expires))
+
+    def __enter__(self) -> 'BufferedSender':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        batch: List[SenderData] = []
+        size = 0
+        deadline = 0.0
+        while True:
+            timeout = max(deadline - time.monotonic(), 0) if batch else None
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = False
+
+            if isinstance(entry, SenderData):
+                if not batch:
+                    deadline = time.monotonic() + self._max_age
+                batch.append(entry)
+                size += len(entry.host) + len(entry.key) + len(str(entry.value)) + _ITEM_OVERHEAD
+                if len(batch) < self._max_items and size < self._max_bytes:
+                    continue
+
+            if batch:
+                self._send_batch(batch)
+                batch, size = [], 0
+            if isinstance(entry, _Flush):
+                entry.done.set()
+            elif entry is None:
+                return
+
+    def _send_batch(self, batch: List[SenderData]) -> None:
+        logger.debug(f"Sending batch of {len(batch)} items")
+        try:
+            info = self._sender.send_bulk(SenderDataRequest(batch), True)
+        except Exception:
+            logger.exception("Could not send batch")
+            info = None
+        self.info = merge_info([self.info, info])
+        if info is None and self._value_cache is not None:
+            # Undelivered values must not suppress their successors
+            for item in batch:
+                self._value_cache.forget(item.host, item.key)
+        if self._callback:
+            try:
+                self._callback(info)
+            except Exception:
+                logger.exception("Callback failed")
+
+
+def _remaining(expires: Optional[float]) -> Optional[float]:
+    return max(expires - time.monotonic(), 0) if expires is not None else None
@@ -0,0 +1,281 @@
+"""
+Module containing a persistent buffer for requests that could not be delivered.
+"""
+
+from typing import Any, Callable, Dict, List, Tuple
+from zappix.exceptions import ZappixConnectionError, ZappixError
+from zappix.protocol import ServerResponse
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Payload length, CRC32 of payload and time at which the record was appended
+_RECORD = struct.Struct('<IId')
+# Sequence number of the head segment and offset of its first unsent record
+_POSITION = struct.Struct('<QQ')
+_SUFFIX = '.log'
+_POSITION_FILE = 'position'
+
+
+class _Segment:
+    __slots__ = ['seq', 'path', 'size', 'records']
+
+    def __init__(self, seq: int, path: str, size: int = 0, records: int = 0) -> None:
+        self.seq = seq
+        self.path = path
+        self.size = size
+        self.records = records
+
+
+class DiskBuffer:
+    """
+    Append-only log of encoded requests that could not be delivered.
+    Records are kept in segment files in a directory. When the log grows
+    beyond max_bytes, the oldest segments are evicted.
+
+    Replay sends records oldest first, merging consecutive requests of the
+    same type and session into batches of up to batch_items items. Item ids,
+    clocks and ns are preserved, so the server deduplicates agent data
+    correctly. Request clocks are set to the replay time, and items sent
+    without a clock get the time at which they were buffered.
+
+    Parameters
+    ----------
+    :path:
+        Directory holding the segment files. Created if missing.
+    :max_bytes:
+        Maximum size of all segments.
+    :segment_bytes:
+        Size after which a new segment is started.
+    :batch_items:
+        Maximum number of items in one replayed request.
+    :fsync:
+        Flush every record to disk before returning from append.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 67108864, segment_bytes: int = 4194304,
+                 batch_items: int = 1000, fsync: bool = False) -> None:
+        self._path = path
+        self._max_bytes = max_bytes
+        self._segment_bytes = segment_bytes
+        self._batch_items = batch_items
+        self._fsync = fsync
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._offset = 0
+        self._bytes = 0
+        self._file: Any = None
+        self._next_seq = 1
+        self.evicted = 0
+        self.replayed = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return sum(segment.records for segment in self._segments)
+
+    def append(self, payload: bytes) -> None:
+        """
+        Store an encoded request.
+
+        Parameters
+        ----------
+        :payload:
+            Request encoded as JSON, e.g. by zappix.protocol.encode_request.
+        """
+        record = _RECORD.pack(len(payload), zlib.crc32(payload), time.time())
+        with self._lock:
+            if self._file is None or self._segments[-1].size >= self._segment_bytes:
+                self._roll()
+            self._file.write(record)
+            self._file.write(payload)
+            self._file.flush()
+            if self._fsync:
+                os.fsync(self._file.fileno())
+            segment = self._segments[-1]
+            segment.size += len(record) + len(payload)
+            segment.records += 1
+            self._bytes += len(record) + len(payload)
+            self._evict()
+
+    def replay(self, send: Callable[[bytes], str]) -> bool:
+        """
+        Send buffered requests oldest first until the buffer is empty
+        or a request cannot be delivered. Requests the server cannot
+        be reached for are kept and the ZappixConnectionError is raised,
+        requests failing with any other ZappixError are logged and dropped,
+        as sending them again would fail the same way. A request that timed
+        out waiting for the response is dropped and replay stops, as the
+        server may have processed it.
+
+        Parameters
+        ----------
+        :send:
+            Callable sending an encoded request and returning the raw
+            response, an empty string if it could not be delivered.
+
+        Returns
+        -------
+        bool
+            True if all buffered requests were delivered.
+        """
+        with self._lock:
+            while self._segments:
+                segment = self._segments[0]
+                records = _read_records(segment.path, self._offset)[0]
+                start = 0
+                while start < len(records):
+                    stop, payload, items = self._merge(records, start)
+                    stopped = False
+                    try:
+                        response = send(payload)
+                    except ZappixConnectionError as e:
+                        if not e.sent:
+                            logger.warning(f"Replay stopped, {len(self)} buffered requests left")
+                            raise
+                        # Sending them again could duplicate the items
+                        logger.error(f"Dropping {items} buffered items the server may have processed: {e}")
+                        response, stopped = None, True
+                    except ZappixError as e:
+                        logger.error(f"Dropping {items} buffered items: {e}")
+                        response = None
+                    if response == '':
+                        logger.warning(f"Replay stopped, {len(self)} buffered requests left")
+                        return False
+                    if response is not None and ServerResponse(response).response != 'success':
+                        logger.error(f"Server rejected {items} buffered items: {response}")
+                    self._offset = records[stop - 1][0]
+                    segment.records -= stop - start
+                    self.replayed += items
+                    start = stop
+                    self._save_position(segment.seq)
+                    if stopped:
+                        logger.warning(f"Replay stopped, {len(self)} buffered requests left")
+                        return False
+                self._drop_head()
+            return True
+
+    def close(self) -> None:
+        """
+        Close the current segment file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _merge(self, records: List[Tuple[int, float, bytes]], start: int) -> Tuple[int, bytes, int]:
+        merged: Dict[str, Any] = {}
+        data: List[Dict[str, Any]] = []
+        stamped = False
+        stop = start
+        while stop < len(records) and len(data) < self._batch_items:
+            _, appended, payload = records[stop]
+            request = json.loads(payload)
+            if merged and (request.get('request'), request.get('session')) != (merged['request'], merged.get('session')):
+                break
+            if not merged:
+                merged = {k: v for k, v in request.items() if k not in ('data', 'clock', 'ns')}
+            stamped = stamped or 'clock' in request
+            for item in request.get('data', []):
+                if 'clock' not in item:
+                    item['clock'] = int(appended)
+                data.append(item)
+            stop += 1
+        merged['data'] = data
+        if stamped:
+            now = time.time()
+            merged['clock'], merged['ns'] = int(now), int(now % 1 * 1e9)
+        return stop, json.dumps(merged).encode('utf-8'), len(data)
+
+    def _load(self) -> None:
+        position_seq, position_offset = 0, 0
+        try:
+            with open(os.path.join(self._path, _POSITION_FILE), 'rb') as f:
+                position_seq, position_offset = _POSITION.unpack(f.read(_POSITION.size))
+        except (OSError, struct.error):
+            pass
+
+        names = sorted(name for name in os.listdir(self._path) if name.endswith(_SUFFIX) and name[:-4].isdigit())
+        for name in names:
+            seq = int(name[:-len(_SUFFIX)])
+            path = os.path.join(self._path, name)
+            if seq < position_seq:
+                os.remove(path)
+                continue
+            start = position_offset if seq == position_seq else 0
+            records, end = _read_records(path, start)
+            if end < os.path.getsize(path):
+                logger.warning(f"Truncating damaged tail of {path} at {end}")
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            if not self._segments:
+                self._offset = start
+            self._segments.append(_Segment(seq, path, end, len(records)))
+            self._bytes += end
+        self._next_seq = self._segments[-1].seq + 1 if self._segments else position_seq + 1
+        if len(self):
+            logger.info(f"Loaded {len(self)} buffered requests from {self._path}")
+
+    def _roll(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self._path, f"{self._next_seq:020d}{_SUFFIX}")
+        if not self._segments:
+            self._offset = 0
+        self._segments.append(_Segment(self._next_seq, path))
+        self._next_seq += 1
+        self._file = open(path, 'ab')
+
+    def _evict(self) -> None:
+        while self._bytes > self._max_bytes and len(self._segments) > 1:
+            segment = self._segments[0]
+            logger.warning(f"Buffer full, evicting {segment.records} requests from {segment.path}")
+            self.evicted += segment.records
+            self._drop_head()
+
+    def _drop_head(self) -> None:
+        segment = self._segments.pop(0)
+        if not self._segments:
+            self.close()
+        self._bytes -= segment.size
+        self._offset = 0
+        os.remove(segment.path)
+        self._save_position(self._segments[0].seq if self._segments else self._next_seq)
+
+    def _save_position(self, seq: int) -> None:
+        path = os.path.join(self._path, _POSITION_FILE)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(_POSITION.pack(seq, self._offset))
+        os.replace(path + '.tmp', path)
+
+
+def _read_records(path: str, offset: int) -> Tuple[List[Tuple[int, float, bytes]], int]:
+    """
+    Read valid records of a segment starting at offset.
+    Returns the records as (end offset, time appended, payload) and the
+    offset at which valid data ends.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    view = memoryview(data)
+    records = []
+    position = 0
+    while position + _RECORD.size <= len(data):
+        length, crc, appended = _RECORD.unpack_from(data, position)
+        end = position + _RECORD.size + length
+        if end > len(data):
+            break
+        payload = bytes(view[position + _RECORD.size:end])
+        if zlib.crc32(payload) != crc:
+            break
+        records.append((offset + end, appended, payload))
+        position = end
+    return records, offset + position
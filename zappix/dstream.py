@@ -2,75 +2,547 @@
 Module containing handlers for Zabbix protocol.
 """
 
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 import abc
+import asyncio
 import socket
 import struct
+import time
+import zlib
+from zappix.pool import ConnectionPool
+from zappix.disk_buffer import DiskBuffer
+from zappix.exceptions import ZappixError, ZappixConnectionError, ZappixProtocolError, ZappixTimeout
+from zappix.servers import ServerList
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Protocol, flags, length of data and reserved field (uncompressed length)
+_HEADER = struct.Struct('<4sBII')
+_LARGE_HEADER = struct.Struct('<4sBQQ')
+_FLAG_ZBXD = 0x01
+_FLAG_COMPRESSED = 0x02
+_FLAG_LARGE = 0x04
+# Zabbix rejects messages with more data than this unless they are large packets
+_LARGE_THRESHOLD = 2 ** 30
+# Below this size copying the payload is cheaper than a scatter-gather send
+_COALESCE_LIMIT = 16384
+# Zabbix server and agent drop messages larger than this, ZBX_MAX_RECV_DATA_SIZE
+_MAX_RECV_SIZE = 2 ** 30
+# Limit of large packets, ZBX_MAX_RECV_LARGE_DATA_SIZE
+_MAX_RECV_LARGE_SIZE = 16 * 2 ** 30
 
-class _Dstream(abc.ABC):
-    def __init__(self, target: str, port: int = 10051, source_address: Optional[str] = None) -> None:
+
+class _BaseDstream(abc.ABC):
+    """
+    Base class for Zabbix protocol clients.
+
+    Parameters
+    ----------
+    :target:
+        Address of the peer, or a ServerList of equivalent peers.
+    :port:
+        Port on which the peer listens.
+    :source_address:
+        Source IP address.
+    :buffer_size:
+        Maximum number of bytes read from the socket at once.
+    :raise_errors:
+        Raise ZappixError subclasses instead of logging errors
+        and returning an empty response.
+    :timeout:
+        Seconds to wait for the peer to accept or return data.
+        Waits indefinitely if not set.
+    :connect_timeout:
+        Seconds to wait for a connection, defaults to timeout.
+    :deadline:
+        Maximum number of seconds for a whole request, from connecting
+        to reading the last byte of the response.
+    :compression:
+        Compress requests with zlib. Compressed responses are always accepted.
+        Requires Zabbix 4.0 or newer on the other side.
+    :compression_threshold:
+        Requests smaller than this many bytes are sent uncompressed.
+    :max_response_size:
+        Responses declaring more bytes than this, compressed or not,
+        are rejected before their data is read.
+    :max_large_response_size:
+        Limit of max_response_size for large packets, which Zabbix
+        uses for messages of more than 1 GiB.
+    """
+
+    def __init__(self, target: Union[str, ServerList], port: int = 10051, source_address: Optional[str] = None,
+                 buffer_size: int = 65536, raise_errors: bool = False, timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None, deadline: Optional[float] = None,
+                 compression: bool = False, compression_threshold: int = 1024,
+                 max_response_size: int = _MAX_RECV_SIZE,
+                 max_large_response_size: int = _MAX_RECV_LARGE_SIZE) -> None:
+        self._servers: Optional[ServerList] = None
+        if isinstance(target, ServerList):
+            self._servers = target
+            target, port = target.servers[0]
         self._ip = target
         self._port = port
         self._source_address = source_address
+        self._buffer_size = buffer_size
+        self._raise_errors = raise_errors
+        self._timeout = timeout
+        self._connect_timeout = timeout if connect_timeout is None else connect_timeout
+        self._deadline = deadline
+        self._compression = compression
+        self._compression_threshold = compression_threshold
+        self._max_response_size = max_response_size
+        self._max_large_response_size = max_large_response_size
+
+    def _handle_error(self, error: ZappixError) -> str:
+        if self._raise_errors:
+            raise error
+        logger.error(str(error))
+        return ""
+
+    def _unpack_header(self, header: Union[bytes, bytearray, memoryview]) -> Tuple[int, int, int]:
+        if len(header) < _HEADER.size or bytes(header[:4]) != b'ZBXD' or not header[4] & _FLAG_ZBXD:
+            raise struct.error(f"Invalid protocol header: {bytes(header[:5])!r}")
+        _, flags, length, reserved = _header_struct(header[4]).unpack_from(header)
+        return flags, length, reserved
+
+    def _check_size(self, flags: int, length: int, reserved: int) -> None:
+        # Buffers are allocated from the header, a bogus one must not exhaust memory
+        size = max(length, reserved)
+        limit = self._max_large_response_size if flags & _FLAG_LARGE else self._max_response_size
+        if size > limit:
+            raise struct.error(f"Response of {size} bytes exceeds limit of {limit} bytes")
+
+    def _parse_response(self, response: Union[bytes, bytearray]) -> str:
+        flags, length, reserved = self._unpack_header(response)
+        header_size = _header_struct(flags).size
+        if len(response) < header_size + length:
+            raise struct.error(f"Expected {length} bytes of data, got {len(response) - header_size}")
+
+        data: Union[bytes, memoryview] = memoryview(response)[header_size:header_size + length]
+        if flags & _FLAG_COMPRESSED:
+            try:
+                data = zlib.decompress(data, bufsize=max(reserved, 1))
+            except zlib.error as e:
+                raise struct.error(f"Cannot decompress response: {e}") from e
+            if len(data) != reserved:
+                raise struct.error(f"Expected {reserved} bytes after decompression, got {len(data)}")
+        return str(data, 'utf-8')
+
+    @staticmethod
+    def _remaining(timeout: Optional[float], expires: Optional[float]) -> Optional[float]:
+        if expires is None:
+            return timeout
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("Request deadline exceeded")
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def _prepare_payload(self, payload: bytes) -> List[bytes]:
+        payload_len = len(payload)
+        flags, reserved = _FLAG_ZBXD, 0
+        if self._compression and payload_len >= self._compression_threshold:
+            compressed = zlib.compress(payload)
+            # Incompressible data is sent as is
+            if len(compressed) < payload_len:
+                payload, flags, reserved = compressed, _FLAG_ZBXD | _FLAG_COMPRESSED, payload_len
+        if max(len(payload), reserved) > _LARGE_THRESHOLD:
+            flags |= _FLAG_LARGE
+        header = _pack_header(flags, len(payload), reserved)
+        logger.debug(f"Packed payload for {self._ip}:{self._port}. Payload length: {payload_len}. Length with headers: {len(payload) + len(header)}")
+        return [header, payload]
+
+
+class _Dstream(_BaseDstream):
+    """
+    Blocking Zabbix protocol client.
+
+    Parameters
+    ----------
+    :target:
+        Address of the peer, or a ServerList of equivalent peers.
+    :port:
+        Port on which the peer listens.
+    :source_address:
+        Source IP address.
+    :pool:
+        ConnectionPool to take connections from. A new connection is opened
+        and closed for every request if not set.
+    :disk_buffer:
+        DiskBuffer storing data requests that could not be delivered.
+        Buffered requests are replayed before the next data request.
+    :kwargs:
+        Options of _BaseDstream.
+    """
+
+    def __init__(self, target: Union[str, ServerList], port: int = 10051, source_address: Optional[str] = None,
+                 pool: Optional[ConnectionPool] = None, disk_buffer: Optional[DiskBuffer] = None,
+                 **kwargs) -> None:
+        super().__init__(target, port, source_address, **kwargs)
+        self._pool = pool
+        self._disk_buffer = disk_buffer
 
     def _send(self, payload: bytes) -> str:
-        data = b""
-        parsed = ""
+        try:
+            return self._send_or_raise(payload)
+        except ZappixError as e:
+            return self._handle_error(e)
+
+    def _send_or_raise(self, payload: bytes) -> str:
+        packed = self._prepare_payload(payload)
+        if self._servers is None:
+            return self._request(packed, (self._ip, self._port))
+        return self._servers.run(lambda address: self._request(packed, address))
+
+    def _send_buffered(self, payload: bytes) -> str:
+        return self._send_spooled(payload)[0]
+
+    def _send_spooled(self, payload: bytes) -> Tuple[str, bool]:
+        # Also tells whether the payload was stored in the disk buffer
+        if self._disk_buffer is None:
+            return self._send(payload), False
+        try:
+            # Older data goes first, otherwise the server drops it as already seen
+            if len(self._disk_buffer) and not self._disk_buffer.replay(self._send_or_raise):
+                self._disk_buffer.append(payload)
+                return "", True
+        except ZappixConnectionError as e:
+            return self._spool(payload, e), True
+        try:
+            return self._send_or_raise(payload), False
+        except ZappixConnectionError as e:
+            if e.sent:
+                # The server may have processed it, replaying could duplicate the data
+                return self._handle_error(e), False
+            return self._spool(payload, e), True
+        except ZappixError as e:
+            # Rejected or garbled responses would fail again on replay
+            return self._handle_error(e), False
+
+    def _spool(self, payload: bytes, error: ZappixConnectionError) -> str:
+        assert self._disk_buffer is not None
+        logger.warning(f"Buffering request of {len(payload)} bytes for {self._ip}:{self._port}")
+        self._disk_buffer.append(payload)
+        return self._handle_error(error)
+
+    def _request(self, packed: List[bytes], address: Tuple[str, int]) -> str:
+        expires = time.monotonic() + self._deadline if self._deadline else None
+        try:
+            if self._pool:
+                data = self._exchange_pooled(packed, address, expires)
+            else:
+                data = self._exchange(packed, address, expires)
+            return self._parse_response(data)
+        except socket.timeout as e:
+            raise ZappixTimeout(f"Timed out talking to host {address[0]}:{address[1]}: {e}", address,
+                                isinstance(e, _ResponseTimeout)) from e
+        except socket.error as e:
+            raise ZappixConnectionError(f"Cannot connect to host {address[0]}:{address[1]}: {e}", address) from e
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ZappixProtocolError(f"Received response from {address[0]}:{address[1]} is corrupted: {e}",
+                                      address) from e
+
+    def _exchange(self, packed: List[bytes], address: Tuple[str, int], expires: Optional[float] = None) -> bytearray:
         s = None
+        host, port = address
+        connect_timeout = self._remaining(self._connect_timeout, expires)
+        if connect_timeout is None:
+            connect_timeout = socket.getdefaulttimeout()
         try:
             if self._source_address:
                 s = socket.create_connection(
-                    (self._ip, self._port),
+                    address, timeout=connect_timeout,
                     source_address=(self._source_address, 0))
-                logger.info(f"Opening connection to {self._ip}:{self._port} with source address {self._source_address}")
+                logger.info(f"Opening connection to {host}:{port} with source address {self._source_address}")
             else:
-                s = socket.create_connection((self._ip, self._port))
-                logger.info(f"Opening connection to {self._ip}:{self._port}")
-            packed = self._prepare_payload(payload)
-            s.sendall(packed)
-            data = self._recv_info(s)
-            parsed = self._parse_response(data)
-        except socket.error:
-            logger.exception(f"Cannot connect to host {self._ip}:{self._port}:")
-        except struct.error:
-            logger.exception(f"Recived response is corrupted:")
+                s = socket.create_connection(address, timeout=connect_timeout)
+                logger.info(f"Opening connection to {host}:{port}")
+            self._set_timeout(s, expires)
+            self._send_buffers(s, packed)
+            return self._recv_response(s, expires)
         finally:
             if s:
-                logger.info(f"Closing connection to {self._ip}:{self._port}")
+                logger.info(f"Closing connection to {host}:{port}")
                 s.close()
-            return parsed
 
-    def _parse_response(self, response: bytes) -> str:
-        _, length = struct.unpack('<5sQ', response[:13])
-        data = struct.unpack(
-            '<{}s'.format(length),
-            response[13:13+length]
-            )[0]
+    def _exchange_pooled(self, packed: List[bytes], address: Tuple[str, int],
+                         expires: Optional[float] = None) -> bytearray:
+        assert self._pool is not None
+        host, port = address
+        s, reused = self._pool.acquire(host, port, self._source_address,
+                                       self._remaining(self._connect_timeout, expires))
+        while True:
+            try:
+                self._set_timeout(s, expires)
+                self._send_buffers(s, packed)
+                data = self._recv_response(s, expires)
+            except socket.timeout:
+                s.close()
+                raise
+            except socket.error:
+                s.close()
+                if not reused:
+                    raise
+                # Peer closed the idle connection after its last response
+                logger.info(f"Reconnecting to {host}:{port}")
+                s, reused = self._pool.connect(host, port, self._source_address,
+                                               self._remaining(self._connect_timeout, expires)), False
+            except BaseException:
+                s.close()
+                raise
+            else:
+                self._pool.release(s, host, port, self._source_address)
+                return data
+
+    def _recv_response(self, socket_: socket.socket, expires: Optional[float]) -> bytearray:
+        try:
+            return self._recv_info(socket_, expires=expires)
+        except socket.timeout as e:
+            raise _ResponseTimeout(*e.args) from e
 
-        return data.decode('utf-8')
+    def _send_buffers(self, socket_: socket.socket, buffers: List[bytes]) -> None:
+        if not hasattr(socket_, 'sendmsg') or sum(len(buffer) for buffer in buffers) < _COALESCE_LIMIT:
+            socket_.sendall(b''.join(buffers))
+            return
 
-    def _prepare_payload(self, payload: bytes) -> bytes:
-        payload_len = len(payload)
-        packed = struct.pack(
-            '<5sQ{}s'.format(payload_len),
-            b'ZBXD\x01',
-            payload_len,
-            payload
-            )
-        logger.debug(f"Packed payload for {self._ip}:{self._port}. Payload length: {payload_len}. Length with headers: {len(packed)}")
-        return packed
-
-    def _recv_info(self, socket_: socket.socket, buff: int = 1024) -> bytes:
-        data = b""
-        buffer = socket_.recv(buff)
-        logger.debug(f"Received {len(buffer)} from {self._ip}:{self._port}")
-        while buffer:
-            data += buffer
-            buffer = socket_.recv(buff)
-            logger.debug(f"Received {len(buffer)} from {self._ip}:{self._port}")
+        views = [memoryview(buffer) for buffer in buffers if buffer]
+        while views:
+            sent = socket_.sendmsg(views)
+            while sent:
+                if sent >= len(views[0]):
+                    sent -= len(views.pop(0))
+                else:
+                    views[0] = views[0][sent:]
+                    sent = 0
+
+    def _recv_info(self, socket_: socket.socket, buff: Optional[int] = None,
+                   expires: Optional[float] = None) -> bytearray:
+        buff = buff or self._buffer_size
+        header = bytearray(_LARGE_HEADER.size)
+        view = memoryview(header)
+        received = self._recv_into(socket_, view[:_HEADER.size], buff, expires)
+        if not received:
+            raise ConnectionResetError("Connection closed before response")
+        if received < _HEADER.size:
+            raise struct.error(f"Connection closed after {received} bytes of header")
+        header_size = _header_struct(header[4]).size
+        if header_size > _HEADER.size:
+            received += self._recv_into(socket_, view[_HEADER.size:header_size], buff, expires)
+            if received < header_size:
+                raise struct.error(f"Connection closed after {received} bytes of header")
+        flags, length, reserved = self._unpack_header(view[:header_size])
+        self._check_size(flags, length, reserved)
+
+        if flags & _FLAG_COMPRESSED:
+            # Inflate while receiving, the compressed data is never held as a whole
+            data = bytearray(header_size + reserved)
+            data[:header_size] = _pack_header(flags & ~_FLAG_COMPRESSED, reserved, 0)
+            self._recv_inflate(socket_, memoryview(data)[header_size:], length, buff, expires)
+        else:
+            data = bytearray(header_size + length)
+            data[:header_size] = view[:header_size]
+            received = self._recv_into(socket_, memoryview(data)[header_size:], buff, expires)
+            if received < length:
+                raise struct.error(f"Connection closed after {received} of {length} bytes")
         logger.debug(f"Completed data retrieval from {self._ip}:{self._port}. Total length: {len(data)}")
         return data
+
+    def _recv_into(self, socket_: socket.socket, view: memoryview, buff: int,
+                   expires: Optional[float] = None) -> int:
+        received = 0
+        while received < len(view):
+            if expires is not None:
+                self._set_timeout(socket_, expires)
+            chunk = socket_.recv_into(view[received:received + buff])
+            if not chunk:
+                break
+            received += chunk
+            logger.debug(f"Received {chunk} from {self._ip}:{self._port}")
+        return received
+
+    def _recv_inflate(self, socket_: socket.socket, out: memoryview, length: int, buff: int,
+                      expires: Optional[float] = None) -> None:
+        inflater = _Inflater(out)
+        chunk = memoryview(bytearray(max(min(buff, length), 1)))
+        remaining = length
+        while remaining:
+            if expires is not None:
+                self._set_timeout(socket_, expires)
+            received = socket_.recv_into(chunk[:min(len(chunk), remaining)])
+            if not received:
+                raise struct.error(f"Connection closed after {length - remaining} of {length} bytes")
+            remaining -= received
+            inflater.feed(chunk[:received])
+        inflater.finish()
+
+    def _set_timeout(self, socket_: socket.socket, expires: Optional[float]) -> None:
+        # A connect timeout must not outlive the connect call
+        if self._timeout is not None or self._connect_timeout is not None or expires is not None:
+            socket_.settimeout(self._remaining(self._timeout, expires))
+
+
+class _AsyncDstream(_BaseDstream):
+    async def _send(self, payload: bytes) -> str:
+        try:
+            return await self._send_or_raise(payload)
+        except ZappixError as e:
+            return self._handle_error(e)
+
+    async def _send_or_raise(self, payload: bytes) -> str:
+        packed = self._prepare_payload(payload)
+        if self._servers is None:
+            return await self._request(packed, (self._ip, self._port))
+        return await self._servers.run_async(lambda address: self._request(packed, address))
+
+    async def _request(self, packed: List[bytes], address: Tuple[str, int]) -> str:
+        expires = time.monotonic() + self._deadline if self._deadline else None
+        return await self._exchange(packed, address, expires)
+
+    async def _exchange(self, packed: List[bytes], address: Tuple[str, int],
+                        expires: Optional[float] = None) -> str:
+        writer: Optional[asyncio.StreamWriter] = None
+        host, port = address
+        sent = False
+        try:
+            local_addr = (self._source_address, 0) if self._source_address else None
+            reader, opened = await asyncio.wait_for(asyncio.open_connection(host, port, local_addr=local_addr),
+                                                    self._remaining(self._connect_timeout, expires))
+            writer = opened
+            if self._source_address:
+                logger.info(f"Opening connection to {host}:{port} with source address {self._source_address}")
+            else:
+                logger.info(f"Opening connection to {host}:{port}")
+            opened.writelines(packed)
+            await asyncio.wait_for(opened.drain(), self._remaining(self._timeout, expires))
+            sent = True
+            data = await asyncio.wait_for(self._recv_info(reader), self._remaining(self._timeout, expires))
+            return self._parse_response(data)
+        except (asyncio.TimeoutError, socket.timeout) as e:
+            raise ZappixTimeout(f"Timed out talking to host {host}:{port}", address, sent) from e
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                raise ZappixConnectionError(f"Connection to {host}:{port} closed before response", address) from e
+            raise ZappixProtocolError(f"Received response from {host}:{port} is corrupted: {e}", address) from e
+        except OSError as e:
+            raise ZappixConnectionError(f"Cannot connect to host {host}:{port}: {e}", address) from e
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ZappixProtocolError(f"Received response from {host}:{port} is corrupted: {e}", address) from e
+        finally:
+            if writer:
+                logger.info(f"Closing connection to {host}:{port}")
+                writer.close()
+
+    async def _recv_info(self, reader: asyncio.StreamReader) -> Union[bytes, bytearray]:
+        header = await reader.readexactly(_HEADER.size)
+        if header[4] & _FLAG_LARGE:
+            header += await reader.readexactly(_LARGE_HEADER.size - _HEADER.size)
+        flags, length, reserved = self._unpack_header(header)
+        self._check_size(flags, length, reserved)
+        data: Union[bytes, bytearray]
+        if not flags & _FLAG_COMPRESSED:
+            data = header + await reader.readexactly(length)
+        else:
+            data = bytearray(len(header) + reserved)
+            data[:len(header)] = _pack_header(flags & ~_FLAG_COMPRESSED, reserved, 0)
+            inflater = _Inflater(memoryview(data)[len(header):])
+            remaining = length
+            while remaining:
+                chunk = await reader.read(min(self._buffer_size, remaining))
+                if not chunk:
+                    raise struct.error(f"Connection closed after {length - remaining} of {length} bytes")
+                remaining -= len(chunk)
+                inflater.feed(chunk)
+            inflater.finish()
+        logger.debug(f"Completed data retrieval from {self._ip}:{self._port}. Total length: {len(data)}")
+        return data
+
+
+class _ResponseTimeout(socket.timeout):
+    """
+    Timeout while waiting for the response to a request that was sent.
+    """
+
+
+class _Inflater:
+    """
+    Decompresses zlib data fed in chunks straight into a preallocated buffer
+    of the declared uncompressed size.
+    """
+    __slots__ = ['_decompressor', '_out', '_position']
+
+    def __init__(self, out: memoryview) -> None:
+        self._decompressor = zlib.decompressobj()
+        self._out = out
+        self._position = 0
+
+    def feed(self, chunk: Union[bytes, memoryview]) -> None:
+        # Asking for one byte more than fits detects oversized data
+        space = len(self._out) - self._position
+        try:
+            piece = self._decompressor.decompress(chunk, space + 1)
+        except zlib.error as e:
+            raise struct.error(f"Cannot decompress response: {e}") from e
+        if len(piece) > space:
+            raise struct.error(f"Decompressed data exceeds declared length of {len(self._out)} bytes")
+        self._out[self._position:self._position + len(piece)] = piece
+        self._position += len(piece)
+
+    def finish(self) -> None:
+        if not self._decompressor.eof or self._position != len(self._out):
+            raise struct.error(f"Expected {len(self._out)} bytes after decompression, got {self._position}")
+
+
+def _header_struct(flags: int) -> struct.Struct:
+    return _LARGE_HEADER if flags & _FLAG_LARGE else _HEADER
+
+
+def _pack_header(flags: int, length: int, reserved: int) -> bytes:
+    return _header_struct(flags).pack(b'ZBXD', flags, length, reserved)
+
+
+async def _read_request(reader: asyncio.StreamReader, max_size: int = _MAX_RECV_SIZE,
+                        max_large_size: int = _MAX_RECV_LARGE_SIZE) -> Tuple[bytes, bool, int]:
+    """
+    Read a request sent to a server or a passive agent, either framed
+    or a plain item key terminated by newline.
+    Returns the decompressed payload, whether it was compressed and
+    the number of bytes read. Frames declaring more than max_size bytes,
+    or max_large_size for large packets, compressed or not, are rejected
+    with struct.error before they are read.
+    """
+    # Plain keys may be shorter than a header, read only as much as needed to tell them apart
+    prefix = b''
+    while len(prefix) < 4 and b'ZBXD'.startswith(prefix):
+        prefix += await reader.readexactly(1)
+    if prefix != b'ZBXD':
+        line = prefix if prefix.endswith(b'\n') else prefix + await reader.readline()
+        return line.rstrip(b'\r\n'), False, len(line)
+    header = prefix + await reader.readexactly(_HEADER.size - len(prefix))
+    flags = header[4]
+    if flags & _FLAG_LARGE:
+        header += await reader.readexactly(_LARGE_HEADER.size - _HEADER.size)
+    _, _, length, reserved = _header_struct(flags).unpack(header)
+    limit = max_large_size if flags & _FLAG_LARGE else max_size
+    if max(length, reserved) > limit:
+        raise struct.error(f"Request of {max(length, reserved)} bytes exceeds limit of {limit} bytes")
+    data = await reader.readexactly(length)
+    if not flags & _FLAG_COMPRESSED:
+        return data, False, len(header) + length
+    inflated = bytearray(reserved)
+    inflater = _Inflater(memoryview(inflated))
+    inflater.feed(data)
+    inflater.finish()
+    return bytes(inflated), True, len(header) + length
+
+
+def _frame(payload: bytes, compress: bool = False) -> bytes:
+    flags, reserved = _FLAG_ZBXD, 0
+    if compress:
+        payload, flags, reserved = zlib.compress(payload), _FLAG_ZBXD | _FLAG_COMPRESSED, len(payload)
+    return _pack_header(flags, len(payload), reserved) + payload
+
+
+def _all_tasks(loop: asyncio.AbstractEventLoop) -> set:
+    # asyncio.all_tasks is not available before Python 3.7
+    all_tasks = getattr(asyncio, 'all_tasks', None) or getattr(asyncio.Task, 'all_tasks')
+    return all_tasks(loop)
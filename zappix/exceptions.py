@@ -0,0 +1,80 @@
+"""
+Module containing exceptions raised by zappix clients.
+"""
+
+from typing import List, Optional
+
+
+class ZappixError(Exception):
+    """
+    Base class of errors raised by zappix.
+    """
+
+
+class ZappixConnectionError(ZappixError, OSError):
+    """
+    Peer could not be reached or closed the connection before answering.
+
+    Parameters
+    ----------
+    :message:
+        Description of the error.
+    :address:
+        (host, port) tuple of the peer.
+    :sent:
+        Whether the request was sent before the error. The peer may have
+        processed it, so it must not be sent again elsewhere.
+    """
+
+    def __init__(self, message: str, address: Optional[tuple] = None, sent: bool = False) -> None:
+        super().__init__(message)
+        self.address = address
+        self.sent = sent
+
+
+class ZappixTimeout(ZappixConnectionError, TimeoutError):
+    """
+    Peer did not connect or answer in time.
+
+    Parameters
+    ----------
+    :message:
+        Description of the error.
+    :address:
+        (host, port) tuple of the peer.
+    :sent:
+        Whether the request was sent before the error. The peer may have
+        processed it, so it must not be sent again elsewhere.
+    """
+
+
+class ZappixProtocolError(ZappixError, ValueError):
+    """
+    Peer answered with data that is not a valid Zabbix protocol message.
+
+    Parameters
+    ----------
+    :message:
+        Description of the error.
+    :address:
+        (host, port) tuple of the peer.
+    """
+
+    def __init__(self, message: str, address: Optional[tuple] = None) -> None:
+        super().__init__(message)
+        self.address = address
+
+
+class NoServerAvailable(ZappixConnectionError):
+    """
+    None of the servers of a ServerList could be reached.
+
+    Parameters
+    ----------
+    :errors:
+        Errors of all attempts, oldest first.
+    """
+
+    def __init__(self, errors: List[ZappixConnectionError]) -> None:
+        super().__init__(f"No server available after {len(errors)} attempts: {errors[-1] if errors else ''}")
+        self.errors = errors
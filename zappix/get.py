@@ -2,12 +2,17 @@
 Python implementation of Zabbix get.
 """
 
-from typing import List, Dict, Optional
-from zappix.dstream import _Dstream
+from typing import List, Dict, Optional, Iterable, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from zappix.dstream import _Dstream, _AsyncDstream
+from zappix.exceptions import ZappixError
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+Value = Union[str, ZappixError]
+
 
 class Get(_Dstream):
     """
@@ -21,15 +26,15 @@ class Get(_Dstream):
         Port on which the Zabbix Agent listens.
     :source_address:
         Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
     """
 
-    def __init__(self, host: str, port: int = 10050, source_address: Optional[str] = None) -> None:
-        super().__init__(host, port, source_address)
+    def __init__(self, host: str, port: int = 10050, source_address: Optional[str] = None, **kwargs) -> None:
+        super().__init__(host, port, source_address, **kwargs)
 
     def _pack_key(self, key: str) -> bytes:
-        _key = f"{key}\n".encode('utf-8')
-        logging.info(f"Getting {key} from {self._ip}:{self._port}")
-        return _key
+        return _pack_key(key, self._ip, self._port)
 
     def get_value(self, key: str) -> str:
         """
@@ -50,15 +55,22 @@ class Get(_Dstream):
             self._pack_key(key)
             )
 
-    def get_report(self, keys: List[str]) -> Dict[str, str]:
+    def get_report(self, keys: List[str], concurrency: int = 1,
+                   return_exceptions: bool = False) -> Dict[str, Value]:
         """
         Get value of a item identified by keys provided in supplied iterable.
-        Note that there are executed synchronously, so the performance might not be ideal.
+        By default keys are requested one after another. Set concurrency
+        to request up to that many keys in parallel.
 
         Parameters
         ----------
         :keys:
             Iterable containing string representing item keys.
+        :concurrency:
+            Maximum number of simultaneous requests.
+        :return_exceptions:
+            Return ZappixError instances, e.g. ZappixTimeout, as values
+            of keys that could not be retrieved instead of empty strings.
 
         Return
         ------
@@ -66,8 +78,193 @@ class Get(_Dstream):
             Dict containing keys with corresponding values.
         """
 
-        report = {key: self._send(self._pack_key(key)) for key in keys}
-        return report
+        if concurrency <= 1:
+            report = {key: self._get(key, return_exceptions) for key in keys}
+            return report
+
+        keys = list(keys)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            values = executor.map(lambda key: self._get(key, return_exceptions), keys)
+            return dict(zip(keys, values))
+
+    def _get(self, key: str, return_exceptions: bool = False) -> Value:
+        if not return_exceptions:
+            return self._send(self._pack_key(key))
+        try:
+            return self._send_or_raise(self._pack_key(key))
+        except ZappixError as e:
+            return e
+
+
+class AsyncGet(_AsyncDstream):
+    """
+    Asyncio counterpart of Get.
+
+    Parameters
+    ----------
+    :host:
+        IP address of target host.
+    :port:
+        Port on which the Zabbix Agent listens.
+    :source_address:
+        Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+    """
+
+    def __init__(self, host: str, port: int = 10050, source_address: Optional[str] = None, **kwargs) -> None:
+        super().__init__(host, port, source_address, **kwargs)
+
+    def _pack_key(self, key: str) -> bytes:
+        return _pack_key(key, self._ip, self._port)
+
+    async def get_value(self, key: str) -> str:
+        """
+        Get value of a single item identified by key.
+
+        Parameters
+        ----------
+        :key:
+            String representing an item key.
+
+        Returns
+        -------
+        string
+            Value of item.
+        """
+
+        return await self._send(
+            self._pack_key(key)
+            )
+
+    async def get_report(self, keys: List[str], concurrency: Optional[int] = None,
+                         return_exceptions: bool = False) -> Dict[str, Value]:
+        """
+        Get value of a item identified by keys provided in supplied iterable.
+        Keys are requested concurrently, each over its own connection.
+
+        Parameters
+        ----------
+        :keys:
+            Iterable containing string representing item keys.
+        :concurrency:
+            Maximum number of simultaneous requests. Unlimited by default.
+        :return_exceptions:
+            Return ZappixError instances, e.g. ZappixTimeout, as values
+            of keys that could not be retrieved instead of empty strings.
+
+        Return
+        ------
+        dict
+            Dict containing keys with corresponding values.
+        """
+
+        keys = list(keys)
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        values = await asyncio.gather(*(self._get_limited(key, semaphore, return_exceptions) for key in keys))
+        return dict(zip(keys, values))
+
+    async def _get_limited(self, key: str, semaphore: Optional[asyncio.Semaphore],
+                           return_exceptions: bool = False) -> Value:
+        if semaphore is None:
+            return await self._get(key, return_exceptions)
+        async with semaphore:
+            return await self._get(key, return_exceptions)
+
+    async def _get(self, key: str, return_exceptions: bool = False) -> Value:
+        if not return_exceptions:
+            return await self._send(self._pack_key(key))
+        try:
+            return await self._send_or_raise(self._pack_key(key))
+        except ZappixError as e:
+            return e
+
+
+def get_reports(targets: Iterable[Tuple[str, int, List[str]]], concurrency: int = 64,
+                source_address: Optional[str] = None, return_exceptions: bool = False,
+                **kwargs) -> Dict[Tuple[str, int], Dict[str, Value]]:
+    """
+    Get reports from many agents at once.
+    Requests for all keys of all agents share one pool of workers.
+    Set timeout or deadline, so unresponsive agents do not hold up the others.
+
+    Parameters
+    ----------
+    :targets:
+        Iterable of (host, port, keys) tuples.
+    :concurrency:
+        Maximum number of simultaneous requests across all agents.
+    :source_address:
+        Source IP address.
+    :return_exceptions:
+        Return ZappixError instances, e.g. ZappixTimeout for slow agents,
+        as values of keys that could not be retrieved.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+
+    Returns
+    -------
+    dict
+        Dict mapping (host, port) to a report as returned by Get.get_report.
+    """
+    jobs: List[Tuple[Get, Dict[str, Value], str]] = []
+    reports: Dict[Tuple[str, int], Dict[str, Value]] = {}
+    for host, port, keys in targets:
+        getter = Get(host, port, source_address, **kwargs)
+        report = reports.setdefault((host, port), {})
+        jobs.extend((getter, report, key) for key in keys)
+
+    def fetch(job):
+        getter, report, key = job
+        report[key] = getter._get(key, return_exceptions)
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        list(executor.map(fetch, jobs))
+    return reports
+
+
+async def async_get_reports(targets: Iterable[Tuple[str, int, List[str]]], concurrency: Optional[int] = None,
+                            source_address: Optional[str] = None, return_exceptions: bool = False,
+                            **kwargs) -> Dict[Tuple[str, int], Dict[str, Value]]:
+    """
+    Asyncio counterpart of get_reports.
+
+    Parameters
+    ----------
+    :targets:
+        Iterable of (host, port, keys) tuples.
+    :concurrency:
+        Maximum number of simultaneous requests across all agents. Unlimited by default.
+    :source_address:
+        Source IP address.
+    :return_exceptions:
+        Return ZappixError instances, e.g. ZappixTimeout for slow agents,
+        as values of keys that could not be retrieved.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+
+    Returns
+    -------
+    dict
+        Dict mapping (host, port) to a report as returned by AsyncGet.get_report.
+    """
+    semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+    targets = list(targets)
+    getters = [AsyncGet(host, port, source_address, **kwargs) for host, port, _ in targets]
+
+    async def report(getter: AsyncGet, keys: List[str]) -> Dict[str, Value]:
+        keys = list(keys)
+        values = await asyncio.gather(*(getter._get_limited(key, semaphore, return_exceptions) for key in keys))
+        return dict(zip(keys, values))
+
+    results = await asyncio.gather(*(report(getter, keys) for getter, (_, _, keys) in zip(getters, targets)))
+    return {(host, port): result for (host, port, _), result in zip(targets, results)}
+
+
+def _pack_key(key: str, ip: str, port: int) -> bytes:
+    _key = f"{key}\n".encode('utf-8')
+    logger.info(f"Getting {key} from {ip}:{port}")
+    return _key
 
 
 if __name__ == '__main__':
@@ -77,12 +274,13 @@ if __name__ == '__main__':
     params.add_argument('-p', '--port', nargs='?', default=10050, type=int)
     params.add_argument('-I', '--source-address', nargs='?')
     params.add_argument('-k', '--key', nargs='?')
+    params.add_argument('-t', '--timeout', nargs='?', default=30, type=float, help='Timeout in seconds')
     args = params.parse_args()
 
     if args.source_address:
-        zab = Get(args.host, args.port, args.source_address)
+        zab = Get(args.host, args.port, args.source_address, timeout=args.timeout)
     else:
-        zab = Get(args.host, args.port)
+        zab = Get(args.host, args.port, timeout=args.timeout)
 
     result = zab.get_value(args.key)
     print(result)
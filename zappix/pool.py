@@ -0,0 +1,174 @@
+"""
+Module containing a pool of persistent connections to Zabbix components.
+"""
+
+from typing import Dict, List, Optional, Tuple, Any
+import socket
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_Target = Tuple[str, int, Optional[str]]
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of TCP connections shared by clients.
+    Idle connections are checked before reuse and replaced transparently
+    when the peer has closed them. Resolved addresses are cached as well,
+    so repeated connections skip name resolution.
+
+    Parameters
+    ----------
+    :max_size:
+        Maximum number of idle connections kept per target.
+    :idle_timeout:
+        Seconds after which an idle connection is closed instead of reused.
+    :dns_ttl:
+        Seconds for which resolved addresses are cached.
+    """
+
+    def __init__(self, max_size: int = 8, idle_timeout: float = 30.0, dns_ttl: float = 60.0) -> None:
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._dns_ttl = dns_ttl
+        self._idle: Dict[_Target, List[Tuple[socket.socket, float]]] = {}
+        self._addresses: Dict[Tuple[str, int], Tuple[float, List[Tuple[Any, ...]]]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str, port: int, source_address: Optional[str] = None,
+                timeout: Optional[float] = None) -> Tuple[socket.socket, bool]:
+        """
+        Get a connection to target, reusing an idle one if it is still healthy.
+
+        Parameters
+        ----------
+        :host:
+            Address of the peer.
+        :port:
+            Port on which the peer listens.
+        :source_address:
+            Source IP address.
+        :timeout:
+            Seconds to wait for a new connection.
+
+        Returns
+        -------
+        tuple
+            Connected socket and a flag telling whether it was reused.
+        """
+        target = (host, port, source_address)
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get(target)
+                if not idle:
+                    break
+                sock, released = idle.pop()
+            if now - released < self._idle_timeout and self._is_healthy(sock):
+                logger.debug(f"Reusing connection to {host}:{port}")
+                return sock, True
+            logger.debug(f"Dropping stale connection to {host}:{port}")
+            sock.close()
+        return self.connect(host, port, source_address, timeout), False
+
+    def connect(self, host: str, port: int, source_address: Optional[str] = None,
+                timeout: Optional[float] = None) -> socket.socket:
+        """
+        Open a new connection to target using cached name resolution.
+
+        Parameters
+        ----------
+        :host:
+            Address of the peer.
+        :port:
+            Port on which the peer listens.
+        :source_address:
+            Source IP address.
+        :timeout:
+            Seconds to wait for the connection.
+
+        Returns
+        -------
+        socket
+            Connected socket.
+        """
+        error: Optional[OSError] = None
+        for family, type_, proto, _, address in self._resolve(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, type_, proto)
+                if timeout is not None:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind((source_address, 0))
+                sock.connect(address)
+                logger.info(f"Opening pooled connection to {host}:{port}")
+                return sock
+            except OSError as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+        with self._lock:
+            self._addresses.pop((host, port), None)
+        raise error if error else OSError(f"Cannot resolve {host}")
+
+    def release(self, sock: socket.socket, host: str, port: int, source_address: Optional[str] = None) -> None:
+        """
+        Return a connection to the pool after a completed exchange.
+
+        Parameters
+        ----------
+        :sock:
+            Socket obtained from acquire.
+        :host:
+            Address of the peer.
+        :port:
+            Port on which the peer listens.
+        :source_address:
+            Source IP address.
+        """
+        with self._lock:
+            idle = self._idle.setdefault((host, port, source_address), [])
+            if len(idle) < self._max_size:
+                idle.append((sock, time.monotonic()))
+                return
+        sock.close()
+
+    def close(self) -> None:
+        """
+        Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for sock, _ in connections:
+                sock.close()
+
+    def _resolve(self, host: str, port: int) -> List[Tuple[Any, ...]]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._addresses.get((host, port))
+        if cached and now - cached[0] < self._dns_ttl:
+            return cached[1]
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        with self._lock:
+            self._addresses[(host, port)] = (now, addresses)
+        return addresses
+
+    @staticmethod
+    def _is_healthy(sock: socket.socket) -> bool:
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            # An idle connection has nothing to read: data means EOF or garbage
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(timeout)
+        return False
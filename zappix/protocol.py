@@ -2,12 +2,28 @@
 Module containing models for Zabbix protocol.
 """
 
-from typing import List, Any, Optional, Dict, Union
+from typing import List, Any, Optional, Dict, Union, Iterable, Iterator, Tuple
 import abc
 import json
-from ast import literal_eval
+import math
+import re
+from collections.abc import Sequence
+from json.encoder import encode_basestring_ascii
+from array import array
+from itertools import repeat
 from uuid import uuid4
 
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover
+    _orjson = None  # type: ignore
+
+
+_INT, _FLOAT, _OBJECT = 0, 1, 2
+_INT64 = 2 ** 63
+# Info string of a response, unless it contains escaped characters
+_INFO = re.compile(r'"info"\s*:\s*"([^"\\]*)"')
+
 
 class _Model(abc.ABC):
     __slots__: List[str] = []
@@ -108,6 +124,9 @@ class _TrapperRequest(_Model, abc.ABC):
         self.ns = kwargs.get('ns')
         self.session = kwargs.get('session')
 
+    def __len__(self) -> int:
+        return len(self.data)
+
     def _check_items_classes(self, items, item_class):
         if not all(self._check_item_class(i, item_class) for i in items):
             raise TypeError
@@ -160,6 +179,42 @@ class SenderDataRequest(_TrapperRequest):
             raise TypeError
         self.data.append(item)
 
+    def split(self, max_items: Optional[int] = None, max_bytes: Optional[int] = None) -> Iterator['SenderDataRequest']:
+        """
+        Split request into smaller requests sharing its clock and ns.
+
+        Parameters
+        ----------
+        :max_items:
+            Maximum number of items in one request.
+        :max_bytes:
+            Maximum size of encoded items of one request in bytes.
+
+        Returns
+        -------
+        iterator
+            SenderDataRequest objects holding consecutive parts of data.
+        """
+        encoder = ModelEncoder()
+        chunk: List[SenderData] = []
+        size = 0
+        for item in self.data:
+            item_size = len(encoder.encode(item)) + 2 if max_bytes else 0
+            if chunk and ((max_items and len(chunk) >= max_items) or (max_bytes and size + item_size > max_bytes)):
+                yield self._chunk(chunk)
+                chunk, size = [], 0
+            chunk.append(item)
+            size += item_size
+        if chunk:
+            yield self._chunk(chunk)
+
+    def _chunk(self, data: List[SenderData]) -> 'SenderDataRequest':
+        chunk = SenderDataRequest()
+        chunk.data = data
+        chunk.clock = self.clock
+        chunk.ns = self.ns
+        return chunk
+
 
 class AgentDataRequest(_TrapperRequest):
     """
@@ -203,6 +258,226 @@ class AgentDataRequest(_TrapperRequest):
         self._item_id += 1
 
 
+class ColumnarSenderDataRequest:
+    """
+    Memory-efficient counterpart of SenderDataRequest for large batches.
+    Hosts and keys are dictionary-encoded, clocks and nanoseconds are kept
+    in arrays and numeric values in typed columns, so no object is
+    created per item. Can be sent with Sender.send_bulk.
+
+    Parameters
+    ----------
+    :data:
+        Optional iterable of SenderData objects to start with.
+    """
+    __slots__ = ['request', 'clock', 'ns', '_hosts', '_host_index', '_keys', '_key_index',
+                 '_host_ids', '_key_ids', '_clocks', '_item_ns', '_types', '_value_ids',
+                 '_ints', '_floats', '_objects']
+
+    def __init__(self, data: Optional[Iterable[SenderData]] = None) -> None:
+        self.request = "sender data"
+        self.clock: Optional[int] = None
+        self.ns: Optional[int] = None
+        self._hosts: List[str] = []
+        self._host_index: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._key_index: Dict[str, int] = {}
+        self._host_ids = array('L')
+        self._key_ids = array('L')
+        self._clocks = array('q')
+        self._item_ns = array('q')
+        self._types = array('B')
+        self._value_ids = array('L')
+        self._ints = array('q')
+        self._floats = array('d')
+        self._objects: List[Any] = []
+        for item in data or []:
+            self.add_item(item)
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def __iter__(self) -> Iterator[SenderData]:
+        for i in range(len(self)):
+            yield SenderData(self._hosts[self._host_ids[i]], self._keys[self._key_ids[i]],
+                             self._value(i), self._clocks[i] or None)
+
+    def add(self, host: str, key: str, value: Any, clock: Optional[int] = None, ns: Optional[int] = None) -> None:
+        """
+        Add a value to request.
+
+        Parameters
+        ----------
+        :host:
+            Hostname to which the item belongs.
+        :key:
+            Item key
+        :value:
+            Value to be sent.
+        :clock:
+            Timestamp at which value was collected.
+        :ns:
+            Nanoseconds for clock.
+        """
+        host_id = self._host_index.get(host)
+        if host_id is None:
+            host_id = self._host_index[host] = len(self._hosts)
+            self._hosts.append(host)
+        key_id = self._key_index.get(key)
+        if key_id is None:
+            key_id = self._key_index[key] = len(self._keys)
+            self._keys.append(key)
+        self._host_ids.append(host_id)
+        self._key_ids.append(key_id)
+        self._clocks.append(clock or 0)
+        self._item_ns.append(ns or 0)
+
+        value_type = type(value)
+        if value_type is int and -_INT64 <= value < _INT64:
+            self._types.append(_INT)
+            self._value_ids.append(len(self._ints))
+            self._ints.append(value)
+        elif value_type is float:
+            self._types.append(_FLOAT)
+            self._value_ids.append(len(self._floats))
+            self._floats.append(value)
+        else:
+            self._types.append(_OBJECT)
+            self._value_ids.append(len(self._objects))
+            self._objects.append(value)
+
+    def add_item(self, item: SenderData) -> None:
+        """
+        Add data to request.
+
+        Parameters
+        ----------
+        :item:
+            Instance of SenderData.
+        """
+        if not isinstance(item, SenderData):
+            raise TypeError
+        self.add(item.host, item.key, item.value, item.clock)
+
+    def split(self, max_items: Optional[int] = None,
+              max_bytes: Optional[int] = None) -> Iterator['ColumnarSenderDataRequest']:
+        """
+        Split request into smaller requests sharing its clock and ns.
+
+        Parameters
+        ----------
+        :max_items:
+            Maximum number of items in one request.
+        :max_bytes:
+            Maximum size of encoded items of one request in bytes.
+
+        Returns
+        -------
+        iterator
+            ColumnarSenderDataRequest objects holding consecutive parts of data.
+        """
+        start = 0
+        size = 0
+        sizes: Iterable[int] = (len(e) + 2 for e in self._encode_items()) if max_bytes else repeat(0, len(self))
+        for i, item_size in enumerate(sizes):
+            if i > start and ((max_items and i - start >= max_items) or (max_bytes and size + item_size > max_bytes)):
+                yield self._slice(start, i)
+                start, size = i, 0
+            size += item_size
+        if start < len(self):
+            yield self._slice(start, len(self))
+
+    def encode(self) -> bytes:
+        """
+        Encode request to JSON in the same format as encode_request.
+
+        Returns
+        -------
+        bytes
+            UTF-8 encoded JSON.
+        """
+        if _orjson is not None:
+            try:
+                return _orjson.dumps(self._request_dict(), default=_orjson_default)
+            except TypeError:
+                pass
+        parts = ['{"request": "sender data"']
+        if len(self):
+            parts.append(', "data": [')
+            parts.append(', '.join(self._encode_items()))
+            parts.append(']')
+        if self.clock:
+            parts.append(f', "clock": {int(self.clock)}')
+        if self.ns:
+            parts.append(f', "ns": {int(self.ns)}')
+        parts.append('}')
+        return ''.join(parts).encode('utf-8')
+
+    def _rows(self) -> Iterator[Tuple[str, str, Any, int, int]]:
+        hosts, keys = self._hosts, self._keys
+        columns = (self._ints.tolist(), self._floats.tolist(), self._objects)
+        for host_id, key_id, value_type, value_id, clock, ns in zip(self._host_ids, self._key_ids, self._types,
+                                                                   self._value_ids, self._clocks, self._item_ns):
+            yield hosts[host_id], keys[key_id], columns[value_type][value_id], clock, ns
+
+    def _request_dict(self) -> Dict[str, Any]:
+        data: List[Dict[str, Any]] = []
+        append = data.append
+        for host, key, value, clock, ns in self._rows():
+            d = {'host': host, 'key': key, 'value': value}
+            if clock:
+                d['clock'] = clock
+                if ns:
+                    d['ns'] = ns
+            append(d)
+        request: Dict[str, Any] = {'request': self.request}
+        if data:
+            request['data'] = data
+        if self.clock:
+            request['clock'] = self.clock
+        if self.ns:
+            request['ns'] = self.ns
+        return request
+
+    def _encode_items(self) -> Iterator[str]:
+        hosts = {host: encode_basestring_ascii(host) for host in self._hosts}
+        keys = {key: encode_basestring_ascii(key) for key in self._keys}
+        for host, key, value, clock, ns in self._rows():
+            value_type = type(value)
+            if value_type is int:
+                encoded_value = int.__repr__(value)
+            elif value_type is str:
+                encoded_value = encode_basestring_ascii(value)
+            else:
+                encoded_value = _encode_value(value)
+            encoded = '{"host": ' + hosts[host] + ', "key": ' + keys[key] + ', "value": ' + encoded_value
+            if clock:
+                encoded += ', "clock": ' + int.__repr__(clock)
+                if ns:
+                    encoded += ', "ns": ' + int.__repr__(ns)
+            yield encoded + '}'
+
+    def _value(self, i: int) -> Any:
+        value_type = self._types[i]
+        if value_type == _INT:
+            return self._ints[self._value_ids[i]]
+        if value_type == _FLOAT:
+            return self._floats[self._value_ids[i]]
+        return self._objects[self._value_ids[i]]
+
+    def _slice(self, start: int, stop: int) -> 'ColumnarSenderDataRequest':
+        return self._select(range(start, stop))
+
+    def _select(self, indices: Iterable[int]) -> 'ColumnarSenderDataRequest':
+        chunk = ColumnarSenderDataRequest()
+        chunk.clock = self.clock
+        chunk.ns = self.ns
+        for i in indices:
+            chunk.add(self._hosts[self._host_ids[i]], self._keys[self._key_ids[i]],
+                      self._value(i), self._clocks[i], self._item_ns[i])
+        return chunk
+
+
 class ActiveItem:
     """
     Zabbix active item configuration.
@@ -217,13 +492,53 @@ class ActiveItem:
         self.mtime = mtime
 
 
+class ActiveItems(Sequence):
+    """
+    Read-only sequence of active checks of a server response in the order
+    sent by the server. ActiveItem objects are built when accessed.
+
+    Parameters
+    ----------
+    :data:
+        List of active check dicts from the response.
+    """
+
+    __slots__ = ['_data', '_items']
+
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        self._data = data
+        self._items: List[Optional[ActiveItem]] = [None] * len(data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = self._items[index]
+        if item is None:
+            check = self._data[index]
+            item = self._items[index] = ActiveItem(check['key'], check['delay'],
+                                                   check.get('lastlogsize', 0), check.get('mtime', 0))
+        return item
+
+    def keys(self) -> List[str]:
+        """
+        Keys of active checks, without building ActiveItem objects.
+        """
+        return [check['key'] for check in self._data]
+
+
 class ServerResponse:
     """
     Class representing server responses.
+    Active checks are available as a lazy view in items,
+    and as a list in data.
     """
     def __init__(self, response: str) -> None:
         self.response = None
-        self.data: List[ActiveItem] = []
+        self.items = ActiveItems([])
+        self._data: Optional[List[ActiveItem]] = None
         self._info: Dict[str, Any] = {}
         self._parse_response(response)
 
@@ -231,21 +546,17 @@ class ServerResponse:
     def info(self) -> Union[Dict[str, Any], None]:
         return self._info if self._info else None
 
+    @property
+    def data(self) -> List[ActiveItem]:
+        if self._data is None:
+            self._data = list(self.items)
+        return self._data
+
     def _parse_data(self, data):
-        while data:
-            item = data.pop()
-            self.data.append(
-                ActiveItem(item['key'],
-                           item['delay'],
-                           item['lastlogsize'],
-                           item['mtime'])
-            )
+        self.items = ActiveItems(data)
 
     def _parse_info(self, info):
-        if not info:
-            return None
-        parts = (part.split(':') for part in info.split(';'))
-        self._info = {k.strip(): literal_eval(v.strip()) for k, v in parts}
+        self._info = _parse_counters(info)
 
     def _parse_response(self, response):
         if response:
@@ -253,3 +564,228 @@ class ServerResponse:
             self.response = loaded['response']
             self._parse_info(loaded.get('info', None))
             self._parse_data(loaded.get('data', []))
+
+
+def parse_info(response: str) -> Union[Dict[str, Any], None]:
+    """
+    Get counters from the info string of a raw server response,
+    e.g. processed and failed, without building a ServerResponse.
+    Equivalent to ServerResponse(response).info.
+
+    Parameters
+    ----------
+    :response:
+        Response of server as returned by the connection.
+
+    Returns
+    -------
+    dict
+        Information from server, None if there is none.
+    """
+    if not response:
+        return None
+    match = _INFO.search(response)
+    info = match.group(1) if match else json.loads(response).get('info')
+    return _parse_counters(info) or None
+
+
+def _parse_counters(info: Optional[str]) -> Dict[str, Any]:
+    counters: Dict[str, Any] = {}
+    if not info:
+        return counters
+    # Failed responses carry free text, e.g. "host [name] not found"
+    for part in info.split(';'):
+        k, sep, v = part.partition(':')
+        if not sep:
+            continue
+        v = v.strip()
+        try:
+            counters[k.strip()] = int(v)
+        except ValueError:
+            try:
+                counters[k.strip()] = float(v)
+            except ValueError:
+                continue
+    return counters
+
+
+def merge_info(infos: Iterable[Union[Dict[str, Any], None]]) -> Union[Dict[str, Any], None]:
+    """
+    Merge info dicts of several server responses into one.
+    Counters and time spent are summed, missing responses are skipped.
+
+    Parameters
+    ----------
+    :infos:
+        Iterable of ServerResponse.info values.
+
+    Returns
+    -------
+    dict
+        Combined information, None if no response carried any.
+    """
+    merged: Dict[str, Any] = {}
+    for info in infos:
+        if not info:
+            continue
+        for k, v in info.items():
+            merged[k] = merged.get(k, 0) + v
+    if isinstance(merged.get('seconds spent'), float):
+        merged['seconds spent'] = round(merged['seconds spent'], 6)
+    return merged if merged else None
+
+
+def encode_request(request: Union[_TrapperRequest, ColumnarSenderDataRequest]) -> bytes:
+    """
+    Encode a request to JSON bytes.
+    Produces the same document as json.dumps with ModelEncoder, but
+    encodes items directly instead of going through a dict per item.
+    orjson is used when it is installed.
+
+    Parameters
+    ----------
+    :request:
+        Request to encode.
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON.
+    """
+    if isinstance(request, ColumnarSenderDataRequest):
+        return request.encode()
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(_request_dict(request), default=_orjson_default)
+        except TypeError:
+            pass
+    return _encode_request(request).encode('utf-8')
+
+
+def encode_json(document: Dict[str, Any]) -> bytes:
+    """
+    Encode a JSON document made of plain Python types to bytes,
+    with orjson when it is installed.
+
+    Parameters
+    ----------
+    :document:
+        Dict to encode, e.g. a request received from another client.
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON.
+    """
+    if _orjson is not None:
+        return _orjson.dumps(document)
+    return json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+
+_REQUEST_FIELDS = ['host', 'clock', 'ns', 'session']
+_AGENT_FIELDS = ['ns', 'id', 'state']
+
+
+def _orjson_default(o: Any) -> Any:
+    if isinstance(o, _Model):
+        return ModelEncoder().default(o)
+    raise TypeError
+
+
+def _request_dict(request: _TrapperRequest) -> Dict[str, Any]:
+    d: Dict[str, Any] = {'request': request.request}
+    if request.data:
+        d['data'] = _items_dicts(request.data)
+    for field in _REQUEST_FIELDS:
+        value = getattr(request, field)
+        if value:
+            d[field] = value
+    return d
+
+
+def _items_dicts(items: List[ItemData]) -> List[Any]:
+    data: List[Any] = []
+    append = data.append
+    for item in items:
+        if type(item) is not ItemData and type(item) is not AgentData:
+            append(ModelEncoder().default(item))
+            continue
+        d: Dict[str, Any] = {}
+        if item.host:
+            d['host'] = item.host
+        if item.key:
+            d['key'] = item.key
+        if item.value:
+            d['value'] = item.value
+        if item.clock:
+            d['clock'] = item.clock
+        if type(item) is AgentData:
+            for field in _AGENT_FIELDS:
+                value = getattr(item, field)
+                if value:
+                    d[field] = value
+        append(d)
+    return data
+
+
+def _encode_request(request: _TrapperRequest) -> str:
+    parts = ['{"request": ', encode_basestring_ascii(request.request)]
+    if request.data:
+        parts.append(', "data": [')
+        parts.append(_encode_items(request.data))
+        parts.append(']')
+    for field in _REQUEST_FIELDS:
+        value = getattr(request, field)
+        if value:
+            parts.append(f', "{field}": ')
+            parts.append(_encode_value(value))
+    parts.append('}')
+    return ''.join(parts)
+
+
+def _encode_items(items: List[ItemData]) -> str:
+    # Host and key pairs repeat a lot within a batch, escape each pair only once
+    prefixes: Dict[Any, str] = {}
+    encoded: List[str] = []
+    append = encoded.append
+    for item in items:
+        item_type = type(item)
+        if item_type is not ItemData and item_type is not AgentData:
+            append(json.dumps(item, cls=ModelEncoder))
+            continue
+        pair = (item.host, item.key)
+        prefix = prefixes.get(pair)
+        if prefix is None:
+            prefix = prefixes[pair] = ', '.join(
+                f'"{field}": {_encode_value(value)}' for field, value in zip(('host', 'key'), pair) if value
+            )
+        fields = [prefix] if prefix else []
+        value = item.value
+        if value:
+            value_type = type(value)
+            if value_type is str:
+                fields.append('"value": ' + encode_basestring_ascii(value))
+            elif value_type is int:
+                fields.append('"value": ' + int.__repr__(value))
+            else:
+                fields.append('"value": ' + _encode_value(value))
+        if item.clock:
+            fields.append('"clock": ' + _encode_value(item.clock))
+        if item_type is AgentData:
+            for field in _AGENT_FIELDS:
+                value = getattr(item, field)
+                if value:
+                    fields.append(f'"{field}": ' + _encode_value(value))
+        append('{' + ', '.join(fields) + '}')
+    return ', '.join(encoded)
+
+
+def _encode_value(value: Any) -> str:
+    t = type(value)
+    if t is str:
+        return encode_basestring_ascii(value)
+    if t is int:
+        return int.__repr__(value)
+    if t is float and math.isfinite(value):
+        return float.__repr__(value)
+    return json.dumps(value, cls=ModelEncoder)
@@ -0,0 +1,334 @@
+"""
+Local relay merging sender data of many clients into few upstream requests.
+"""
+
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from zappix.dstream import _all_tasks, _read_request, _frame
+from zappix.exceptions import ZappixConnectionError, ZappixError
+from zappix.protocol import encode_json
+from zappix.sender import Sender
+import asyncio
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TrapperRelay:
+    """
+    Server accepting "sender data" requests, e.g. of Sender instances of
+    short-lived jobs, and forwarding their items upstream in large batches.
+    Clients are answered as soon as their items are queued, with info
+    in the format of Zabbix server. Items of malformed entries are reported
+    as failed, everything else as processed.
+
+    Item clocks are corrected by the difference between the request clock
+    and the relay clock, and items without a clock get the time at which
+    they were received, so values keep their timestamps however long they wait.
+
+    Batches are sent with the given Sender, which should use a ConnectionPool,
+    so upstream connections are reused. Batches that could not be delivered
+    are retried after max_delay, or stored in the disk buffer of the sender
+    if it has one. Batches rejected by upstream, answered with an invalid
+    response or not answered in time, are counted as failed and dropped. Clients are answered with
+    a failed response while queue_size items are waiting.
+
+    Parameters
+    ----------
+    :sender:
+        Sender delivering batches upstream.
+    :host:
+        Address to listen on.
+    :port:
+        Port to listen on, 0 picks a free one.
+    :batch_items:
+        Maximum number of items in one upstream request.
+    :max_delay:
+        Maximum number of seconds an item waits for a batch to fill.
+    :queue_size:
+        Maximum number of items waiting to be forwarded.
+    :workers:
+        Number of batches sent in parallel.
+    :timeout:
+        Number of seconds an idle client connection is kept open.
+    """
+
+    def __init__(self, sender: Sender, host: str = '127.0.0.1', port: int = 10051, batch_items: int = 1000,
+                 max_delay: float = 1.0, queue_size: int = 100000, workers: int = 1, timeout: float = 30.0) -> None:
+        self._sender = sender
+        self.host = host
+        self.port = port
+        self._batch_items = batch_items
+        self._max_delay = max_delay
+        self._queue_size = queue_size
+        self._timeout = timeout
+        # Received items with the time at which they were queued, oldest first
+        self._pending: Deque[Tuple[float, List[Dict[str, Any]]]] = deque()
+        self._queued = 0
+        self._ready = threading.Condition()
+        self._stopping = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._workers = [threading.Thread(target=self._run, name='zappix-relay-worker', daemon=True)
+                         for _ in range(workers)]
+        self.connections = 0
+        self.requests = 0
+        self.items = 0
+        self.rejected = 0
+        self.batches = 0
+        self.forwarded = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get relay counters.
+
+        Returns
+        -------
+        dict
+            Client connections and requests, items accepted and rejected,
+            upstream batches, items forwarded, reported failed by upstream
+            and dropped, and items waiting.
+        """
+        return {
+            'connections': self.connections,
+            'requests': self.requests,
+            'items': self.items,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'forwarded': self.forwarded,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'queued': self._queued,
+        }
+
+    def start(self) -> 'TrapperRelay':
+        """
+        Start listening and forwarding in background threads.
+
+        Returns
+        -------
+        TrapperRelay
+            The relay itself, with port set to the listening port.
+        """
+        started = threading.Event()
+        errors: List[BaseException] = []
+        loop = self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            try:
+                server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+                self.port = server.sockets[0].getsockname()[1]
+            except BaseException as e:
+                errors.append(e)
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            tasks = _all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name='zappix-relay', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            # Binding failed, e.g. the port is in use
+            self._thread.join()
+            self._thread = self._loop = None
+            raise errors[0]
+        for worker in self._workers:
+            worker.start()
+        logger.info(f"Relay listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop accepting data, forward queued items and wait for background threads.
+        Items that cannot be delivered at this point are dropped.
+        """
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+        with self._ready:
+            self._stopping = True
+            self._ready.notify_all()
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.join()
+
+    def __enter__(self) -> 'TrapperRelay':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            # Pooled clients send further requests over the same connection
+            while True:
+                try:
+                    payload, compressed, _ = await asyncio.wait_for(_read_request(reader), self._timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                self.requests += 1
+                writer.write(_frame(self._accept(payload).encode('utf-8'), compressed))
+                await writer.drain()
+        except Exception:
+            logger.exception("Relay failed to handle request")
+        finally:
+            writer.close()
+
+    def _accept(self, payload: bytes) -> str:
+        start = time.perf_counter()
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict) or request.get('request') != 'sender data':
+            kind = request.get('request') if isinstance(request, dict) else None
+            return _failed(f"unsupported request \"{kind}\"")
+        items = request.get('data')
+        if not isinstance(items, list):
+            return _failed("cannot parse data")
+
+        now = time.time()
+        clock = request.get('clock')
+        offset = int(now) - clock if isinstance(clock, int) else 0
+        accepted = []
+        for item in items:
+            if not isinstance(item, dict) or 'host' not in item or 'key' not in item:
+                continue
+            if isinstance(item.get('clock'), int):
+                item['clock'] += offset
+            else:
+                item['clock'], item['ns'] = int(now), int(now % 1 * 1e9)
+            accepted.append(item)
+
+        with self._ready:
+            if self._stopping or self._queued + len(accepted) > self._queue_size:
+                self.rejected += len(accepted)
+                return _failed("relay queue is full")
+            if accepted:
+                self._pending.append((time.monotonic(), accepted))
+                self._queued += len(accepted)
+                self.items += len(accepted)
+                # Workers sleep until a batch is full or the oldest item is due
+                if self._queued >= self._batch_items or len(self._pending) == 1:
+                    self._ready.notify()
+        failed = len(items) - len(accepted)
+        return _success(len(accepted), failed, time.perf_counter() - start)
+
+    def _run(self) -> None:
+        while True:
+            with self._ready:
+                while not self._due():
+                    if self._stopping and not self._pending:
+                        return
+                    self._ready.wait(self._max_delay if not self._pending else
+                                     max(self._pending[0][0] + self._max_delay - time.monotonic(), 0))
+                batch, received = self._take()
+            if not self._forward(batch):
+                self._retry(batch, received)
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        return (self._stopping or self._queued >= self._batch_items
+                or self._pending[0][0] + self._max_delay <= time.monotonic())
+
+    def _take(self) -> Tuple[List[Dict[str, Any]], float]:
+        batch: List[Dict[str, Any]] = []
+        received = self._pending[0][0]
+        while self._pending and len(batch) < self._batch_items:
+            queued, items = self._pending.popleft()
+            room = self._batch_items - len(batch)
+            if len(items) > room:
+                self._pending.appendleft((queued, items[room:]))
+                items = items[:room]
+            batch.extend(items)
+        self._queued -= len(batch)
+        return batch, received
+
+    def _forward(self, batch: List[Dict[str, Any]]) -> bool:
+        now = time.time()
+        payload = encode_json({'request': 'sender data', 'data': batch, 'clock': int(now), 'ns': int(now % 1 * 1e9)})
+        self.batches += 1
+        try:
+            info, buffered = self._sender.send_payload(payload)
+        except ZappixConnectionError as e:
+            if not e.sent:
+                logger.warning(f"Could not forward {len(batch)} items: {e}")
+                return False
+            # Upstream may have processed the batch, forwarding it again could duplicate it
+            info, buffered = None, False
+            logger.error(f"No response from upstream for {len(batch)} items: {e}")
+        except ZappixError as e:
+            info, buffered = None, False
+            logger.error(f"Upstream failed to process {len(batch)} items: {e}")
+        if buffered:
+            # Sender with a disk buffer took care of the batch
+            return True
+        if info is None or 'processed' not in info:
+            # Sending the same batch again would be rejected the same way
+            logger.error(f"Dropping {len(batch)} items rejected by upstream: {info}")
+            self.failed += len(batch)
+            return True
+        self.forwarded += info.get('processed', 0)
+        self.failed += info.get('failed', 0)
+        return True
+
+    def _retry(self, batch: List[Dict[str, Any]], received: float) -> None:
+        with self._ready:
+            if self._stopping:
+                logger.error(f"Dropping {len(batch)} items that could not be forwarded")
+                self.dropped += len(batch)
+                return
+            self._pending.appendleft((received, batch))
+            self._queued += len(batch)
+            # Give upstream time to recover
+            self._ready.wait(self._max_delay)
+
+
+def _success(processed: int, failed: int, spent: float) -> str:
+    info = f"processed: {processed}; failed: {failed}; total: {processed + failed}; seconds spent: {spent:.6f}"
+    return json.dumps({'response': 'success', 'info': info})
+
+
+def _failed(info: str) -> str:
+    return json.dumps({'response': 'failed', 'info': info})
+
+
+if __name__ == '__main__':
+    import argparse
+    from zappix.pool import ConnectionPool
+    params = argparse.ArgumentParser()
+    params.add_argument('-z', '--server', nargs='?', required=True, help='Upstream Zabbix server or proxy')
+    params.add_argument('-p', '--port', nargs='?', default=10051, type=int, help='Upstream port')
+    params.add_argument('-l', '--listen', nargs='?', default='127.0.0.1')
+    params.add_argument('-P', '--listen-port', nargs='?', default=10051, type=int)
+    params.add_argument('-b', '--batch-items', nargs='?', default=1000, type=int)
+    params.add_argument('-d', '--max-delay', nargs='?', default=1.0, type=float, help='Seconds before a batch is sent')
+    args = params.parse_args()
+
+    upstream = Sender(args.server, args.port, pool=ConnectionPool())
+    with TrapperRelay(upstream, args.listen, args.listen_port, args.batch_items, args.max_delay) as relay:
+        print(f"Relaying {relay.host}:{relay.port} to {args.server}:{args.port}")
+        try:
+            while True:
+                time.sleep(5)
+                print(relay.stats())
+        except KeyboardInterrupt:
+            pass
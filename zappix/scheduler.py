@@ -0,0 +1,351 @@
+"""
+Scheduler running active checks the way Zabbix agent does.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zappix.agent_active import AgentActive, ActiveChecksDiff
+from zappix.protocol import ActiveItem, AgentData, AgentDataRequest
+import copy
+import heapq
+import itertools
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+Collector = Callable[[str], Any]
+
+_UNSUPPORTED = 1
+_DELAY_SUFFIXES = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_DELAY_PATTERN = re.compile(r'^\s*(\d+)([smhdw]?)\s*$')
+
+
+class ActiveScheduler:
+    """
+    Runs registered collectors for active items of a host on their update
+    intervals and sends the results to Zabbix in batches, like the agent's
+    BufferSend and BufferSize settings. Schedules are kept in a heap, so a
+    single scheduler can handle tens of thousands of items. When started,
+    values are sent from a thread of their own, so a slow server does not
+    delay collection.
+
+    Collectors are callables taking the full item key and returning the value.
+    They are looked up by exact key first and then by key name, i.e. the part
+    before "[". Items without a collector, or whose collector raises, are
+    reported as unsupported.
+
+    Parameters
+    ----------
+    :agent:
+        AgentActive used to fetch configuration and send data.
+    :buffer_send:
+        Maximum number of seconds values are held before sending.
+    :buffer_size:
+        Maximum number of values held before sending.
+    :refresh_interval:
+        Number of seconds between active check configuration refreshes.
+    """
+
+    def __init__(self, agent: AgentActive, buffer_send: float = 5, buffer_size: int = 100,
+                 refresh_interval: float = 120) -> None:
+        self._agent = agent
+        self._buffer_send = buffer_send
+        self._buffer_size = buffer_size
+        self._refresh_interval = refresh_interval
+        self._collectors: Dict[str, Collector] = {}
+        self._items: Dict[str, Tuple[ActiveItem, int, int]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._session = AgentDataRequest()
+        self._first_value = 0.0
+        self._next_send = 0.0
+        self._next_refresh = 0.0
+        self._lock = threading.RLock()
+        # Serializes sends, which run without holding _lock
+        self._send_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._send_wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._send_thread: Optional[threading.Thread] = None
+
+    def register(self, key: str, collector: Optional[Collector] = None) -> Any:
+        """
+        Register collector for an item key or key name.
+        Can be used as a decorator when collector is omitted.
+
+        Parameters
+        ----------
+        :key:
+            Item key, e.g. "app.users[active]", or key name, e.g. "app.users".
+        :collector:
+            Callable taking the item key and returning its value.
+        """
+        if collector is None:
+            def wrap_function(func: Collector) -> Collector:
+                self.register(key, func)
+                return func
+            return wrap_function
+        self._collectors[key] = collector
+        return collector
+
+    def schedule(self, items: List[ActiveItem], now: Optional[float] = None) -> None:
+        """
+        Replace scheduled items. All items are due immediately.
+
+        Parameters
+        ----------
+        :items:
+            List of ActiveItem objects.
+        :now:
+            Monotonic time to schedule from, defaults to time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._items = {}
+            self._heap = []
+            for item in items:
+                self._add(item, now)
+        self._wakeup.set()
+
+    def update(self, diff: ActiveChecksDiff, now: Optional[float] = None) -> None:
+        """
+        Apply configuration changes without restarting unaffected schedules.
+        Added items are due immediately, items with a changed delay are due
+        after the new delay.
+
+        Parameters
+        ----------
+        :diff:
+            ActiveChecksDiff returned by AgentActive.refresh_active_checks.
+        :now:
+            Monotonic time to schedule from, defaults to time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for key in diff.removed:
+                self._items.pop(key, None)
+            for item in diff.added:
+                self._add(item, now)
+            for item in diff.changed:
+                self._add(item, now + _parse_delay(item.delay))
+            # Entries of removed and changed items are skipped lazily by generation
+            if len(self._heap) > 2 * len(self._items) + 64:
+                self._heap = [entry for entry in self._heap
+                              if entry[2] in self._items and self._items[entry[2]][1] == entry[1]]
+                heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def refresh(self, now: Optional[float] = None) -> None:
+        """
+        Fetch active checks from server and update schedules with changes.
+
+        Parameters
+        ----------
+        :now:
+            Monotonic time to schedule from, defaults to time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        self._next_refresh = now + self._refresh_interval
+        diff = self._agent.refresh_active_checks()
+        if diff:
+            logger.info(f"Active checks changed: {len(diff.added)} added, "
+                        f"{len(diff.removed)} removed, {len(diff.changed)} changed")
+            self.update(diff, now)
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """
+        Run collectors of all items that are due and send buffered values if needed.
+
+        Parameters
+        ----------
+        :now:
+            Current monotonic time, defaults to time.monotonic().
+
+        Returns
+        -------
+        int
+            Number of collected values.
+        """
+        now = time.monotonic() if now is None else now
+        collected = self._collect_due(now)
+        self.flush(now=now, force=False)
+        return collected
+
+    def flush(self, now: Optional[float] = None, force: bool = True) -> bool:
+        """
+        Send buffered values. Values that could not be sent are kept for
+        the next attempt, unless the agent stored them in its disk buffer.
+
+        Parameters
+        ----------
+        :now:
+            Current monotonic time, defaults to time.monotonic().
+        :force:
+            Send regardless of buffer_send and buffer_size.
+
+        Returns
+        -------
+        bool
+            True if there was nothing to send or values were sent.
+        """
+        now = time.monotonic() if now is None else now
+        with self._send_lock:
+            with self._lock:
+                data = self._session.data
+                if not data:
+                    return True
+                if not force:
+                    if now < self._next_send:
+                        return False
+                    if len(data) < self._buffer_size and now - self._first_value < self._buffer_send:
+                        return False
+                # Same session and ids, collectors keep appending to the original meanwhile
+                count = len(data)
+                request = copy.copy(self._session)
+                request.data = data[:count]
+            response, buffered = self._agent.spool_collected_data(request)
+            with self._lock:
+                data = self._session.data
+                if response.response == 'success':
+                    logger.debug(f"Sent {count} values: {response.info}")
+                    del data[:count]
+                    self._first_value = now
+                    self._next_send = 0.0
+                    return True
+                if buffered:
+                    # The agent replays them from its disk buffer
+                    logger.warning(f"Could not send {count} values, stored them in the disk buffer")
+                    del data[:count]
+                    self._first_value = now
+                    self._next_send = now + self._buffer_send
+                    return False
+                logger.error(f"Could not send {count} values, retrying in {self._buffer_send}s")
+                self._next_send = now + self._buffer_send
+                if len(data) > self._buffer_size:
+                    del data[:len(data) - self._buffer_size]
+                return False
+
+    def start(self) -> None:
+        """
+        Run scheduler in a background thread.
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='zappix-active-scheduler', daemon=True)
+        self._send_thread = threading.Thread(target=self._run_sends, name='zappix-active-sender', daemon=True)
+        self._thread.start()
+        self._send_thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop background thread and send buffered values.
+
+        Parameters
+        ----------
+        :timeout:
+            Maximum number of seconds to wait for each thread.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        self._send_wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._send_thread:
+            self._send_thread.join(timeout)
+            self._send_thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            try:
+                if now >= self._next_refresh:
+                    self.refresh(now)
+                if self._collect_due(now):
+                    self._send_wakeup.set()
+            except Exception:
+                logger.exception("Active check iteration failed")
+            self._wakeup.clear()
+            self._wakeup.wait(max(self._next_wakeup() - time.monotonic(), 0))
+
+    def _run_sends(self) -> None:
+        while not self._stopped.is_set():
+            # Cleared first, so values collected during a send wake the next round
+            self._send_wakeup.clear()
+            try:
+                self.flush(force=False)
+            except Exception:
+                logger.exception("Sending active check values failed")
+            wakeup = self._next_send_wakeup()
+            self._send_wakeup.wait(None if wakeup is None else max(wakeup - time.monotonic(), 0))
+
+    def _next_wakeup(self) -> float:
+        with self._lock:
+            wakeup = self._next_refresh
+            if self._heap:
+                wakeup = min(wakeup, self._heap[0][0])
+        return wakeup
+
+    def _next_send_wakeup(self) -> Optional[float]:
+        with self._lock:
+            if not self._session.data:
+                return None
+            return max(self._first_value + self._buffer_send, self._next_send)
+
+    def _add(self, item: ActiveItem, due: float) -> None:
+        generation = next(self._counter)
+        delay = _parse_delay(item.delay)
+        self._items[item.key] = (item, generation, delay)
+        heapq.heappush(self._heap, (due, generation, item.key))
+
+    def _collect_due(self, now: float) -> int:
+        due_items = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, generation, key = heapq.heappop(self._heap)
+                entry = self._items.get(key)
+                if entry is None or entry[1] != generation:
+                    continue
+                item, _, delay = entry
+                due_items.append(item)
+                # Keep a fixed cadence unless the schedule fell behind by a whole interval
+                next_run = due + delay if due + delay > now else now + delay
+                heapq.heappush(self._heap, (next_run, generation, key))
+        # Collectors may be slow, they run without blocking schedule changes and sends
+        values = [self._collect(item) for item in due_items]
+        with self._lock:
+            if values and not self._session.data:
+                self._first_value = now
+            for value in values:
+                self._session.add_item(value)
+        return len(values)
+
+    def _collect(self, item: ActiveItem) -> AgentData:
+        collector = self._collectors.get(item.key) or self._collectors.get(item.key.split('[', 1)[0])
+        state = None
+        if collector is None:
+            value: Any = "Unsupported item key."
+            state = _UNSUPPORTED
+        else:
+            try:
+                value = collector(item.key)
+            except Exception as e:
+                logger.exception(f"Collector for {item.key} failed")
+                value = str(e)
+                state = _UNSUPPORTED
+        clock = time.time()
+        return AgentData(self._agent.host, item.key, value, int(clock), int(clock % 1 * 1e9), state)
+
+
+def _parse_delay(delay: Any) -> int:
+    if isinstance(delay, int):
+        return max(delay, 1)
+    # Flexible and scheduling intervals follow the first ";"
+    match = _DELAY_PATTERN.match(str(delay).split(';', 1)[0])
+    if not match:
+        logger.warning(f"Unsupported update interval {delay}, using 60s")
+        return 60
+    return max(int(match.group(1)) * _DELAY_SUFFIXES.get(match.group(2) or 's', 1), 1)
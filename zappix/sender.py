@@ -2,20 +2,34 @@
 Python implementation of Zabbix sender.
 """
 
-from typing import List, Any, Optional, Dict, Tuple, Callable, Union
-from zappix.dstream import _Dstream
+from typing import List, Any, Optional, Dict, Tuple, Callable, Union, Iterable, Iterator, Deque, IO, TextIO
+from zappix.dstream import _Dstream, _AsyncDstream
+from zappix.exceptions import ZappixConnectionError, ZappixError
+from zappix.servers import ServerList
 from zappix.protocol import (SenderData,
                              SenderDataRequest,
-                             ModelEncoder,
-                             ServerResponse)
-import json
+                             ColumnarSenderDataRequest,
+                             encode_request,
+                             merge_info,
+                             parse_info)
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+import asyncio
+import contextlib
+import gzip
+import io
 import csv
+import sys
 import time
 import functools
 import logging
 
 logger = logging.getLogger(__name__)
 
+_GZIP_MAGIC = b'\x1f\x8b'
+
+_SenderRequest = Union[SenderDataRequest, ColumnarSenderDataRequest]
+
 
 class Sender(_Dstream):
     """
@@ -24,15 +38,17 @@ class Sender(_Dstream):
     Parameters
     ----------
     :server:
-        IP address of target Zabbix Server.
+        IP address of target Zabbix Server or a ServerList of HA nodes and proxies.
     :port:
         Port on which the Zabbix Server listens.
     :source_address:
         Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
     """
 
-    def __init__(self, server: str, port: int = 10051, source_address: Optional[str] = None) -> None:
-        super().__init__(server, port, source_address)
+    def __init__(self, server: Union[str, ServerList], port: int = 10051, source_address: Optional[str] = None, **kwargs) -> None:
+        super().__init__(server, port, source_address, **kwargs)
 
     def send_value(self, host: str, key: str, value: Any) -> Union[Dict[str, Any], None]:
         """
@@ -55,12 +71,20 @@ class Sender(_Dstream):
         payload = SenderDataRequest()
         payload.add_item(SenderData(host, key, value))
 
-        response = self._send(json.dumps(payload, cls=ModelEncoder).encode("utf-8"))
-        return ServerResponse(response).info
+        response = self._send_buffered(encode_request(payload))
+        return parse_info(response)
 
-    def send_file(self, file: str, with_timestamps: bool = False) -> Tuple[Union[Dict[str, Any], None], List[int]]:
+    def send_file(self, file: str, with_timestamps: bool = False, chunk_size: Optional[int] = None,
+                  max_bytes: Optional[int] = None, workers: int = 1,
+                  stream: bool = False) -> Tuple[Union[Dict[str, Any], None], List[int]]:
         """
         Send values contained in a file to specified hosts.
+        Use "-" as file to read from standard input. Gzip-compressed
+        input is detected and decompressed on the fly.
+
+        In streaming mode the file is parsed lazily and sent in batches
+        of chunk_size items while it is being read, so memory use does
+        not depend on the file size.
 
         Parameters
         ----------
@@ -68,15 +92,32 @@ class Sender(_Dstream):
             Path to file with data.
         :with_timestamps:
             Specify whether file contains timestamps for items.
+        :chunk_size:
+            Maximum number of items sent in one message.
+            Defaults to 250 in streaming mode.
+        :max_bytes:
+            Maximum size of items sent in one message in bytes.
+        :workers:
+            Number of messages sent in parallel.
+        :stream:
+            Send batches while reading the file.
 
         Returns
         -------
         dict
             Information from server.
         """
+        if stream:
+            corrupted_lines: List[int] = []
+            items = self._iter_file(file, with_timestamps, corrupted_lines)
+            chunks = self._iter_chunks(items, chunk_size or 250, max_bytes, with_timestamps)
+            return self._send_chunks(chunks, workers), corrupted_lines
+
         payload, corrupted_lines = self._parse_file(file, with_timestamps)
-        response = self._send(json.dumps(payload, cls=ModelEncoder).encode("utf-8"))
-        return ServerResponse(response).info, corrupted_lines
+        if chunk_size or max_bytes:
+            return self._send_chunks(payload.split(chunk_size, max_bytes), workers), corrupted_lines
+        response = self._send_buffered(encode_request(payload))
+        return parse_info(response), corrupted_lines
 
     def send_result(self, host: str, key: str) -> Any:
         """
@@ -103,16 +144,62 @@ class Sender(_Dstream):
             return get_value
         return wrap_function
 
-    def send_bulk(self, request: SenderDataRequest, with_timestams: bool = False):
+    def send_payload(self, payload: bytes) -> Tuple[Union[Dict[str, Any], None], bool]:
+        """
+        Send an already encoded "sender data" request, e.g. one relayed
+        for another client. With a disk buffer, a request that could not
+        be delivered is stored for replay instead of raising a connection error.
+        Without one, ZappixConnectionError is raised regardless of raise_errors,
+        so undeliverable requests can be told from rejected ones. A request
+        that timed out waiting for the response is not buffered, as the server
+        may have processed it, and its ZappixConnectionError has sent set.
+
+        Parameters
+        ----------
+        :payload:
+            Request encoded as JSON, e.g. by zappix.protocol.encode_json.
+
+        Returns
+        -------
+        tuple
+            Information from server, None if the response carried none or
+            was invalid, and whether the request was stored in the disk buffer.
+        """
+        if self._disk_buffer is None:
+            try:
+                return parse_info(self._send_or_raise(payload)), False
+            except ZappixConnectionError:
+                raise
+            except ZappixError as e:
+                return parse_info(self._handle_error(e)), False
+        try:
+            response, buffered = self._send_spooled(payload)
+        except ZappixConnectionError as e:
+            if e.sent:
+                raise
+            return None, True
+        return parse_info(response), buffered
+
+    def send_bulk(self, request: _SenderRequest, with_timestams: bool = False, chunk_size: Optional[int] = None,
+                  max_bytes: Optional[int] = None, workers: int = 1):
         """
         Send item values to Zabbix in bulk.
+        If chunk_size or max_bytes is set, the request is split and sent
+        as several messages whose results are merged. Items of chunks
+        that could not be delivered are counted as failed.
 
         Parameters
         ----------
         :request:
-            Path to file with data.
+            Instance of SenderDataRequest or ColumnarSenderDataRequest.
         :with_timestamps:
             Specify whether SenderData objects contain timestamps.
+        :chunk_size:
+            Maximum number of items sent in one message.
+        :max_bytes:
+            Maximum size of items sent in one message in bytes.
+        :workers:
+            Number of messages sent in parallel.
 
         Returns
         -------
@@ -120,19 +207,65 @@ class Sender(_Dstream):
             Information from server.
         """
         if with_timestams:
-            now = time.time()
-            request.clock = int(now//1)
-            request.ns = int(now % 1 * 1e9)
+            _set_timestamp(request)
+
+        if chunk_size or max_bytes:
+            return self._send_chunks(request.split(chunk_size, max_bytes), workers)
+
+        response = self._send_buffered(encode_request(request))
+        return parse_info(response)
 
-        response = self._send(json.dumps(request, cls=ModelEncoder).encode("utf-8"))
-        return ServerResponse(response).info
+    def _send_chunks(self, chunks: Iterable[_SenderRequest], workers: int = 1) -> Union[Dict[str, Any], None]:
+        def send(chunk: _SenderRequest) -> Union[Dict[str, Any], None]:
+            response = self._send_buffered(encode_request(chunk))
+            return _chunk_info(chunk, parse_info(response))
+
+        if workers <= 1:
+            return merge_info(send(chunk) for chunk in chunks)
+
+        info: Union[Dict[str, Any], None] = None
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk in chunks:
+                # Keep only a bounded number of chunks in memory
+                if len(pending) >= 2 * workers:
+                    info = merge_info([info, pending.popleft().result()])
+                pending.append(executor.submit(send, chunk))
+            return merge_info([info] + [future.result() for future in pending])
+
+    def _iter_chunks(self, items: Iterable[SenderData], chunk_size: int, max_bytes: Optional[int] = None,
+                     with_timestamps: bool = False) -> Iterator[SenderDataRequest]:
+        batch = SenderDataRequest()
+        for item in items:
+            batch.data.append(item)
+            if len(batch.data) >= chunk_size:
+                yield from self._finish_chunk(batch, max_bytes, with_timestamps)
+                batch = SenderDataRequest()
+        if batch.data:
+            yield from self._finish_chunk(batch, max_bytes, with_timestamps)
+
+    def _finish_chunk(self, batch: SenderDataRequest, max_bytes: Optional[int],
+                      with_timestamps: bool) -> Iterator[SenderDataRequest]:
+        if with_timestamps:
+            _set_timestamp(batch)
+        if max_bytes:
+            yield from batch.split(max_bytes=max_bytes)
+        else:
+            yield batch
 
     def _parse_file(self, file: str, with_timestamps: bool = False) -> Tuple[SenderDataRequest, List[int]]:
-        with open(file, 'r', encoding='utf-8') as values:
-            payload = SenderDataRequest()
+        payload = SenderDataRequest()
+        failed_lines: List[int] = []
+        payload.data.extend(self._iter_file(file, with_timestamps, failed_lines))
+        if with_timestamps:
+            _set_timestamp(payload)
+
+        return payload, failed_lines
+
+    def _iter_file(self, file: str, with_timestamps: bool, failed_lines: List[int]) -> Iterator[SenderData]:
+        with _open_input(file) as values:
             reader = csv.reader(values, delimiter=' ', skipinitialspace=True)
             logger.info(f"Reading data from {file}")
-            failed_lines = []
 
             for row in reader:
                 try:
@@ -145,16 +278,127 @@ class Sender(_Dstream):
                     logger.exception(f"Could not parse {file} at line {reader.line_num}")
                 else:
                     if all(row):
-                        payload.add_item(data)
                         logger.debug(f"Adding {data} to Sender payload")
+                        yield data
                     else:
                         failed_lines.append(reader.line_num)
+
+
+class AsyncSender(_AsyncDstream):
+    """
+    Asyncio counterpart of Sender.
+
+    Parameters
+    ----------
+    :server:
+        IP address of target Zabbix Server or a ServerList of HA nodes and proxies.
+    :port:
+        Port on which the Zabbix Server listens.
+    :source_address:
+        Source IP address.
+    :kwargs:
+        Connection options, see zappix.dstream._BaseDstream.
+    """
+
+    def __init__(self, server: Union[str, ServerList], port: int = 10051, source_address: Optional[str] = None, **kwargs) -> None:
+        super().__init__(server, port, source_address, **kwargs)
+
+    async def send_value(self, host: str, key: str, value: Any) -> Union[Dict[str, Any], None]:
+        """
+        Send a single value to a Zabbix host.
+
+        Parameters
+        ----------
+        :host:
+            Name of a host as visible in Zabbix frontend.
+        :key:
+            String representing an item key.
+        :value:
+            Value to be sent.
+
+        Returns
+        -------
+        dict
+            Information from server.
+        """
+        payload = SenderDataRequest()
+        payload.add_item(SenderData(host, key, value))
+
+        response = await self._send(encode_request(payload))
+        return parse_info(response)
+
+    async def send_bulk(self, request: _SenderRequest, with_timestamps: bool = False,
+                        chunk_size: Optional[int] = None, max_bytes: Optional[int] = None,
+                        workers: int = 1) -> Union[Dict[str, Any], None]:
+        """
+        Send item values to Zabbix in bulk, optionally split into chunks
+        as in Sender.send_bulk.
+
+        Parameters
+        ----------
+        :request:
+            Instance of SenderDataRequest or ColumnarSenderDataRequest.
+        :with_timestamps:
+            Specify whether SenderData objects contain timestamps.
+        :chunk_size:
+            Maximum number of items sent in one message.
+        :max_bytes:
+            Maximum size of items sent in one message in bytes.
+        :workers:
+            Number of messages sent concurrently.
+
+        Returns
+        -------
+        dict
+            Information from server.
+        """
         if with_timestamps:
-            now = time.time()
-            payload.clock = int(now//1)
-            payload.ns = int(now % 1 * 1e9)
+            _set_timestamp(request)
 
-        return payload, failed_lines
+        if chunk_size or max_bytes:
+            semaphore = asyncio.Semaphore(max(workers, 1))
+
+            async def send(chunk: _SenderRequest) -> Union[Dict[str, Any], None]:
+                async with semaphore:
+                    response = await self._send(encode_request(chunk))
+                return _chunk_info(chunk, parse_info(response))
+
+            chunks = request.split(chunk_size, max_bytes)
+            return merge_info(await asyncio.gather(*(send(chunk) for chunk in chunks)))
+
+        response = await self._send(encode_request(request))
+        return parse_info(response)
+
+
+@contextlib.contextmanager
+def _open_input(file: str) -> Iterator[TextIO]:
+    raw: IO[bytes] = sys.stdin.buffer if file == '-' else open(file, 'rb')
+    binary: Union[IO[bytes], gzip.GzipFile] = raw
+    if hasattr(raw, 'peek') and raw.peek(2)[:2] == _GZIP_MAGIC:  # type: ignore
+        binary = gzip.GzipFile(fileobj=raw)
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+    try:
+        yield text
+    finally:
+        # Leave standard input open for the caller
+        text.detach()
+        if binary is not raw:
+            binary.close()
+        if raw is not sys.stdin.buffer:
+            raw.close()
+
+
+def _chunk_info(chunk: _SenderRequest, info: Union[Dict[str, Any], None]) -> Union[Dict[str, Any], None]:
+    if info is None:
+        logger.error(f"Could not deliver chunk of {len(chunk)} items")
+        return {"processed": 0, "failed": len(chunk), "total": len(chunk)}
+    return info
+
+
+def _set_timestamp(request: _SenderRequest) -> None:
+    now = time.time()
+    request.clock = int(now//1)
+    request.ns = int(now % 1 * 1e9)
 
 
 if __name__ == '__main__':
@@ -166,18 +410,19 @@ if __name__ == '__main__':
     params.add_argument('-s', '--host', nargs='?')
     params.add_argument('-k', '--key', nargs='?')
     params.add_argument('-o', '--value', nargs='?')
-    params.add_argument('-i', '--input-file', nargs='?')
+    params.add_argument('-i', '--input-file', nargs='?', help='File with values, "-" for standard input')
     params.add_argument('-T', '--with-timestamps', action='store_true')
+    params.add_argument('-t', '--timeout', nargs='?', default=60, type=float, help='Timeout in seconds')
     args = params.parse_args()
 
     if args.source_address:
-        zab = Sender(args.zabbix, args.port, args.source_address)
+        zab = Sender(args.zabbix, args.port, args.source_address, timeout=args.timeout)
     else:
-        zab = Sender(args.zabbix, args.port)
+        zab = Sender(args.zabbix, args.port, timeout=args.timeout)
 
     if all([args.host, args.key, args.value]):
         result = zab.send_value(args.host, args.key, args.value)
     elif args.input_file:
-        result, corrupted_lines = zab.send_file(args.input_file, True if args.with_timestamps else False)
+        result, corrupted_lines = zab.send_file(args.input_file, True if args.with_timestamps else False, stream=True)
 
     print('info from server: "{}"'.format(result))
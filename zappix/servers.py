@@ -0,0 +1,204 @@
+"""
+Module containing selection of Zabbix servers and proxies to talk to.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple, TypeVar, Union
+from zappix.exceptions import NoServerAvailable, ZappixConnectionError
+import asyncio
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[str, int]
+T = TypeVar('T')
+
+
+class _ServerState:
+    __slots__ = ['failures', 'retry_at', 'latency']
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.retry_at = 0.0
+        self.latency = 0.0
+
+
+class ServerList:
+    """
+    List of equivalent servers, e.g. nodes of a Zabbix HA cluster or proxies.
+    Can be passed to clients instead of a single server address.
+
+    Every request tries servers in the order given by policy until one
+    answers. A server that could not be reached is tried again only after
+    an exponentially growing, jittered delay, unless all servers are down.
+    If no server answers, the whole list is retried up to retries times
+    with the same backoff. Only errors before the request was sent cause
+    failover. Protocol errors and timeouts waiting for a response are raised
+    right away, because the peer may have processed the request.
+
+    Policies
+    --------
+    failover:
+        Stick to the last server that answered, move on only when it fails.
+    round_robin:
+        Start with the next server on every request.
+    least_latency:
+        Prefer the server with the lowest average response time.
+
+    Parameters
+    ----------
+    :servers:
+        Servers as "host", "host:port" or (host, port).
+    :port:
+        Port of servers given without one.
+    :policy:
+        Server selection policy.
+    :retries:
+        Number of extra rounds over all servers.
+    :backoff:
+        Base delay in seconds, doubled after every consecutive failure.
+    :max_backoff:
+        Maximum delay in seconds.
+    """
+
+    _policies = ('failover', 'round_robin', 'least_latency')
+
+    def __init__(self, servers: Iterable[Union[str, Address]], port: int = 10051, policy: str = 'failover',
+                 retries: int = 0, backoff: float = 0.5, max_backoff: float = 30.0) -> None:
+        if policy not in ServerList._policies:
+            raise ValueError(f"Unknown policy: {policy}")
+        self.servers: List[Address] = [_parse_server(server, port) for server in servers]
+        if not self.servers:
+            raise ValueError("At least one server is required")
+        self._policy = policy
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._states: Dict[Address, _ServerState] = {server: _ServerState() for server in self.servers}
+        self._current = 0
+        self._lock = threading.Lock()
+
+    def run(self, request: Callable[[Address], T]) -> T:
+        """
+        Run request against servers until one of them answers.
+
+        Parameters
+        ----------
+        :request:
+            Callable taking (host, port) and raising ZappixConnectionError on failure.
+
+        Returns
+        -------
+        any
+            Result of request.
+        """
+        errors: List[ZappixConnectionError] = []
+        for attempt in range(self._retries + 1):
+            if attempt:
+                time.sleep(self._delay(attempt))
+            for server in self.candidates():
+                start = time.monotonic()
+                try:
+                    result = request(server)
+                except ZappixConnectionError as e:
+                    self._failed(server, e)
+                    if e.sent:
+                        raise
+                    errors.append(e)
+                    continue
+                self._succeeded(server, time.monotonic() - start)
+                return result
+        raise NoServerAvailable(errors)
+
+    async def run_async(self, request: Callable[[Address], Awaitable[T]]) -> T:
+        """
+        Asyncio counterpart of run.
+
+        Parameters
+        ----------
+        :request:
+            Coroutine function taking (host, port) and raising ZappixConnectionError on failure.
+
+        Returns
+        -------
+        any
+            Result of request.
+        """
+        errors: List[ZappixConnectionError] = []
+        for attempt in range(self._retries + 1):
+            if attempt:
+                await asyncio.sleep(self._delay(attempt))
+            for server in self.candidates():
+                start = time.monotonic()
+                try:
+                    result = await request(server)
+                except ZappixConnectionError as e:
+                    self._failed(server, e)
+                    if e.sent:
+                        raise
+                    errors.append(e)
+                    continue
+                self._succeeded(server, time.monotonic() - start)
+                return result
+        raise NoServerAvailable(errors)
+
+    def candidates(self) -> List[Address]:
+        """
+        Servers in the order they will be tried for the next request.
+        Servers backing off after a failure come last.
+
+        Returns
+        -------
+        list
+            List of (host, port) tuples.
+        """
+        now = time.monotonic()
+        with self._lock:
+            count = len(self.servers)
+            if self._policy == 'least_latency':
+                ordered = sorted(self.servers, key=lambda server: self._states[server].latency)
+            else:
+                start = self._current
+                if self._policy == 'round_robin':
+                    self._current = (self._current + 1) % count
+                ordered = [self.servers[(start + i) % count] for i in range(count)]
+            ready = [server for server in ordered if self._states[server].retry_at <= now]
+            waiting = sorted((server for server in ordered if self._states[server].retry_at > now),
+                             key=lambda server: self._states[server].retry_at)
+        return ready + waiting
+
+    def _succeeded(self, server: Address, elapsed: float) -> None:
+        with self._lock:
+            state = self._states[server]
+            state.failures = 0
+            state.retry_at = 0.0
+            # Exponentially weighted moving average
+            state.latency = elapsed if not state.latency else state.latency * 0.8 + elapsed * 0.2
+            if self._policy == 'failover':
+                self._current = self.servers.index(server)
+
+    def _failed(self, server: Address, error: Any) -> None:
+        with self._lock:
+            state = self._states[server]
+            state.failures += 1
+            delay = self._delay(state.failures)
+            state.retry_at = time.monotonic() + delay
+        logger.warning(f"Server {server[0]}:{server[1]} failed, backing off for {delay:.2f}s: {error}")
+
+    def _delay(self, failures: int) -> float:
+        # Full jitter spreads out reconnects of many clients
+        return random.uniform(0, min(self._max_backoff, self._backoff * 2 ** (failures - 1)))
+
+
+def _parse_server(server: Union[str, Address], port: int) -> Address:
+    if not isinstance(server, str):
+        return server[0], int(server[1])
+    if server.startswith('['):
+        host, _, rest = server[1:].partition(']')
+        return host, int(rest[1:]) if rest.startswith(':') else port
+    if server.count(':') == 1:
+        host, _, server_port = server.partition(':')
+        return host, int(server_port)
+    return server, port
@@ -0,0 +1,299 @@
+"""
+In-process stand-in for Zabbix server trapper, for tests and load testing.
+"""
+
+from typing import Any, Dict, List, Optional
+from zappix.dstream import _all_tasks, _read_request, _frame
+import asyncio
+import json
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NOT_SUPPORTED = "ZBX_NOTSUPPORTED\0Unsupported item key."
+
+
+class TrapperServer:
+    """
+    Loopback server speaking Zabbix protocol like the trapper of Zabbix server.
+    Answers "sender data", "agent data" and "active checks" requests with
+    responses and info strings in the format of Zabbix server, and plain item
+    keys like a passive agent. Runs an asyncio event loop in a background thread.
+
+    Parameters
+    ----------
+    :host:
+        Address to listen on.
+    :port:
+        Port to listen on, a free one is picked by default.
+    :latency:
+        Seconds to wait before answering every request.
+    :error_rate:
+        Fraction of requests answered with an error.
+    :error_mode:
+        Kind of injected error: 'failed' answers with a failed response,
+        'close' closes the connection without answer, 'garbage' answers
+        with data that is not Zabbix protocol.
+    :item_failure_rate:
+        Fraction of items reported as failed in info.
+    :active_checks:
+        Dict mapping hostname to a list of active check dicts with
+        at least key and delay. Other hosts are reported as not found.
+    :agent_values:
+        Dict mapping item keys to values returned for passive checks.
+        Other keys are reported as not supported.
+    :keep_alive:
+        Serve further requests on a connection instead of closing it
+        after the response, like Zabbix proxies in passive mode do.
+    :keep_data:
+        Store received items in data.
+    :seed:
+        Seed of the random generator used for error injection.
+    """
+
+    _error_modes = ('failed', 'close', 'garbage')
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 error_mode: str = 'failed', item_failure_rate: float = 0.0,
+                 active_checks: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 agent_values: Optional[Dict[str, str]] = None, keep_alive: bool = False, keep_data: bool = False,
+                 seed: Optional[int] = None) -> None:
+        if error_mode not in TrapperServer._error_modes:
+            raise ValueError(f"Unknown error mode: {error_mode}")
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_mode = error_mode
+        self.item_failure_rate = item_failure_rate
+        self.active_checks = active_checks or {}
+        self.agent_values = agent_values or {}
+        self.keep_alive = keep_alive
+        self.keep_data = keep_data
+        self.data: List[Dict[str, Any]] = []
+        self._random = random.Random(seed)
+        self._sessions: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Any = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset counters and stored data.
+        """
+        self.connections = 0
+        self.requests = 0
+        self.items = 0
+        self.failed_items = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.data = []
+        self._started = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Get throughput counters.
+
+        Returns
+        -------
+        dict
+            Counters since start or last reset, with requests and items per second.
+        """
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return {
+            'connections': self.connections,
+            'requests': self.requests,
+            'items': self.items,
+            'failed_items': self.failed_items,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'seconds': elapsed,
+            'requests_per_second': self.requests / elapsed,
+            'items_per_second': self.items / elapsed,
+        }
+
+    def start(self) -> 'TrapperServer':
+        """
+        Start listening in a background thread.
+
+        Returns
+        -------
+        TrapperServer
+            The server itself, with port set to the listening port.
+        """
+        started = threading.Event()
+        errors: List[BaseException] = []
+        loop = self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            try:
+                server = self._server = loop.run_until_complete(
+                    asyncio.start_server(self._handle, self.host, self.port))
+                self.port = server.sockets[0].getsockname()[1]
+            except BaseException as e:
+                errors.append(e)
+                loop.close()
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            # Connections kept alive by clients are still waiting for requests
+            tasks = _all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name='zappix-trapper', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            # Binding failed, e.g. the port is in use
+            self._thread.join()
+            self._thread = self._loop = None
+            raise errors[0]
+        logger.info(f"Trapper listening on {self.host}:{self.port}")
+        self.reset()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop listening and wait for the background thread.
+        """
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'TrapperServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    payload, compressed, size = await _read_request(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                self.bytes_received += size
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if self.error_rate and self._random.random() < self.error_rate:
+                    self.errors += 1
+                    if self.error_mode == 'close':
+                        return
+                    if self.error_mode == 'garbage':
+                        writer.write(b'HTTP/1.1 400 Bad Request\r\n\r\n')
+                        await writer.drain()
+                        return
+                    response = _failed("injected error")
+                else:
+                    response = self._respond(payload)
+                frame = _frame(response.encode('utf-8'), compressed)
+                self.bytes_sent += len(frame)
+                writer.write(frame)
+                await writer.drain()
+                if not self.keep_alive:
+                    return
+        except Exception:
+            logger.exception("Trapper failed to handle request")
+        finally:
+            writer.close()
+
+    def _respond(self, payload: bytes) -> str:
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            key = payload.decode('utf-8', 'replace').strip()
+            return self.agent_values.get(key, _NOT_SUPPORTED)
+
+        kind = request.get('request')
+        if kind == 'active checks':
+            return self._respond_active_checks(request.get('host'))
+        if kind in ('sender data', 'agent data'):
+            return self._respond_data(request)
+        return _failed(f"unsupported request \"{kind}\"")
+
+    def _respond_active_checks(self, host: Optional[str]) -> str:
+        if host not in self.active_checks:
+            return _failed(f"host [{host}] not found")
+        data = [dict({'lastlogsize': 0, 'mtime': 0}, **check) for check in self.active_checks[host]]
+        return json.dumps({'response': 'success', 'data': data})
+
+    def _respond_data(self, request: Dict[str, Any]) -> str:
+        start = time.perf_counter()
+        items = request.get('data')
+        if not isinstance(items, list):
+            return _failed("cannot parse data")
+        session = request.get('session')
+        last_id = self._sessions.get(session, 0) if session else 0
+        processed = failed = 0
+        for item in items:
+            if not isinstance(item, dict) or 'host' not in item or 'key' not in item:
+                failed += 1
+                continue
+            # Agent data with an id already seen in the session is a resend
+            if session and isinstance(item.get('id'), int):
+                if item['id'] <= last_id:
+                    self.duplicates += 1
+                    continue
+                last_id = item['id']
+            if self.item_failure_rate and self._random.random() < self.item_failure_rate:
+                failed += 1
+                continue
+            processed += 1
+            if self.keep_data:
+                self.data.append(item)
+        if session:
+            self._sessions[session] = last_id
+        self.items += processed + failed
+        self.failed_items += failed
+        spent = time.perf_counter() - start
+        info = f"processed: {processed}; failed: {failed}; total: {processed + failed}; seconds spent: {spent:.6f}"
+        return json.dumps({'response': 'success', 'info': info})
+
+
+def _failed(info: str) -> str:
+    return json.dumps({'response': 'failed', 'info': info})
+
+
+if __name__ == '__main__':
+    import argparse
+    params = argparse.ArgumentParser()
+    params.add_argument('-l', '--listen', nargs='?', default='127.0.0.1')
+    params.add_argument('-p', '--port', nargs='?', default=10051, type=int)
+    params.add_argument('--latency', nargs='?', default=0.0, type=float, help='Seconds before every answer')
+    params.add_argument('--error-rate', nargs='?', default=0.0, type=float, help='Fraction of failed requests')
+    params.add_argument('--error-mode', nargs='?', default='failed', choices=TrapperServer._error_modes)
+    params.add_argument('--keep-alive', action='store_true')
+    args = params.parse_args()
+
+    with TrapperServer(args.listen, args.port, args.latency, args.error_rate, args.error_mode,
+                       keep_alive=args.keep_alive) as trapper:
+        print(f"Listening on {trapper.host}:{trapper.port}")
+        try:
+            while True:
+                time.sleep(5)
+                stats = trapper.stats()
+                print(f"requests/s: {stats['requests_per_second']:.0f} items/s: {stats['items_per_second']:.0f}")
+                trapper.reset()
+        except KeyboardInterrupt:
+            pass
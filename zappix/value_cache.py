@@ -0,0 +1,151 @@
+"""
+Suppression of unchanged values, like "Discard unchanged with heartbeat" preprocessing of Zabbix.
+"""
+
+from typing import Any, Optional, Tuple, TypeVar, Union
+from collections import OrderedDict
+from zappix.protocol import SenderDataRequest, ColumnarSenderDataRequest
+import threading
+import time
+
+Request = TypeVar('Request', SenderDataRequest, ColumnarSenderDataRequest)
+
+
+class ValueCache:
+    """
+    Cache of the last value sent for every (host, key) pair, used to skip
+    values equal to it. An unchanged value is sent anyway when heartbeat
+    seconds passed since the value was last sent, so Zabbix triggers using
+    nodata() keep working. The least recently seen pairs are evicted when
+    the cache holds max_size of them, their next value is always sent.
+
+    Can be passed to BufferedSender, or used to filter requests sent with
+    Sender.send_bulk. Filtered values count as sent right away, so a request
+    that could not be delivered should be passed to forget_request.
+
+    Usage
+    -----
+    request = cache.filter(request)
+    if sender.send_bulk(request) is None:
+        cache.forget_request(request)
+
+    Parameters
+    ----------
+    :heartbeat:
+        Number of seconds after which an unchanged value is sent.
+        Unchanged values are never sent if None.
+    :max_size:
+        Maximum number of (host, key) pairs kept.
+    """
+
+    def __init__(self, heartbeat: Optional[float] = 3600.0, max_size: int = 100000) -> None:
+        self._heartbeat = heartbeat
+        self._max_size = max_size
+        # (host, key) -> (last sent value, clock at which it was sent)
+        self._values: 'OrderedDict[Tuple[str, str], Tuple[Any, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.suppressed = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def changed(self, host: str, key: str, value: Any, clock: Optional[float] = None) -> bool:
+        """
+        Check whether a value should be sent, and remember it if so.
+
+        Parameters
+        ----------
+        :host:
+            Name of a host as visible in Zabbix frontend.
+        :key:
+            String representing an item key.
+        :value:
+            Value to be sent.
+        :clock:
+            Timestamp at which value was collected. Defaults to now.
+
+        Returns
+        -------
+        bool
+            False if the value is equal to the last one sent within heartbeat.
+        """
+        clock = time.time() if clock is None else clock
+        pair = (host, key)
+        with self._lock:
+            cached = self._values.get(pair)
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values.move_to_end(pair)
+                last_value, sent = cached
+                if last_value == value and (self._heartbeat is None or clock - sent < self._heartbeat):
+                    self.suppressed += 1
+                    return False
+            self._values[pair] = (value, clock)
+            if len(self._values) > self._max_size:
+                self._values.popitem(last=False)
+                self.evicted += 1
+        return True
+
+    def filter(self, request: Request) -> Request:
+        """
+        Get a request without the items that should not be sent.
+        Clock and ns of the request and of its items are kept.
+
+        Parameters
+        ----------
+        :request:
+            Instance of SenderDataRequest or ColumnarSenderDataRequest.
+
+        Returns
+        -------
+        SenderDataRequest or ColumnarSenderDataRequest
+            New request of the same type with changed items, possibly empty.
+        """
+        if isinstance(request, SenderDataRequest):
+            kept = SenderDataRequest([item for item in request.data
+                                      if self.changed(item.host, item.key, item.value, item.clock)])
+            kept.clock, kept.ns = request.clock, request.ns
+            return kept
+        return request._select([i for i, item in enumerate(request)
+                                if self.changed(item.host, item.key, item.value, item.clock)])
+
+    def clear(self) -> None:
+        """
+        Forget all values, so the next value of every pair is sent.
+        """
+        with self._lock:
+            self._values.clear()
+
+    def forget(self, host: str, key: str) -> None:
+        """
+        Forget the value of a pair, e.g. when it could not be delivered.
+
+        Parameters
+        ----------
+        :host:
+            Name of a host as visible in Zabbix frontend.
+        :key:
+            String representing an item key.
+        """
+        with self._lock:
+            self._values.pop((host, key), None)
+
+    def forget_request(self, request: Union[SenderDataRequest, ColumnarSenderDataRequest]) -> None:
+        """
+        Forget the values of all pairs of a request, e.g. one returned
+        by filter that could not be delivered.
+
+        Parameters
+        ----------
+        :request:
+            Instance of SenderDataRequest or ColumnarSenderDataRequest.
+        """
+        items = request.data if isinstance(request, SenderDataRequest) else request
+        with self._lock:
+            for item in items:
+                self._values.pop((item.host, item.key), None)